@@ -0,0 +1,351 @@
+'''
+Plain-text extraction for HTML bill abstracts.
+
+Paragraph text is collected from the parser's events, without building a
+document tree, and the paragraphs of each distinct abstract are memoized
+by a hash of its content, since many bills share boilerplate abstracts.
+The output matches joining the `<p>` texts of the BeautifulSoup tree the
+original code built: lxml's HTML parser is driven directly when it is
+installed, so paragraphs are closed by the same rules (a new `<p>` or a
+block-level tag ends an open one), and `html.parser` is used otherwise,
+as BeautifulSoup itself falls back to.
+'''
+import hashlib
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# BeautifulSoup keeps the text inside these tags out of `p.text`.
+STRING_CONTAINERS = frozenset(['rt', 'rp', 'script', 'style', 'template'])
+PRESERVE_WHITESPACE = frozenset(['pre', 'textarea'])
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                           'input', 'keygen', 'link', 'menuitem', 'meta',
+                           'param', 'source', 'spacer', 'track', 'wbr',
+                           'basefont', 'bgsound', 'command', 'frame',
+                           'image', 'isindex', 'nextid'])
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+class ParagraphCollector:
+    '''
+    Collects the text of every `<p>` element, in document order, from a
+    parser's start, end and data events. Text in nested paragraphs counts
+    towards each enclosing paragraph as well, like BeautifulSoup's
+    `p.text`. Also serves as an lxml parser target.
+    '''
+
+    def __init__(self):
+        '''
+        Initializes an instance of the `ParagraphCollector` class.
+
+        Inputs: None
+        '''
+        self.paragraphs = []
+        self.stack = []
+        self.pending = []
+
+    def start(self, tag, attrib=None):
+        '''
+        Opens an element, and a new paragraph if it is a `<p>`.
+
+        Inputs:
+            - tag (str): the tag name, lowercased
+            - attrib (dict): the tag's attributes, unused
+
+        Returns: Nothing
+        '''
+        self.flush()
+        if tag == 'p':
+            self.stack.append((tag, len(self.paragraphs)))
+            self.paragraphs.append([])
+        else:
+            self.stack.append((tag, None))
+
+    def end(self, tag):
+        '''
+        Closes the innermost open element with the tag and everything
+        opened after it. End tags with no open element are ignored.
+
+        Inputs:
+            - tag (str): the tag name, lowercased
+
+        Returns: Nothing
+        '''
+        self.flush()
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                return
+
+    def data(self, data):
+        '''
+        Buffers text until the next tag.
+
+        Inputs:
+            - data (str): text between tags
+
+        Returns: Nothing
+        '''
+        self.pending.append(data)
+
+    def comment(self, text):
+        '''
+        Ends the current text, as a comment splits it in the tree.
+
+        Inputs:
+            - text (str): the comment, left out of the paragraphs
+
+        Returns: Nothing
+        '''
+        self.flush()
+
+    def pi(self, target, data):
+        '''
+        Ends the current text, as a processing instruction splits it in
+        the tree.
+
+        Inputs:
+            - target (str): the instruction's target, unused
+            - data (str): the instruction, left out of the paragraphs
+
+        Returns: Nothing
+        '''
+        self.flush()
+
+    def flush(self):
+        '''
+        Adds the buffered text to every open paragraph. Text inside script,
+        style, template and ruby annotation tags is dropped, and text that
+        is only whitespace collapses to a single newline or space outside
+        `<pre>` and `<textarea>`, as BeautifulSoup does.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        if not self.pending:
+            return
+        text = ''.join(self.pending)
+        self.pending = []
+        tags = set(tag for tag, _ in self.stack)
+        if tags & STRING_CONTAINERS:
+            return
+        if not text.strip(ASCII_SPACES) and not tags & PRESERVE_WHITESPACE:
+            text = '\n' if '\n' in text else ' '
+        for _, index in self.stack:
+            if index is not None:
+                self.paragraphs[index].append(text)
+
+    def close(self):
+        '''
+        Finishes collecting.
+
+        Inputs: None
+
+        Returns: (tuple of str) the text of each paragraph
+        '''
+        self.flush()
+        return tuple(''.join(parts) for parts in self.paragraphs)
+
+
+class ParagraphExtractor(HTMLParser):
+    '''
+    Streaming `html.parser` tokenizer that feeds a `ParagraphCollector`,
+    used when lxml is not installed. Like BeautifulSoup's `html.parser`
+    backend, it never closes a paragraph implicitly.
+    '''
+
+    def __init__(self):
+        '''
+        Initializes an instance of the `ParagraphExtractor` class.
+
+        Inputs: None
+        '''
+        super().__init__(convert_charrefs=True)
+        self.collector = ParagraphCollector()
+
+    def handle_starttag(self, tag, attrs):
+        '''
+        Opens the element; void elements are closed straight away.
+
+        Inputs:
+            - tag (str): the tag name, lowercased
+            - attrs (list of tuples): the tag's (name, value) attributes
+
+        Returns: Nothing
+        '''
+        self.collector.start(tag)
+        if tag in VOID_ELEMENTS:
+            self.collector.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        '''
+        Opens and closes a self-closing element, such as `<p/>`.
+
+        Inputs:
+            - tag (str): the tag name, lowercased
+            - attrs (list of tuples): the tag's (name, value) attributes
+
+        Returns: Nothing
+        '''
+        self.collector.start(tag)
+        self.collector.end(tag)
+
+    def handle_endtag(self, tag):
+        '''
+        Closes the innermost open element with the tag.
+
+        Inputs:
+            - tag (str): the tag name, lowercased
+
+        Returns: Nothing
+        '''
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        '''
+        Passes text to the collector.
+
+        Inputs:
+            - data (str): text between tags
+
+        Returns: Nothing
+        '''
+        self.collector.data(data)
+
+    def handle_comment(self, data):
+        '''
+        Passes a comment to the collector.
+
+        Inputs:
+            - data (str): the comment
+
+        Returns: Nothing
+        '''
+        self.collector.comment(data)
+
+
+def extract_paragraphs(abstract):
+    '''
+    Extracts paragraph texts from an HTML abstract.
+
+    Inputs:
+        - abstract (str): the abstract
+
+    Returns: (tuple of str) the text of each paragraph
+    '''
+    if etree is not None:
+        parser = etree.HTMLParser(target=ParagraphCollector(), recover=True)
+        parser.feed(abstract)
+        return parser.close()
+    parser = ParagraphExtractor()
+    parser.feed(abstract)
+    parser.close()
+    return parser.collector.close()
+
+
+def join_paragraphs(paragraphs, title):
+    '''
+    Joins paragraph texts with single spaces, skipping the paragraph that
+    only repeats the title.
+
+    Inputs:
+        - paragraphs (tuple of str): paragraph texts
+        - title (str): the bill title
+
+    Returns: (str) the joined text
+    '''
+    parts = []
+    started = False
+    for text in paragraphs:
+        if text == title:
+            continue
+        # Matches the original loop, which only adds a separator once the
+        # output is non-empty.
+        if started:
+            parts.append(' ')
+        stripped = text.strip()
+        parts.append(stripped)
+        started = started or bool(stripped)
+    return ''.join(parts)
+
+
+class AbstractCleaner:
+    '''
+    Converts HTML abstracts to plain text with a bounded LRU cache of
+    parsed paragraphs, keyed on a hash of the abstract.
+    '''
+
+    def __init__(self, max_entries=10000):
+        '''
+        Initializes an instance of the `AbstractCleaner` class.
+
+        Inputs:
+            - max_entries (int): most distinct abstracts kept in the cache
+        '''
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_paragraphs(self, abstract):
+        '''
+        Looks up or extracts the paragraphs of an abstract.
+
+        Inputs:
+            - abstract (str): the abstract
+
+        Returns: (tuple of str) the text of each paragraph
+        '''
+        key = hashlib.blake2b(abstract.encode(), digest_size=16).digest()
+        with self.lock:
+            paragraphs = self.cache.get(key)
+            if paragraphs is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return paragraphs
+            self.misses += 1
+
+        paragraphs = extract_paragraphs(abstract)
+        with self.lock:
+            self.cache[key] = paragraphs
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return paragraphs
+
+    def clean(self, abstract, title):
+        '''
+        Converts an HTML abstract into plain text, dropping the paragraph
+        that only repeats the title. Plain-text abstracts are returned
+        unchanged.
+
+        Inputs:
+            - abstract (str): the abstract
+            - title (str): the bill title
+
+        Returns: (str) the cleaned abstract
+        '''
+        if '<' not in abstract:
+            return abstract
+        return join_paragraphs(self.get_paragraphs(abstract), title)
+
+
+_cleaner = AbstractCleaner()
+
+
+def clean_abstract(abstract, title):
+    '''
+    Cleans an abstract with the shared, cached cleaner.
+
+    Inputs:
+        - abstract (str): the abstract
+        - title (str): the bill title
+
+    Returns: (str) the cleaned abstract
+    '''
+    return _cleaner.clean(abstract, title)
@@ -0,0 +1,85 @@
+'''
+Micro-benchmark for HTML abstract cleaning.
+
+Run from the repository root:
+
+    python benchmarks/bench_abstract_cleaner.py [number_of_abstracts]
+
+Compares the original BeautifulSoup loop with the streaming extractor,
+uncached and cached, on synthetic abstracts where most bills share a
+small set of boilerplate texts.
+'''
+import os
+import random
+import sys
+import time
+import warnings
+from bs4 import BeautifulSoup, GuessedAtParserWarning
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import abstract_cleaner
+
+
+def legacy_clean(abstract, title):
+    '''
+    The original BeautifulSoup loop, kept here as the benchmark baseline.
+    No parser is named, as in the original, so BeautifulSoup picks lxml
+    when it is installed.
+    '''
+    soup = BeautifulSoup(abstract)
+    cleaned = ''
+    for p in soup.find_all('p'):
+        if p.text == title:
+            continue
+        if cleaned:
+            cleaned += " "
+        cleaned += p.text.strip()
+    return cleaned
+
+
+def build_abstracts(n, distinct=500, seed=0):
+    '''
+    Builds (abstract, title) pairs drawn from `distinct` abstract texts.
+    '''
+    rng = random.Random(seed)
+    templates = []
+    for i in range(distinct):
+        title = 'An Act concerning item {}'.format(i)
+        body = ''.join('<p> Paragraph {} of abstract {}, with <b>markup</b> &amp; '
+                       'entities. </p>'.format(j, i) for j in range(rng.randint(1, 6)))
+        if i % 10 == 0:
+            # Unclosed paragraphs and block-level tags inside a paragraph,
+            # which close it implicitly under lxml.
+            body += '<p>Unclosed {}<p>Next <div>block</div> tail</p>'.format(i)
+        templates.append(('<p>{}</p>{}'.format(title, body), title))
+    return [templates[rng.randrange(distinct)] for _ in range(n)]
+
+
+def timed(label, function, pairs):
+    start = time.perf_counter()
+    result = [function(abstract, title) for abstract, title in pairs]
+    seconds = time.perf_counter() - start
+    print("{:<22} {:8.3f} s  {:8.1f} us/abstract".format(label, seconds, 1e6 * seconds / len(pairs)))
+    return result, seconds
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    pairs = build_abstracts(n)
+    print("{} abstracts, 500 distinct".format(n))
+    warnings.filterwarnings('ignore', category=GuessedAtParserWarning)
+
+    baseline, legacy_time = timed('BeautifulSoup', legacy_clean, pairs)
+    uncached = abstract_cleaner.AbstractCleaner(max_entries=0)
+    streamed, stream_time = timed('streaming, no cache', uncached.clean, pairs)
+    cached_cleaner = abstract_cleaner.AbstractCleaner()
+    cached, cache_time = timed('streaming, cached', cached_cleaner.clean, pairs)
+
+    assert baseline == streamed == cached, "cleaned abstracts differ"
+    print("speedup: {:.1f}x uncached, {:.1f}x cached ({} hits, {} misses)".format(
+        legacy_time / stream_time, legacy_time / cache_time,
+        cached_cleaner.hits, cached_cleaner.misses))
+
+
+if __name__ == '__main__':
+    main()
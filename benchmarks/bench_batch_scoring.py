@@ -0,0 +1,47 @@
+'''
+Benchmarks scoring every user against every opportunity.
+
+Run from the repository root:
+
+    python benchmarks/bench_batch_scoring.py [number_of_users]
+
+Scores synthetic users (20,000 by default) against 5,000 synthetic
+opportunities in one batch, checks a sample against per-user
+`recommend`, and compares with a per-user loop.
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+import pandas as pd
+import recommender
+from bench_recommender import build_opportunities, build_users
+
+
+def main():
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    model = recommender.fit_model(build_opportunities(5000))
+    prefs = pd.DataFrame(build_users(n_users))
+    prefs.insert(0, 'username', ['user {}'.format(i) for i in range(n_users)])
+    print("{} users x {} opportunities".format(n_users, model.matrix.shape[0]))
+
+    start = time.perf_counter()
+    result = recommender.score_users(model, prefs, k=10)
+    batch = time.perf_counter() - start
+    print("{:<40} {:8.2f} s".format('score_users (batched)', batch))
+
+    sample = list(range(0, n_users, max(1, n_users // 200)))
+    start = time.perf_counter()
+    expected = [model.recommend(prefs.iloc[i], k=10) for i in sample]
+    loop = (time.perf_counter() - start) / len(sample) * n_users
+    print("{:<40} {:8.2f} s".format('recommend per user (extrapolated)', loop))
+
+    scores = result['score'].to_numpy().reshape(n_users, 10)
+    for i, frame in zip(sample, expected):
+        assert np.allclose(scores[i], frame['score'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+'''
+Benchmarks the columnar bill transform against the per-dict loop.
+
+Run from the repository root:
+
+    python benchmarks/bench_bill_transform.py [number_of_bills]
+
+Builds synthetic Open States and Councilmatic bills (100,000 by default),
+checks that both paths produce identical rows, and times each.
+'''
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import big_query_api
+import bill_transform
+
+
+def build_bills(n, seed=0):
+    '''
+    Builds synthetic Open States bills; a quarter have HTML abstracts.
+    '''
+    rng = random.Random(seed)
+    bills = []
+    for i in range(n):
+        title = 'An act concerning climate item {}'.format(i % 5000)
+        kind = i % 4
+        if kind == 0:
+            abstracts = []
+        elif kind == 1:
+            abstracts = [{'abstract': '<p>{}</p><p> Creates the program. </p><p>Amends the Act.</p>'.format(title)}]
+        else:
+            abstracts = [{'abstract': 'Plain abstract {}'.format(i % 300)}]
+        bills.append({
+            'id': 'ocd-bill/{}'.format(i),
+            'identifier': 'HB {}'.format(i),
+            'title': title,
+            'openstates_url': 'https://openstates.org/il/bills/{}'.format(i),
+            'created_at': '20{:02d}-{:02d}-{:02d}T10:00:00+00:00'.format(
+                rng.randint(15, 22), rng.randint(1, 12), rng.randint(1, 28)),
+            'latest_action_date': '2022-{:02d}-{:02d}'.format(
+                rng.randint(1, 12), rng.randint(1, 28)),
+            'latest_action_description': 'Referred to committee',
+            'abstracts': abstracts,
+        })
+    return bills
+
+
+def build_local_bills(n):
+    '''
+    Builds synthetic Councilmatic bills.
+    '''
+    return [{'id': 'ocd-event/{}'.format(i), 'identifier': 'O{}'.format(i),
+             'title': 'Ordinance {}'.format(i), 'updated_at': '2022-10-01T00:00:00',
+             'from_organization': {'name': 'City Council'}} for i in range(n)]
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print("{:<32} {:8.2f} s".format(label, time.perf_counter() - start))
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    bills = build_bills(n)
+    local_bills = build_local_bills(n)
+    print("{} synthetic bills".format(n))
+
+    loop_rows = timed('get_bill_data (loop)', lambda: big_query_api.get_bill_data(bills, 'Illinois'))
+    column_rows = timed('iter_bill_rows (columnar)',
+                        lambda: list(bill_transform.iter_bill_rows(bills, 'Illinois', 10_000)))
+    assert loop_rows == column_rows, "columnar rows differ from loop rows"
+
+    loop_rows = timed('get_local_bill_data (loop)',
+                      lambda: big_query_api.get_local_bill_data(local_bills, 'Chicago'))
+    column_rows = timed('iter_local_bill_rows (columnar)',
+                        lambda: list(bill_transform.iter_local_bill_rows(local_bills, 'Chicago', 10_000)))
+    assert loop_rows == column_rows, "columnar local rows differ from loop rows"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+'''
+Benchmarks parallel coordinates brushing on the cross-section view.
+
+Run from the repository root:
+
+    python benchmarks/bench_brushing.py [number_of_rows]
+
+Builds a synthetic county-year frame (150,000 rows by default), replays a
+sequence of brush events over several axes and ranges, checks the selected
+rows against a plain pandas filter, and compares per-event latency with the
+old approach of parsing the stored JSON frame and rebuilding the mask.
+'''
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'dash_example'))
+import numpy as np
+import pandas as pd
+from helper import brushing
+
+IV_LIST = ['black_afam', 'foreign_born', 'health_insurance_rate',
+    'median_home_price', 'median_income', 'median_rent', 'snap_benefits',
+    'unemp_rate', 'vacant_housing_rate']
+
+
+def build_frame(n, seed=0):
+    '''
+    Builds a synthetic frame with the cross-section view's columns.
+    '''
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: rng.random(n) * 100 for column in IV_LIST})
+    df['aid_requested'] = rng.random(n) * 1e6
+    df['population'] = rng.integers(1000, 1000000, n)
+    df.loc[rng.choice(n, n // 100, replace=False), 'median_rent'] = np.nan
+    return df
+
+
+def build_events():
+    '''
+    Builds restyle events: brushing, adding ranges, moving and clearing.
+    '''
+    def event(index, value):
+        return [{'dimensions[{}].constraintrange'.format(index): value}, [0]]
+    return [
+        event(1, [[10, 60]]),
+        event(4, [[[5, 20], [40, 90]]]),
+        event(1, [[15, 60]]),
+        event(7, [[0, 50]]),
+        event(5, [[[10, 30], [50, 70], [80, 95]]]),
+        event(4, None),
+        event(2, [[20, 80]]),
+        event(1, [[15, 60]]),
+        event(7, None),
+    ]
+
+
+def naive_filter(df, constraints):
+    '''
+    Filters with pandas, one comparison per range.
+    '''
+    mask = pd.Series(True, index=df.index)
+    for index, ranges in constraints.items():
+        column = df[IV_LIST[int(index)]]
+        axis_mask = pd.Series(False, index=df.index)
+        for low, high in ranges:
+            axis_mask |= (column >= low) & (column <= high)
+        mask &= axis_mask
+    return df[mask]
+
+
+def report(label, times):
+    times = np.array(times) * 1000
+    print("{:<45} p50 {:7.2f} ms   max {:7.2f} ms".format(
+        label, np.percentile(times, 50), times.max()))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 150000
+    df = build_frame(n)
+    events = build_events()
+    print("{} synthetic rows, {} brush events".format(n, len(events)))
+
+    stored = df.to_json()
+    old_times = []
+    for restyle in events:
+        start = time.perf_counter()
+        frame = pd.read_json(io.StringIO(stored))
+        values = list(restyle[0].values())[0]
+        if values is not None:
+            column = IV_LIST[int(list(restyle[0].keys())[0][11])]
+            low, high = (values[0][0] if isinstance(values[0][0], list) else values[0])
+            frame = frame[(frame[column] >= low) & (frame[column] <= high)]
+        old_times.append(time.perf_counter() - start)
+    report('old: read_json + single-range mask', old_times)
+
+    state = brushing.BrushState(df, IV_LIST)
+    constraints = {}
+    times = []
+    for restyle in events:
+        start = time.perf_counter()
+        constraints = brushing.merge_constraints(constraints, restyle)
+        mask = state.get_mask(constraints)
+        selected = df[mask] if mask is not None else df
+        times.append(time.perf_counter() - start)
+        expected = naive_filter(df, constraints)
+        assert selected.index.equals(expected.index)
+    report('BrushState, all axes and ranges', times)
+    print("{:<45} {:7d} of {} rows".format('selected after last event', len(selected), n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+'''
+Benchmarks loading and querying the SQLite bill store.
+
+Run from the repository root:
+
+    python benchmarks/bench_database.py [number_of_bills]
+
+Loads synthetic Open States bills (50,000 by default) into a
+`database.BillStore`, with some bills repeated on a later page as happens
+when paging by update time, checks that every bill is stored once with
+the actions and votes of its last copy, and times typical lookups.
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import database
+
+STATES = ['State {:02d}'.format(i) for i in range(50)]
+
+
+def build_bill(i, rng, version=0):
+    '''
+    Builds one synthetic raw bill; `version` changes its actions and votes.
+    '''
+    n_actions = rng.randint(1, 8) + version
+    return {
+        'id': 'ocd-bill/{}'.format(i),
+        'identifier': 'HB {}'.format(i),
+        'title': 'An act concerning climate item {}'.format(i % 5000),
+        'session': '2024',
+        'from_organization': {'name': 'House'},
+        'openstates_url': 'https://openstates.org/bills/{}'.format(i),
+        'created_at': '2024-01-{:02d}'.format(i % 28 + 1),
+        'updated_at': '2024-{:02d}-01T00:00:0{}'.format(i % 12 + 1, version),
+        'latest_action_date': '2024-{:02d}-{:02d}'.format(i % 12 + 1, i % 28 + 1),
+        'abstracts': [],
+        'actions': [{'order': j, 'date': '2024-01-01', 'description': 'Action {}'.format(j),
+                     'organization': {'name': 'House'}, 'classification': ['referral']}
+                    for j in range(n_actions)],
+        'votes': [{'id': 'vote/{}/{}'.format(i, version), 'motion_text': 'passage',
+                   'start_date': '2024-02-01', 'result': 'pass',
+                   'counts': [{'option': 'yes', 'value': 10}, {'option': 'no', 'value': 2}]}],
+    }
+
+
+def build_bills(n, repeat_every=50, seed=0):
+    '''
+    Builds raw bills, repeating every `repeat_every`th bill with newer
+    actions a few bills later, within the same load batch.
+    '''
+    rng = random.Random(seed)
+    bills = []
+    for i in range(n):
+        bills.append(build_bill(i, rng))
+        if i % repeat_every == 0 and i >= 3:
+            bills.append(build_bill(i - 3, rng, version=1))
+    return bills
+
+
+def timed(label, function, repeat=200):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print("{:<40} p50 {:8.3f} ms".format(label, 1000 * times[len(times) // 2]))
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    bills = build_bills(n)
+    last = {bill['id']: bill for bill in bills}
+    print("{} bills, {} of them repeated".format(n, len(bills) - n))
+
+    by_state = {}
+    for bill in bills:
+        state = STATES[int(bill['id'].split('/')[1]) % len(STATES)]
+        by_state.setdefault(state, []).append(bill)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = database.BillStore(os.path.join(directory, 'bills.db'))
+        start = time.perf_counter()
+        for state, state_bills in by_state.items():
+            store.load(state_bills, state, topic='climate')
+            store.load(state_bills[::10], state, topic='energy')
+        print("{:<40} {:8.3f} s".format('load', time.perf_counter() - start))
+
+        assert store.count_bills() == n
+        for bill_id in ['ocd-bill/{}'.format(i) for i in range(0, n, n // 20 or 1)]:
+            expected = last[bill_id]
+            assert len(store.get_actions(bill_id)) == len(expected['actions'])
+            assert [v['id'] for v in store.get_votes(bill_id)] == [expected['votes'][0]['id']]
+
+        timed('state, limit 50', lambda: store.get_bills(state='State 07', limit=50))
+        timed('state and topic, limit 50',
+              lambda: store.get_bills(state='State 07', topic='energy', limit=50))
+        timed('bill by identifier', lambda: store.get_bill('HB 1234', 'State 00'))
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+'''
+Benchmarks incremental updates of the recommender model.
+
+Run from the repository root:
+
+    python benchmarks/bench_incremental.py [number_of_opportunities]
+
+Compares adding one opportunity or onboarding one user with refitting on
+the whole corpus (20,000 opportunities by default), and checks that after
+`rebuild` the incrementally grown model scores like a full refit.
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+import recommender
+from bench_recommender import build_opportunities, build_users
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print("{:<40} {:10.2f} ms".format(label, (time.perf_counter() - start) * 1000))
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    opps = build_opportunities(n + 100)
+    users = build_users(20)
+    print("{} synthetic opportunities".format(n))
+
+    model = recommender.fit_model(opps.iloc[:n])
+    timed('full refit with one more opportunity', lambda: recommender.fit_model(opps.iloc[:n + 1]))
+    timed('add_items, one opportunity', lambda: model.add_items(opps.iloc[n:n + 1]))
+    timed('add_items, 99 opportunities', lambda: model.add_items(opps.iloc[n + 1:]))
+    timed('recommend for a new user', lambda: model.recommend(users[0]))
+    timed('rebuild', model.rebuild)
+
+    full = recommender.fit_model(opps)
+    for user in users:
+        assert np.allclose(model.recommend(user)['score'],
+                           full.recommend(user)['score'])
+
+
+if __name__ == '__main__':
+    main()
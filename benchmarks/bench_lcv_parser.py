@@ -0,0 +1,102 @@
+'''
+Benchmarks the LCV scorecard parser against the original implementation.
+
+Run from the repository root:
+
+    python benchmarks/bench_lcv_parser.py [saved_members_page.html]
+
+Without a saved copy of https://scorecard.lcv.org/members-of-congress, a
+synthetic page with the same structure and ~535 members is used.
+'''
+import importlib.util
+import os
+import sys
+import timeit
+import warnings
+from bs4 import BeautifulSoup, GuessedAtParserWarning
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import lcv_scraper
+
+
+def legacy_parse(html):
+    '''
+    The original parser, kept here as the benchmark baseline. No parser is
+    named, as in the original, so BeautifulSoup picks lxml when it is
+    installed.
+    '''
+    soup = BeautifulSoup(html)
+    congress = []
+    url_base = 'https://scorecard.lcv.org'
+    for div in soup.find_all('div', class_="tableRow"):
+        member = {}
+        for span in div.find_all('span'):
+            if "tableHeader" in str(span):
+                continue
+            if "mocName" in str(span):
+                member['name'] = span.text
+                for a in span.find_all('a'):
+                    member['lcv_link'] = url_base + a['href']
+            elif "mocParty" in str(span):
+                member["party"] = span.text
+            elif "mocState" in str(span):
+                if len(span.text) == 2:
+                    member["congress"] = "Senate"
+                    member["district"] = None
+                else:
+                    member["congress"] = "House"
+                    member["district"] = span.text[-2:]
+                member["state"] = span.text[:2]
+            elif "mocRating" in str(span):
+                member["lcv_rating"] = span.text
+            if member and member not in congress:
+                congress.append(member)
+    return congress
+
+
+def build_synthetic_page(senators=100, representatives=435):
+    '''
+    Builds a page shaped like the LCV members table.
+    '''
+    rows = ['<div class="tableRow"><span class="tableHeader mocName">Name</span>'
+            '<span class="tableHeader mocParty">Party</span>'
+            '<span class="tableHeader mocState">State</span>'
+            '<span class="tableHeader mocRating">Score</span></div>']
+    for i in range(senators + representatives):
+        state = 'S{:02d}'.format(i % 50)[:2] if i < senators else 'IL-{:02d}'.format(i % 99)
+        rows.append(
+            '<div class="tableRow"><span class="mocName"><a href="/moc/member-{0}">'
+            'Member {0}</a></span><span class="mocParty">{1}</span>'
+            '<span class="mocState">{2}</span><span class="mocRating">{3}%</span>'
+            '</div>'.format(i, 'DR'[i % 2], state, i % 100))
+    return ('<html><body><div class="scorecard">' + ''.join(rows) +
+            '</div></body></html>')
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            html = f.read()
+    else:
+        html = build_synthetic_page()
+    warnings.filterwarnings('ignore', category=GuessedAtParserWarning)
+
+    baseline = legacy_parse(html)
+    parsers = ['stream', 'html.parser']
+    if importlib.util.find_spec('lxml') is not None:
+        parsers.append('lxml')
+
+    runs = 5
+    legacy_time = timeit.timeit(lambda: legacy_parse(html), number=runs) / runs
+    print("{:<12} {:8.1f} ms  {} members".format('legacy', 1000 * legacy_time, len(baseline)))
+    for parser in parsers:
+        members = list(lcv_scraper.parse_lcv_page(html, parser))
+        assert members == baseline, parser + " output differs from legacy parser"
+        seconds = timeit.timeit(lambda: list(lcv_scraper.parse_lcv_page(html, parser)),
+                                number=runs) / runs
+        print("{:<12} {:8.1f} ms  {:5.1f}x faster".format(
+            parser, 1000 * seconds, legacy_time / seconds))
+
+
+if __name__ == '__main__':
+    main()
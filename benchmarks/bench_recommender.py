@@ -0,0 +1,108 @@
+'''
+Benchmarks the recommender model against the notebook's dense approach.
+
+Run from the repository root:
+
+    python benchmarks/bench_recommender.py [number_of_opportunities]
+
+Builds synthetic opportunities (5,000 by default) and users, checks that
+the model's similarity scores match TfidfVectorizer plus linear_kernel, and
+times fitting, loading and per-request latency.
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+import recommender
+
+WORDS = ['word{}'.format(i) for i in range(3000)] + [
+    'volunteer', 'food', 'bank', 'voter', 'registration', 'climate', 'park',
+    'cleanup', 'tutoring', 'mentoring', 'shelter', 'housing', 'library']
+
+
+def build_opportunities(n, seed=0):
+    '''
+    Builds synthetic opportunities with 40-word descriptions.
+    '''
+    rng = random.Random(seed)
+    opps = pd.DataFrame({
+        'Event Name': ['Event {}'.format(i) for i in range(n)],
+        'Details': [' '.join(rng.choices(WORDS, k=30)) for _ in range(n)],
+        'Like': [' '.join(rng.choices(WORDS, k=10)) for _ in range(n)],
+        'Dislike': [' '.join(rng.choices(WORDS, k=5)) for _ in range(n)],
+    })
+    opps['combined_text'] = opps['Details'] + opps['Like']
+    return opps
+
+
+def build_users(n, seed=1):
+    '''
+    Builds synthetic user preferences.
+    '''
+    rng = random.Random(seed)
+    return [{'Like': ' '.join(rng.choices(WORDS, k=15)),
+             'Dislike': ' '.join(rng.choices(WORDS, k=5))} for _ in range(n)]
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print("{:<40} {:10.1f} ms".format(label, (time.perf_counter() - start) * 1000))
+    return result
+
+
+def latency(label, function, inputs):
+    times = []
+    for value in inputs:
+        start = time.perf_counter()
+        function(value)
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    print("{:<40} p50 {:6.2f} ms   p99 {:6.2f} ms".format(
+        label, np.percentile(times, 50), np.percentile(times, 99)))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    opps = build_opportunities(n)
+    users = build_users(500)
+    print("{} synthetic opportunities".format(n))
+
+    def notebook():
+        documents = recommender.clean_strings(opps['combined_text'])
+        matrix = TfidfVectorizer().fit_transform(documents)
+        return linear_kernel(matrix, matrix)
+
+    dense = timed('notebook fit + N x N linear_kernel', notebook)
+    model = timed('fit_model', lambda: recommender.fit_model(opps))
+    sparse_bytes = model.matrix.data.nbytes + model.matrix.indices.nbytes + model.matrix.indptr.nbytes
+    print("{:<40} {:10.1f} MB".format('N x N similarity matrix', dense.nbytes / 1e6))
+    print("{:<40} {:10.1f} MB".format('model TF-IDF matrix', sparse_bytes / 1e6))
+
+    for target in (0, n // 2, n - 1):
+        expected = sorted(enumerate(dense[target]), key=lambda x: x[1], reverse=True)[1:11]
+        result = model.similar_items(opps['Event Name'][target])
+        assert np.allclose(result['score'], [s for _, s in expected])
+
+    with tempfile.TemporaryDirectory() as root:
+        timed('save', lambda: model.save(root))
+        loaded = timed('load_model', lambda: recommender.load_model(root))
+    assert (loaded.recommend(users[0])['index'] == model.recommend(users[0])['index']).all()
+
+    names = list(opps['Event Name'].sample(200, random_state=0))
+    latency('notebook sorted() over a dense row',
+            lambda i: sorted(enumerate(dense[i]), key=lambda x: x[1], reverse=True)[1:11],
+            range(200))
+    latency('similar_items, k=10', loaded.similar_items, names)
+    latency('recommend, k=10', loaded.recommend, users)
+
+
+if __name__ == '__main__':
+    main()
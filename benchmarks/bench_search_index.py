@@ -0,0 +1,88 @@
+'''
+Benchmarks full-text queries against the local search index.
+
+Run from the repository root:
+
+    python benchmarks/bench_search_index.py [number_of_bills]
+
+Indexes synthetic bill rows (200,000 by default), checks that keyword and
+phrase searches find the expected bills, and times typical queries.
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import search_index
+
+WORDS = ('act concerning amends provides relating public state department '
+         'program fund county municipal').split()
+TOPICS = ['topic{:03d}'.format(i) for i in range(200)] + [
+    'health', 'education', 'tax', 'budget', 'highway', 'housing', 'energy',
+    'climate', 'water', 'transit', 'insurance', 'labor', 'election', 'police']
+STATES = ['State {:02d}'.format(i) for i in range(50)]
+
+
+def build_rows(n, seed=0):
+    '''
+    Builds synthetic rows for the bills table, each on two of ~200 topics
+    so a topic matches about 1% of bills; every 100th bill is about clean
+    water.
+    '''
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        words = rng.sample(TOPICS, 2) + rng.sample(WORDS, 4)
+        if i % 100 == 0:
+            words += ['clean', 'water']
+        rows.append({
+            'openstates_id': 'ocd-bill/{}'.format(i),
+            'identifier': 'HB {}'.format(i),
+            'title': 'An act ' + ' '.join(words[:4]),
+            'state': rng.choice(STATES),
+            'create_date': 'March 01, 2022',
+            'abstract': ' '.join(words * 5),
+        })
+    return rows
+
+
+def timed(label, function, repeat=20):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:<40} {:8.2f} ms".format(label, best * 1000))
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rows = build_rows(n)
+    print("{} synthetic bills".format(n))
+
+    with tempfile.TemporaryDirectory() as root:
+        index = search_index.SearchIndex(os.path.join(root, 'search.db'))
+        timed('index', lambda: index.add_rows('bills', rows), repeat=1)
+        index.optimize()
+
+        results = timed('phrase "clean water", top 20',
+                        lambda: index.search('clean water'))
+        assert len(results) == 20
+        assert all(int(r['source_id'].split('/')[1]) % 100 == 0 for r in results)
+        timed('"transit" OR "water", top 20', lambda: index.search(['transit', 'water']))
+        results = timed('"transit" in one state, top 20',
+                        lambda: index.search('transit', scope=STATES[3]))
+        assert all(r['scope'] == STATES[3] for r in results)
+
+        changed = dict(rows[1], title='An act concerning zeppelins')
+        timed('update one bill', lambda: index.add_rows('bills', [changed]), repeat=5)
+        assert [r['source_id'] for r in index.search('zeppelin')] == [changed['openstates_id']]
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+'''
+Benchmarks reads from the local Parquet store against SQLite.
+
+Run from the repository root:
+
+    python benchmarks/bench_storage.py [number_of_bills]
+
+Writes synthetic bill rows (200,000 by default) for 50 states over eight
+years to a `storage.ParquetBackend` and to an SQLite table indexed on
+state, checks that both return the same rows, and times typical
+dashboard queries against each.
+'''
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pandas as pd
+import storage
+
+STATES = ['State {:02d}'.format(i) for i in range(50)]
+
+
+def build_rows(n, seed=0):
+    '''
+    Builds synthetic rows for the bills table.
+    '''
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        title = 'An act concerning climate item {}'.format(i % 5000)
+        rows.append({
+            'openstates_id': 'ocd-bill/{}'.format(i),
+            'identifier': 'HB {}'.format(i),
+            'title': title,
+            'openstates_link': 'https://openstates.org/bills/{}'.format(i),
+            'state': rng.choice(STATES),
+            'create_date': 'March {:02d}, {}'.format(rng.randint(1, 28),
+                                                     rng.randint(2015, 2022)),
+            'latest_action_date': 'October 01, 2022',
+            'latest_action_description': 'Referred to committee',
+            'abstract': 'Abstract text for {} '.format(title) * 4,
+        })
+    return rows
+
+
+def timed(label, function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:<40} {:8.1f} ms".format(label, best * 1000))
+    return result
+
+
+def same_rows(left, right, columns):
+    left = left[columns].sort_values(columns[0]).reset_index(drop=True)
+    right = right[columns].sort_values(columns[0]).reset_index(drop=True)
+    return left.equals(right)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rows = build_rows(n)
+    fields = storage.TABLES['bills']['fields']
+    print("{} synthetic bills".format(n))
+
+    with tempfile.TemporaryDirectory() as root:
+        parquet = storage.ParquetBackend(os.path.join(root, 'store'))
+        timed('parquet write', lambda: parquet.write('bills', rows), repeat=1)
+
+        connection = sqlite3.connect(os.path.join(root, 'bills.db'))
+
+        def write_sqlite():
+            pd.DataFrame.from_records(rows, columns=fields).to_sql(
+                'bills', connection, if_exists='replace', index=False)
+            connection.execute('CREATE INDEX idx_state ON bills (state)')
+            connection.commit()
+
+        timed('sqlite write', write_sqlite, repeat=1)
+
+        state = STATES[7]
+        queries = [
+            ('one state', {'state': state}, "state = ?", [state]),
+            ('one state, one year', {'state': state, 'year': 2020},
+             "state = ? AND create_date LIKE ?", [state, '%2020']),
+            ('three states', {'state': STATES[:3]},
+             "state IN (?, ?, ?)", STATES[:3]),
+        ]
+        for label, filters, where, params in queries:
+            sql = 'SELECT {} FROM bills WHERE {}'.format(', '.join(fields), where)
+            from_parquet = timed('parquet: ' + label,
+                                 lambda: parquet.read('bills', filters))
+            from_sqlite = timed('sqlite:  ' + label,
+                                lambda: pd.read_sql_query(sql, connection, params=params))
+            assert same_rows(from_parquet, from_sqlite, fields), label + ' differs'
+
+        columns = ['state', 'create_date']
+        from_parquet = timed('parquet: two columns, all rows',
+                             lambda: parquet.read('bills', columns=columns))
+        from_sqlite = timed('sqlite:  two columns, all rows',
+                            lambda: pd.read_sql_query('SELECT state, create_date FROM bills',
+                                                      connection))
+        assert len(from_parquet) == len(from_sqlite) == n
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
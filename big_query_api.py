@@ -1,25 +1,35 @@
 """
 API to push data to BigQuery.
 """
-import os
 import openstates_api
 import lcv_scraper
 import councilmatic_api
-from bs4 import BeautifulSoup
+import sync_checkpoints
+import bigquery_writer
+import bigquery_upsert
+import pipeline
+import roster_index
+import bill_transform
+import storage
 from datetime import datetime
 from google.cloud import bigquery
 
 
-def import_lcv_data(first_create):
+def import_lcv_data(first_create, current_only=True, backend=None):
     '''
     Scrapes the LCV website and pushes resulting data to BigQuery.
     
     Inputs:
         - first_create (bool): true if table needs to be created
+        - current_only (bool): true to keep only members found on the
+            current Senate and House rosters, deleting members who have
+            left from the table
+        - backend: storage backend to write to, BigQuery by default
     
-    Returns: Nothing
+    Returns: (int) number of congress members scraped
     '''
-    if first_create:
+    backend = backend or storage.BigQueryBackend()
+    if first_create and isinstance(backend, storage.BigQueryBackend):
         schema = [bigquery.SchemaField('name', "STRING", mode="REQUIRED"),
               bigquery.SchemaField('congress', "STRING", mode="REQUIRED"),
               bigquery.SchemaField('party', "STRING", mode="REQUIRED"),
@@ -28,23 +38,41 @@ def import_lcv_data(first_create):
               bigquery.SchemaField('lcv_rating', "STRING"),
               bigquery.SchemaField('lcv_link', "STRING")]
         insert_table_to_bigquery(schema, 'sixth-window-364916.issuehub.congress_members')
-    lcv_data = lcv_scraper.get_lcv_data()
-    schema_fields = ['name', 'congress', 'party', 'state',
-        'district', 'lcv_rating', 'lcv_link']
-    write_rows_to_bigquery(schema_fields, lcv_data, 'congress_members')
-
-
-def import_legislation(state, keywords, first_create):
+    transform = lambda members: members
+    if current_only:
+        match_stats = {}
+        indexes = roster_index.build_indexes(lcv_scraper.get_current_senators(with_states=True),
+            lcv_scraper.get_current_representatives(with_states=True))
+        transform = lambda members: roster_index.iter_current_members(
+            members, indexes, match_stats)
+    members = pipeline.HighWaterMark('name')
+    pipeline.run_pipeline(members.track(lcv_scraper.iter_lcv_data()), transform,
+        lambda rows: backend.write('congress_members', rows, replace=current_only))
+    if current_only:
+        print("Roster match quality: {}".format(match_stats))
+    return members.count
+
+
+def import_legislation(state, keywords, first_create, incremental=False,
+                       checkpoints=None, backend=None, search=None):
     '''
     Retrieves relevant legislation from Open States and pushes the data to BigQuery.
     
     Inputs:
+        - state (str): state to search
         - keywords (list of str): keywords to search for
         - first_create (bool): true if table needs to be created
+        - incremental (bool): true to only fetch bills updated since the
+            last sync of this state and keyword set
+        - checkpoints (CheckpointStore): where sync high-water marks are
+            kept, a local SQLite file by default
+        - backend: storage backend to write to, BigQuery by default
+        - search (SearchIndex): full-text index to update, if any
     
-    Returns: Nothing
+    Returns: (int) number of bills retrieved
     '''
-    if first_create:
+    backend = backend or storage.BigQueryBackend()
+    if first_create and isinstance(backend, storage.BigQueryBackend):
         schema = [bigquery.SchemaField('openstates_id', "STRING", mode="REQUIRED"),
             bigquery.SchemaField('identifier', "STRING", mode="REQUIRED"),
             bigquery.SchemaField('title', "STRING", mode="REQUIRED"),
@@ -55,25 +83,43 @@ def import_legislation(state, keywords, first_create):
             bigquery.SchemaField('latest_action_description', "STRING"),
             bigquery.SchemaField('abstract', "STRING")]
         insert_table_to_bigquery(schema, 'sixth-window-364916.issuehub.bills')
-    bills = openstates_api.get_data_for_state_and_topic(state, keywords)
-    schema_fields = ['openstates_id', 'identifier', 'title',
-        'openstates_link', 'state', 'create_date', 'latest_action_date',
-        'latest_action_description', 'abstract']
-    bill_data = get_bill_data(bills, state)
-    write_rows_to_bigquery(schema_fields, bill_data, 'bills')
-
-
-def get_local_data(location, keywords, first_create):
+    updated_since = None
+    if incremental:
+        checkpoints = checkpoints or sync_checkpoints.CheckpointStore()
+        updated_since = checkpoints.get('openstates', state, keywords)
+    api_call = openstates_api.OpenStatesAPI(state, keywords,
+                                            updated_since=updated_since)
+    sink = lambda rows: backend.write('bills', rows)
+    if search:
+        sink = search.wrap_sink('bills', sink)
+    latest = pipeline.HighWaterMark('updated_at')
+    pipeline.run_pipeline(latest.track(api_call.iter_bills()),
+        lambda bills: bill_transform.iter_bill_rows(bills, state), sink)
+    if latest.count == 0:
+        if updated_since is None:
+            print("No bills found.")
+        else:
+            print("No bills updated since {}.".format(updated_since))
+    elif incremental:
+        checkpoints.set('openstates', state, keywords, latest.value)
+    return latest.count
+
+
+def get_local_data(location, keywords, first_create, backend=None, search=None):
     '''
     Retrieves local legislation from Councilmatic and pushes the data to BigQuery.
     
     Inputs:
+        - location (str): the state or county to get bills for
         - keywords (list of str): keywords to search for
         - first_create (bool): true if table needs to be created
+        - backend: storage backend to write to, BigQuery by default
+        - search (SearchIndex): full-text index to update, if any
     
-    Returns: Nothing
+    Returns: (int) number of bills retrieved
     '''
-    if first_create:
+    backend = backend or storage.BigQueryBackend()
+    if first_create and isinstance(backend, storage.BigQueryBackend):
         schema = [bigquery.SchemaField('councilmatic_id', "STRING", mode="REQUIRED"),
             bigquery.SchemaField('identifier', "STRING", mode="REQUIRED"),
             bigquery.SchemaField('title', "STRING", mode="REQUIRED"),
@@ -81,11 +127,14 @@ def get_local_data(location, keywords, first_create):
             bigquery.SchemaField('updated_date', "STRING", mode="REQUIRED"),
             bigquery.SchemaField('from_org', "STRING", mode="REQUIRED")]
         insert_table_to_bigquery(schema, 'sixth-window-364916.issuehub.local_bills')
-    bills = councilmatic_api.get_data_for_location_and_topic(location, keywords)
-    schema_fields = ['councilmatic_id', 'identifier', 'title', 
-        'jurisdiction', 'updated_date', 'from_org']
-    bill_data = get_local_bill_data(bills, location)
-    write_rows_to_bigquery(schema_fields, bill_data, 'local_bills')
+    api_call = councilmatic_api.CouncilmaticAPI(location, keywords)
+    sink = lambda rows: backend.write('local_bills', rows)
+    if search:
+        sink = search.wrap_sink('local_bills', sink)
+    latest = pipeline.HighWaterMark('updated_at')
+    pipeline.run_pipeline(latest.track(api_call.iter_bills()),
+        lambda bills: iter_local_bill_data(bills, location), sink)
+    return latest.count
 
 
 def get_local_bill_data(bills, location):
@@ -98,7 +147,19 @@ def get_local_bill_data(bills, location):
     
     Returns: (list of dicts) reformated bill data
     '''
-    bill_data = []
+    return list(iter_local_bill_data(bills, location))
+
+
+def iter_local_bill_data(bills, location):
+    '''
+    Lazily converts local bill data to a more usable format.
+    
+    Inputs:
+        - bills (iterable of dicts) bill information
+        - location (str): locality
+    
+    Returns: (generator of dicts) reformated bill data
+    '''
     for bill in bills:
         current_bill = {}
         current_bill['councilmatic_id'] = bill['id']
@@ -107,8 +168,7 @@ def get_local_bill_data(bills, location):
         current_bill['updated_date'] = bill['updated_at']
         current_bill['from_org'] = bill['from_organization']['name']
         current_bill['jurisdiction'] = location
-        bill_data.append(current_bill)
-    return bill_data
+        yield current_bill
 
 
 def get_bill_data(bills, state):
@@ -121,37 +181,37 @@ def get_bill_data(bills, state):
     
     Returns: (list of dicts) reformated bill data
     '''
-    bill_data = []
+    return list(iter_bill_data(bills, state))
+
+
+def iter_bill_data(bills, state):
+    '''
+    Lazily converts state bill data to a more usable format.
+    
+    Inputs:
+        - bills (iterable of dicts) bill information
+        - state (str): state
+    
+    Returns: (generator of dicts) reformated bill data
+    '''
     for bill in bills:
         current_bill = {}
-        current_bill['openstates_id'] = bill[0]['id']
-        current_bill['identifier'] = bill[0]['identifier']
-        current_bill['title'] = bill[0]['title']
-        current_bill['openstates_link'] = bill[0]['openstates_url']
-        current_bill['create_date'] = get_date_string(bill[0]['created_at'])
-        current_bill['latest_action_date'] = get_date_string(bill[0]['latest_action_date'])
-        current_bill['latest_action_description'] = bill[0]['latest_action_description']
+        current_bill['openstates_id'] = bill['id']
+        current_bill['identifier'] = bill['identifier']
+        current_bill['title'] = bill['title']
+        current_bill['openstates_link'] = bill['openstates_url']
+        current_bill['create_date'] = get_date_string(bill['created_at'])
+        current_bill['latest_action_date'] = get_date_string(bill['latest_action_date'])
+        current_bill['latest_action_description'] = bill['latest_action_description']
         current_bill['state'] = state
 
-        if bill[0]['abstracts']:
-            abstract = bill[0]['abstracts'][0]['abstract']
-            if '<' in abstract:
-                soup = BeautifulSoup(abstract)
-                current_bill['abstract'] = ''
-                for p in soup.find_all('p'):
-                    if p.text == current_bill['title']:
-                        continue
-                    if current_bill['abstract']:
-                        current_bill['abstract'] += " "
-                    current_bill['abstract'] += p.text.strip()
-            else:
-                current_bill['abstract'] = abstract
+        if bill['abstracts']:
+            current_bill['abstract'] = bill_transform.clean_abstract(
+                bill['abstracts'][0]['abstract'], current_bill['title'])
         else: 
             current_bill['abstract'] = ''
 
-        bill_data.append(current_bill)
-
-    return bill_data
+        yield current_bill
 
 
 def get_date_string(full_date):
@@ -177,62 +237,49 @@ def create_dataset_bigquery():
 
     Returns: Nothing, but prints the name of the dataset
     '''
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = './issuehub_cloud_service_admin.json'
-    client = bigquery.Client()
+    client = bigquery_writer.get_client()
     dataset = bigquery.Dataset('issuehub')
     dataset.location = "US"
     dataset = client.create_dataset(dataset, timeout=30)
     print("Created dataset {}.{}".format(dataset.project, dataset.dataset_id))
 
 
-def write_rows_to_bigquery(schema_fields, data, table_id):
+def write_rows_to_bigquery(schema_fields, data, table_id, client=None):
     """
-    Writes rows of data to a BigQuery table.
+    Writes rows of data to a BigQuery table in bounded batches, switching
+    to a load job for large backfills.
 
     Inputs:
         - schema_fields (list of str): schema of the table
-        - data (list of dicts): rows of bill data to insert
+        - data (iterable of dicts): rows of bill data to insert, may be a
+            generator
         - table_id (str): id of the table
+        - client (bigquery.Client): client to use, the shared one by default
     
     Returns: Nothing, but prints when successful
     """
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = './issuehub_cloud_service_admin.json'
-    client = bigquery.Client()
-
-    table_ref = client.dataset('issuehub').table(table_id) 
-    table = client.get_table(table_ref)
-
-    insert_list = []
-    for row in data:
-        values = []
-        for key in schema_fields:
-            values.append(row[key])
-        insert_list.append(tuple(values))
-
-    errors = client.insert_rows(table, insert_list) 
-    if errors != []:
-        print(errors)
-    print("Data successfully inserted into {}.".format(table_id))
+    with bigquery_writer.BigQueryWriter(table_id, schema_fields, client) as writer:
+        writer.write(data)
+    print("{} rows successfully inserted into {}.".format(writer.rows_written, table_id))
 
 
-def remove_rows_bigquery(table, condition):
+def remove_rows_bigquery(table, conditions):
     '''
-    Removes rows from a BigQuery table.
+    Removes rows from a BigQuery table using a parameterized query.
 
     Inputs:
         - table (str): the table to remove rows from
-        - condition (str): the condition of rows to remove
+        - conditions (dict): column to value; rows matching all are removed
     
     Returns: Nothing, but prints when successful
     '''
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = './issuehub_cloud_service_admin.json'
-    client = bigquery.Client()
+    client = bigquery_writer.get_client()
 
-    sql = "DELETE FROM " + table + " WHERE " + condition
+    sql, params = bigquery_upsert.build_delete_sql(table, conditions)
 
-    query_job = client.query(sql)
+    query_job = client.query(sql, job_config=bigquery_upsert.get_query_config(params))
     query_job.result()
-    print("Rows removed from {} where {}".format(table, condition))
+    print("Rows removed from {} where {}".format(table, conditions))
 
 
 def insert_table_to_bigquery(schema, table_id):
@@ -245,8 +292,7 @@ def insert_table_to_bigquery(schema, table_id):
 
     Returns: Nothing, but prints when successful
     '''
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = './issuehub_cloud_service_admin.json'
-    client = bigquery.Client()
+    client = bigquery_writer.get_client()
 
     table = bigquery.Table(table_id, schema=schema)
     table = client.create_table(table)
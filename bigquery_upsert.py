@@ -0,0 +1,204 @@
+'''
+Idempotent upserts and parameterized deletes for BigQuery tables.
+
+Rows are loaded into a short-lived staging table and merged into the
+target on its key columns, so re-running an import updates existing rows
+instead of appending duplicates. The SQL builders are plain functions and
+can be tested without a warehouse.
+'''
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from google.cloud import bigquery
+import bigquery_writer
+
+TABLE_KEYS = {
+    'bills': ['openstates_id'],
+    'local_bills': ['councilmatic_id'],
+    'congress_members': ['name', 'congress'],
+}
+STAGING_EXPIRATION = timedelta(hours=1)
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+TABLE_PATH = re.compile(r'^[A-Za-z0-9_-]+(\.[A-Za-z0-9_-]+){0,2}$')
+
+
+def quote_column(name):
+    '''
+    Quotes a column name, rejecting anything that is not a plain identifier.
+    Column names cannot be passed as query parameters, so they are checked
+    here instead.
+
+    Inputs:
+        - name (str): column name
+
+    Returns: (str) the quoted column name
+    '''
+    if not IDENTIFIER.match(name):
+        raise ValueError("Invalid column name: " + repr(name))
+    return '`' + name + '`'
+
+
+def quote_table(table_id):
+    '''
+    Quotes a table path of the form [project.]dataset.table.
+
+    Inputs:
+        - table_id (str): table path
+
+    Returns: (str) the quoted table path
+    '''
+    if not TABLE_PATH.match(table_id):
+        raise ValueError("Invalid table id: " + repr(table_id))
+    return '`' + table_id + '`'
+
+
+def build_merge_sql(target_id, staging_id, key_fields, schema_fields,
+                    delete_missing=False):
+    '''
+    Builds a MERGE statement that upserts the staging table into the
+    target. Duplicate keys within the staging table are collapsed to one
+    row first, since MERGE rejects multiple source rows per target row.
+
+    Inputs:
+        - target_id (str): table to merge into
+        - staging_id (str): table holding the new rows
+        - key_fields (list of str): columns identifying a row
+        - schema_fields (list of str): every column of the table
+        - delete_missing (bool): true to also delete target rows whose key
+            is not in the staging table, so the target ends up holding
+            exactly the staged rows
+
+    Returns: (str) the MERGE statement
+    '''
+    keys = [quote_column(key) for key in key_fields]
+    columns = [quote_column(field) for field in schema_fields]
+    updates = [column for column in columns if column not in keys]
+
+    on_clause = ' AND '.join('T.{0} = S.{0}'.format(key) for key in keys)
+    insert_columns = ', '.join(columns)
+    insert_values = ', '.join('S.' + column for column in columns)
+
+    sql = ("MERGE {target} T\n"
+           "USING (\n"
+           "  SELECT * FROM {staging}\n"
+           "  WHERE TRUE\n"
+           "  QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition}) = 1\n"
+           ") S\n"
+           "ON {on_clause}\n").format(
+               target=quote_table(target_id), staging=quote_table(staging_id),
+               partition=', '.join(keys), on_clause=on_clause)
+    if updates:
+        sql += "WHEN MATCHED THEN\n  UPDATE SET {}\n".format(
+            ', '.join('{0} = S.{0}'.format(column) for column in updates))
+    sql += "WHEN NOT MATCHED THEN\n  INSERT ({}) VALUES ({})".format(
+        insert_columns, insert_values)
+    if delete_missing:
+        sql += "\nWHEN NOT MATCHED BY SOURCE THEN\n  DELETE"
+    return sql
+
+
+def get_parameter_type(value):
+    '''
+    Maps a Python value to the matching BigQuery parameter type.
+
+    Inputs:
+        - value: the parameter value
+
+    Returns: (str) the BigQuery type name
+    '''
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, int):
+        return 'INT64'
+    if isinstance(value, float):
+        return 'FLOAT64'
+    return 'STRING'
+
+
+def build_delete_sql(table_id, conditions):
+    '''
+    Builds a parameterized DELETE statement.
+
+    Inputs:
+        - table_id (str): table to delete from
+        - conditions (dict): column to value; rows matching all are removed
+
+    Returns: (tuple) the SQL string and a list of (name, type, value)
+        parameter tuples
+    '''
+    if not conditions:
+        raise ValueError("Refusing to delete without conditions")
+    clauses = []
+    params = []
+    for i, (column, value) in enumerate(sorted(conditions.items())):
+        name = 'p' + str(i)
+        clauses.append('{} = @{}'.format(quote_column(column), name))
+        params.append((name, get_parameter_type(value), value))
+    sql = 'DELETE FROM {} WHERE {}'.format(quote_table(table_id),
+                                           ' AND '.join(clauses))
+    return sql, params
+
+
+def get_query_config(params):
+    '''
+    Converts parameter tuples into a BigQuery job configuration.
+
+    Inputs:
+        - params (list of tuples): (name, type, value) parameters
+
+    Returns: (bigquery.QueryJobConfig) the job configuration
+    '''
+    return bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter(name, param_type, value)
+        for name, param_type, value in params])
+
+
+def upsert_rows(schema_fields, data, table_id, key_fields=None, client=None,
+                dataset_id=bigquery_writer.DATASET_ID, delete_missing=False):
+    '''
+    Loads rows into a temporary staging table and merges them into the
+    target on its key columns.
+
+    Inputs:
+        - schema_fields (list of str): schema of the table
+        - data (iterable of dicts): rows to upsert, may be a generator
+        - table_id (str): id of the target table
+        - key_fields (list of str): key columns, looked up in `TABLE_KEYS`
+            by default
+        - client (bigquery.Client): client to use, the shared one by default
+        - dataset_id (str): dataset holding the table
+        - delete_missing (bool): true to also delete rows whose key is not
+            in data; nothing is deleted when data is empty
+
+    Returns: (int) number of rows affected by the merge
+    '''
+    client = client or bigquery_writer.get_client()
+    key_fields = key_fields or TABLE_KEYS[table_id]
+    target = client.get_table(dataset_id + '.' + table_id)
+    target_id = '{}.{}.{}'.format(target.project, target.dataset_id, target.table_id)
+
+    staging_name = '{}_staging_{}'.format(table_id, uuid.uuid4().hex[:12])
+    staging = bigquery.Table('{}.{}.{}'.format(target.project, target.dataset_id,
+                                               staging_name),
+                             schema=target.schema)
+    staging.expires = datetime.now(timezone.utc) + STAGING_EXPIRATION
+    staging = client.create_table(staging)
+    staging_id = '{}.{}.{}'.format(staging.project, staging.dataset_id, staging.table_id)
+
+    try:
+        with bigquery_writer.BigQueryWriter(staging_name, schema_fields, client,
+                                            dataset_id=dataset_id,
+                                            load_job_threshold=0) as writer:
+            writer.write(data)
+        if writer.rows_written == 0:
+            return 0
+        job = client.query(build_merge_sql(target_id, staging_id, key_fields,
+                                           schema_fields, delete_missing))
+        job.result()
+        affected = job.num_dml_affected_rows or 0
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+    print("Upserted {} rows into {}.".format(affected, table_id))
+    return affected
@@ -0,0 +1,262 @@
+'''
+Batched, streaming writer for BigQuery tables.
+
+Rows can come from any iterable, including generators, and are sent in
+batches bounded by row count and payload size. Once a write grows past a
+backfill threshold, the remaining rows are spooled to a newline-delimited
+JSON file and loaded with a single load job instead of streaming inserts.
+Only transient errors are retried and dead-lettered; any other error, such
+as a rejected credential or schema, is raised to the caller.
+'''
+import json
+import os
+import tempfile
+import time
+import requests
+from google.api_core import exceptions as api_exceptions
+from google.cloud import bigquery
+
+CREDENTIALS_PATH = './issuehub_cloud_service_admin.json'
+DATASET_ID = 'issuehub'
+TRANSIENT_ERRORS = (api_exceptions.TooManyRequests, api_exceptions.InternalServerError,
+                    api_exceptions.BadGateway, api_exceptions.ServiceUnavailable,
+                    api_exceptions.GatewayTimeout, requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout, ConnectionError, TimeoutError)
+
+_client = None
+
+
+def get_client():
+    '''
+    Returns a BigQuery client shared by every writer in the process.
+
+    Inputs: None
+
+    Returns: (bigquery.Client) the client
+    '''
+    global _client
+    if _client is None:
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = CREDENTIALS_PATH
+        _client = bigquery.Client()
+    return _client
+
+
+class BigQueryWriter:
+    '''
+    Writes rows to a single BigQuery table in bounded batches, retrying
+    failed rows and recording those that still fail in a dead-letter file.
+    '''
+
+    def __init__(self, table_id, schema_fields, client=None,
+                 dataset_id=DATASET_ID, max_batch_rows=500,
+                 max_batch_bytes=5_000_000, load_job_threshold=50_000,
+                 max_retries=3, dead_letter_path=None):
+        '''
+        Initializes an instance of the `BigQueryWriter` class.
+
+        Inputs:
+            - table_id (str): id of the table
+            - schema_fields (list of str): column order of the table
+            - client (bigquery.Client): client to use, the shared one by
+                default; any object with the same methods works for tests
+            - dataset_id (str): dataset holding the table
+            - max_batch_rows (int): most rows sent in one streaming insert
+            - max_batch_bytes (int): most JSON-encoded bytes in one insert
+            - load_job_threshold (int): rows after which the writer stops
+                streaming and switches to a load job, None to never switch
+            - max_retries (int): attempts for rows that fail to insert
+            - dead_letter_path (str): NDJSON file for rows that still fail,
+                '<table_id>_dead_letter.jsonl' by default
+        '''
+        self.table_id = table_id
+        self.schema_fields = schema_fields
+        self.client = client or get_client()
+        self.dataset_id = dataset_id
+        self.max_batch_rows = max_batch_rows
+        self.max_batch_bytes = max_batch_bytes
+        self.load_job_threshold = load_job_threshold
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path or table_id + '_dead_letter.jsonl'
+        self._table = None
+        self.batch = []
+        self.batch_bytes = 0
+        self.spool = None
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rows_loaded = 0
+
+    @property
+    def table(self):
+        '''
+        The table metadata, fetched once and cached.
+        '''
+        if self._table is None:
+            self._table = self.client.get_table(self.dataset_id + '.' + self.table_id)
+        return self._table
+
+    def write(self, rows):
+        '''
+        Adds rows to the table, flushing whenever a batch fills up.
+
+        Inputs:
+            - rows (iterable of dicts): rows keyed by schema field
+
+        Returns: Nothing
+        '''
+        for row in rows:
+            self.write_row(row)
+
+    def write_row(self, row):
+        '''
+        Adds a single row to the table.
+
+        Inputs:
+            - row (dict): row keyed by schema field
+
+        Returns: Nothing
+        '''
+        record = {key: row[key] for key in self.schema_fields}
+        encoded = json.dumps(record)
+
+        if (self.spool is None and self.load_job_threshold is not None
+                and self.rows_written + len(self.batch) >= self.load_job_threshold):
+            self.flush()
+            self.spool = tempfile.TemporaryFile('w+b')
+        if self.spool is not None:
+            self.spool.write(encoded.encode() + b'\n')
+            self.rows_loaded += 1
+            return
+
+        if self.batch and self.batch_bytes + len(encoded) > self.max_batch_bytes:
+            self.flush()
+        self.batch.append(record)
+        self.batch_bytes += len(encoded)
+        if len(self.batch) >= self.max_batch_rows:
+            self.flush()
+
+    def flush(self):
+        '''
+        Sends the current batch as a streaming insert. Rows reported as
+        failed, or sent in a request that failed transiently, are retried
+        with exponential backoff, then dead-lettered. Any other error is
+        raised with the unsent rows put back in the batch.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        pending = self.batch
+        self.batch = []
+        self.batch_bytes = 0
+
+        for attempt in range(self.max_retries):
+            if not pending:
+                break
+            values = [tuple(record[key] for key in self.schema_fields)
+                      for record in pending]
+            try:
+                errors = self.client.insert_rows(self.table, values)
+            except TRANSIENT_ERRORS as e:
+                errors = [{'index': i, 'errors': [str(e)]}
+                          for i in range(len(pending))]
+            except Exception:
+                self.batch = pending
+                self.batch_bytes = sum(len(json.dumps(record)) for record in pending)
+                raise
+            failed = {error['index']: error['errors'] for error in errors}
+            self.rows_written += len(pending) - len(failed)
+            if attempt == self.max_retries - 1:
+                self.write_dead_letters(
+                    [(pending[i], failed[i]) for i in sorted(failed)])
+                break
+            pending = [pending[i] for i in sorted(failed)]
+            if pending:
+                time.sleep(2 ** attempt)
+
+    def write_dead_letters(self, failures):
+        '''
+        Appends rows that could not be inserted to the dead-letter file.
+
+        Inputs:
+            - failures (list of tuples): (row, errors) pairs
+
+        Returns: Nothing
+        '''
+        if not failures:
+            return
+        with open(self.dead_letter_path, 'a') as f:
+            for record, errors in failures:
+                f.write(json.dumps({'table': self.table_id, 'row': record,
+                                    'errors': errors}, default=str) + '\n')
+        self.rows_failed += len(failures)
+        print("{} rows could not be inserted into {}; see {}.".format(
+            len(failures), self.table_id, self.dead_letter_path))
+
+    def write_buffered_dead_letters(self, error):
+        '''
+        Moves every row still buffered or spooled to the dead-letter file,
+        after writing them has failed.
+
+        Inputs:
+            - error (Exception): why the rows could not be written
+
+        Returns: Nothing
+        '''
+        records = self.batch
+        self.batch = []
+        self.batch_bytes = 0
+        if self.spool is not None:
+            self.spool.seek(0)
+            records = records + [json.loads(line) for line in self.spool]
+            self.spool.close()
+            self.spool = None
+            self.rows_loaded = 0
+        self.write_dead_letters([(record, [repr(error)]) for record in records])
+
+    def run_load_job(self):
+        '''
+        Loads the spooled rows with a newline-delimited JSON load job.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND)
+        self.spool.seek(0)
+        job = self.client.load_table_from_file(self.spool, self.table,
+                                               job_config=job_config)
+        job.result()
+        self.rows_written += self.rows_loaded
+        print("Loaded {} rows into {} with a load job.".format(
+            self.rows_loaded, self.table_id))
+
+    def close(self):
+        '''
+        Flushes any buffered rows and runs the pending load job, if any.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        if self.batch:
+            self.flush()
+        if self.spool is not None:
+            self.run_load_job()
+            self.spool.close()
+            self.spool = None
+            self.rows_loaded = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Buffered rows are written even when the block failed, and are
+        # recorded in the dead-letter file if writing them fails too.
+        try:
+            self.close()
+        except Exception as e:
+            self.write_buffered_dead_letters(e)
+            if exc_type is None:
+                raise
@@ -0,0 +1,187 @@
+'''
+Columnar transforms from raw API bill JSON to table rows.
+
+A batch of raw bills is turned into a DataFrame in one step, nested fields
+are pulled out column-wise, and dates are parsed and formatted once per
+distinct value rather than once per bill. The output columns match the
+dict rows built by `big_query_api.get_bill_data` and
+`big_query_api.get_local_bill_data`.
+'''
+import pandas as pd
+import abstract_cleaner
+import pipeline
+
+BILL_COLUMNS = ['openstates_id', 'identifier', 'title', 'openstates_link',
+                'create_date', 'latest_action_date', 'latest_action_description',
+                'state', 'abstract']
+LOCAL_BILL_COLUMNS = ['councilmatic_id', 'identifier', 'title', 'updated_date',
+                      'from_org', 'jurisdiction']
+
+
+def clean_abstract(abstract, title):
+    '''
+    Converts an HTML abstract into plain text, dropping the paragraph that
+    only repeats the title. Plain-text abstracts are returned unchanged.
+
+    Inputs:
+        - abstract (str): the abstract
+        - title (str): the bill title
+
+    Returns: (str) the cleaned abstract
+    '''
+    return abstract_cleaner.clean_abstract(abstract, title)
+
+
+def format_dates(dates):
+    '''
+    Reformats ISO timestamps as 'Month DD, YYYY', parsing each distinct
+    date once.
+
+    Inputs:
+        - dates (Series): ISO date or timestamp strings
+
+    Returns: (Series) the formatted dates, None where missing
+    '''
+    days = dates.astype(object).str[:10]
+    unique = pd.Series(days.dropna().unique())
+    formatted = pd.to_datetime(unique, format='%Y-%m-%d').dt.strftime('%B %d, %Y')
+    lookup = dict(zip(unique, formatted))
+    return days.map(lookup).astype(object).where(days.notna(), None)
+
+
+def get_first_abstracts(abstracts):
+    '''
+    Extracts the text of the first abstract of each bill.
+
+    Inputs:
+        - abstracts (Series): lists of abstract dicts
+
+    Returns: (Series) the first abstract text, '' for bills without one
+    '''
+    first = abstracts.str[0].astype(object)
+    return first.str.get('abstract').fillna('')
+
+
+def to_rows(frame):
+    '''
+    Converts a frame to dict rows, with None in place of missing values.
+
+    Inputs:
+        - frame (DataFrame): the frame
+
+    Returns: (list of dicts) one dict per row
+    '''
+    columns = []
+    for name in frame.columns:
+        column = frame[name].astype(object)
+        if column.isna().any():
+            column = column.where(column.notna(), None)
+        columns.append(column.tolist())
+    names = list(frame.columns)
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def bills_to_frame(bills, state):
+    '''
+    Converts a batch of Open States bills into a frame of table rows.
+
+    Inputs:
+        - bills (list of dicts): raw bill information
+        - state (str): state
+
+    Returns: (DataFrame) one row per bill, with `BILL_COLUMNS`
+    '''
+    if not bills:
+        return pd.DataFrame(columns=BILL_COLUMNS)
+    raw = pd.DataFrame.from_records(bills, columns=[
+        'id', 'identifier', 'title', 'openstates_url', 'created_at',
+        'latest_action_date', 'latest_action_description', 'abstracts'])
+
+    frame = pd.DataFrame({
+        'openstates_id': raw['id'],
+        'identifier': raw['identifier'],
+        'title': raw['title'],
+        'openstates_link': raw['openstates_url'],
+        'create_date': format_dates(raw['created_at']),
+        'latest_action_date': format_dates(raw['latest_action_date']),
+        'latest_action_description': raw['latest_action_description'],
+        'state': state,
+    })
+
+    abstracts = get_first_abstracts(raw['abstracts'])
+    has_html = abstracts.str.contains('<', regex=False)
+    if has_html.any():
+        abstracts = abstracts.copy()
+        abstracts[has_html] = [
+            clean_abstract(abstract, title) for abstract, title
+            in zip(abstracts[has_html], frame['title'][has_html])]
+    frame['abstract'] = abstracts
+    return frame
+
+
+def local_bills_to_frame(bills, location):
+    '''
+    Converts a batch of Councilmatic bills into a frame of table rows.
+
+    Inputs:
+        - bills (list of dicts): raw bill information
+        - location (str): locality
+
+    Returns: (DataFrame) one row per bill, with `LOCAL_BILL_COLUMNS`
+    '''
+    if not bills:
+        return pd.DataFrame(columns=LOCAL_BILL_COLUMNS)
+    raw = pd.DataFrame.from_records(bills, columns=[
+        'id', 'identifier', 'title', 'updated_at', 'from_organization'])
+    return pd.DataFrame({
+        'councilmatic_id': raw['id'],
+        'identifier': raw['identifier'],
+        'title': raw['title'],
+        'updated_date': raw['updated_at'],
+        'from_org': raw['from_organization'].astype(object).str.get('name'),
+        'jurisdiction': location,
+    })
+
+
+def to_arrow(frame):
+    '''
+    Converts a frame of rows into an Arrow table. Requires pyarrow.
+
+    Inputs:
+        - frame (DataFrame): the frame
+
+    Returns: (pyarrow.Table) the table
+    '''
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def iter_bill_rows(bills, state, batch_size=500):
+    '''
+    Lazily transforms bills in columnar batches, yielding dict rows.
+
+    Inputs:
+        - bills (iterable of dicts): raw bill information
+        - state (str): state
+        - batch_size (int): bills transformed at once
+
+    Returns: (generator of dicts) table rows
+    '''
+    for batch in pipeline.batched(bills, batch_size):
+        yield from to_rows(bills_to_frame(batch, state))
+
+
+def iter_local_bill_rows(bills, location, batch_size=500):
+    '''
+    Lazily transforms local bills in columnar batches, yielding dict rows.
+
+    Inputs:
+        - bills (iterable of dicts): raw bill information
+        - location (str): locality
+        - batch_size (int): bills transformed at once
+
+    Returns: (generator of dicts) table rows
+    '''
+    for batch in pipeline.batched(bills, batch_size):
+        yield from to_rows(local_bills_to_frame(batch, location))
@@ -1,7 +1,8 @@
 '''
 API to connect to Councilmatic.
 '''
-import requests
+import http_transport
+import pipeline
 
 
 class CouncilmaticAPI:
@@ -10,36 +11,28 @@ class CouncilmaticAPI:
     '''
     base_url = 'http://ocd.datamade.us/events/?classification=bill'
 
-    def __init__(self, location, keywords):
+    def __init__(self, location, keywords, transport=None, max_workers=4,
+                 combined=False):
         '''
         Initializes an instance of the `CouncilmaticAPI` class.
 
         Inputs:
             - location (str): the state or county to get bills for
             - keywords (list of str): the keywords to search for
+            - transport (HTTPTransport): pooled HTTP transport, the shared
+                one by default
+            - max_workers (int): number of keywords to crawl at once
+            - combined (bool): true to crawl the location once and match
+                every keyword locally instead of one crawl per keyword
         '''
         self.location = location.replace(" ", "%20")
         self.keywords = keywords
+        self.transport = transport or http_transport.get_transport()
+        self.max_workers = max_workers
+        self.combined = combined
+        self.duplicates_dropped = 0
         self.url = self.base_url + '&from_organization__jurisdiction__name__icontains=' + self.location
     
-    def get_loop_num(self, url):
-        '''
-        Determines how many API calls are required to get all data.
-        Raises an error if unable to connect to the API.
-
-        Inputs:
-            - url (str): the url to scrape
-        
-        Returns: (int) the number of loops
-        '''
-        r = requests.get(url)
-        if r.status_code != 200:
-            raise ValueError("API call failed")
-        data = r.json()
-        loop_num = data['meta']['max_page']
-        print('loops: ', loop_num)
-        return loop_num
-
     def get_data(self, keyword):
         '''
         Retrieves all bills related to a given keyword.
@@ -49,21 +42,86 @@ class CouncilmaticAPI:
 
         Returns: (list of dicts) list of relevant bill information
         '''
-        issue_path = '&title__icontains='
-        url = self.url + issue_path + keyword
-        loops = self.get_loop_num(url)
-        bill_list = []
+        return [bill for page in self.iter_pages(keyword) for bill in page]
+
+    def iter_pages(self, keyword=None):
+        '''
+        Lazily yields pages of bills related to a given keyword. The page
+        count is read from the first page's metadata, so no extra request
+        is made to find it. Raises an error if any page fails, so a crawl
+        is never cut short silently.
+
+        Inputs:
+            - keyword (str): the keyword to search for, None for every bill
+                in the location
+
+        Returns: (generator of lists of dicts) bill information by page
+        '''
+        url = self.url
+        if keyword is not None:
+            url += '&title__icontains=' + keyword.replace(" ", "%20")
+
+        r = self.transport.get(url + '&page=1')
+        if r.status_code != 200:
+            raise ValueError("API call failed on page 1 with status " + str(r.status_code))
+        data = r.json()
+        loops = data['meta']['max_page']
+        print('loops: ', loops)
+        print('page: ', 1)
+        yield data['results']
 
-        for i in range(loops):
-            page = i + 1
+        for page in range(2, loops + 1):
             print('page: ', page)
-            r = requests.get(url + '&page=' + str(page))
+            r = self.transport.get(url + '&page=' + str(page))
             if r.status_code != 200:
-                break
+                raise ValueError("API call failed on page " + str(page) +
+                                 " with status " + str(r.status_code))
             bills = r.json()
-            bill_list.extend(bills['results'])
-        
-        return bill_list
+            yield bills['results']
+
+    def iter_keyword_bills(self):
+        '''
+        Lazily yields bills for every keyword, crawling up to
+        `max_workers` keywords at once. A bill matching several keywords
+        is yielded once per keyword.
+
+        Inputs: None
+
+        Returns: (generator of dicts) bill information
+        '''
+        if self.combined:
+            keywords = [keyword.lower() for keyword in self.keywords]
+            for page in self.iter_pages():
+                for bill in page:
+                    title = bill['title'].lower()
+                    if any(keyword in title for keyword in keywords):
+                        yield bill
+            return
+
+        crawls = [self.iter_pages(keyword) for keyword in self.keywords]
+        for page in pipeline.merge(crawls, self.max_workers):
+            yield from page
+
+    def iter_bills(self):
+        '''
+        Lazily yields bills for every keyword, deduplicated by bill id.
+        Pages mix bills matching one keyword with bills matching several,
+        so duplicates can only be dropped once downloaded; their number is
+        kept in `duplicates_dropped`.
+
+        Inputs: None
+
+        Returns: (generator of dicts) bill information
+        '''
+        self.duplicates_dropped = 0
+        seen = set()
+        for bill in self.iter_keyword_bills():
+            if bill['id'] in seen:
+                self.duplicates_dropped += 1
+                continue
+            seen.add(bill['id'])
+            yield bill
+        print('duplicate bills dropped: ', self.duplicates_dropped)
 
     def iterate_through_keywords(self):
         '''
@@ -73,11 +131,7 @@ class CouncilmaticAPI:
 
         Returns: (list of dicts) list of bill information
         '''
-        bills_list = []
-        for keyword in self.keywords:
-            bills = self.get_data(keyword)
-            bills_list.extend(bills)
-        return bills_list
+        return list(self.iter_bills())
 
 
 def get_data_for_location_and_topic(location, keywords):
@@ -91,10 +145,6 @@ def get_data_for_location_and_topic(location, keywords):
 
     Returns: (list of dicts) list of bill information
     '''
-    all_bills = []
-
     api_call = CouncilmaticAPI(location, keywords)
-    bills = api_call.iterate_through_keywords()
-    all_bills.extend(bills)
 
-    return all_bills
+    return api_call.iterate_through_keywords()
@@ -1,3 +1,4 @@
+import os
 from dash import Dash, dcc, html, Input, Output, callback
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import load_figure_template
@@ -9,6 +10,10 @@ app = Dash(__name__, suppress_callback_exceptions=True, external_stylesheets=[db
 server = app.server
 
 load_figure_template('sandstone')
+if os.environ.get('WARM_UP_QUERIES', '1') == '1':
+    cross_section.warm_up()
+if os.environ.get('PRECOMPUTE_REGRESSIONS', '1') == '1':
+    detail_view.precompute()
 app.layout = dbc.Container([html.Div([
     dbc.NavbarSimple(
     children=[
@@ -33,7 +38,7 @@ def display_page(pathname):
     if pathname == '/' or pathname == '/cross_section': # ZM: replace '/' gate with splash page?
         return cross_section.layout
     elif pathname == '/detail_view':
-        return detail_view.layout # ZM: update name once's AR's view is in 
+        return detail_view.get_layout() # ZM: update name once's AR's view is in 
     elif pathname == '/about':
         return about.layout
     else:
@@ -0,0 +1,133 @@
+'''
+Brushing on the parallel coordinates chart: every axis, every range.
+
+The chart's restyleData only describes the latest change, so the
+constraints on all axes are accumulated in a store. Selecting rows keeps
+one boolean mask per constrained axis, cached by the axis and its ranges,
+so a brush on one axis only recomputes that axis's mask before the masks
+are AND-ed together.
+'''
+import threading
+from collections import OrderedDict
+import numpy as np
+from helper import parse_restyle
+
+
+def merge_constraints(constraints, restyle):
+    '''
+    Apply a restyle event to the constraints on every axis.
+    Inputs:
+        constraints: dict mapping the axis index (as a string, since it is
+            kept in a dcc.Store) to its list of [min, max] ranges
+        restyle: data from the latest restyle event (restyleData)
+    Outputs:
+        A new dict of constraints, without the axes that were cleared
+    '''
+    merged = dict(constraints or {})
+    for index, ranges in parse_restyle.parse_constraints(restyle).items():
+        if ranges is None:
+            merged.pop(str(index), None)
+        else:
+            merged[str(index)] = ranges
+    return merged
+
+
+def get_range_mask(values, ranges):
+    '''
+    Find the values inside any of the ranges, bounds included.
+    Inputs:
+        values: numpy array of one column
+        ranges: a list of [min, max] ranges
+    Outputs:
+        A boolean numpy array
+    '''
+    mask = np.zeros(len(values), dtype=bool)
+    for low, high in ranges:
+        mask |= (values >= low) & (values <= high)
+    return mask
+
+
+class BrushState:
+    '''
+    Selects the rows of one frame that satisfy the constraints on its
+    parallel coordinates axes.
+    '''
+
+    def __init__(self, frame, dimensions, max_masks=64):
+        '''
+        Inputs:
+            frame: the data frame shown on the chart
+            dimensions: the columns of the chart's axes, in order
+            max_masks: most per-axis masks kept in memory
+        '''
+        self.dimensions = dimensions
+        self.length = len(frame)
+        self.columns = {column: frame[column].to_numpy(dtype=float, na_value=np.nan)
+                        for column in dimensions}
+        self.max_masks = max_masks
+        self.masks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_axis_mask(self, index, ranges):
+        '''
+        Get the mask of one axis, computing it if it is not cached.
+        Inputs:
+            index: the axis index
+            ranges: a list of [min, max] ranges
+        Outputs:
+            A boolean numpy array
+        '''
+        key = (index, tuple(tuple(r) for r in ranges))
+        with self.lock:
+            mask = self.masks.get(key)
+            if mask is not None:
+                self.masks.move_to_end(key)
+                return mask
+        mask = get_range_mask(self.columns[self.dimensions[index]], ranges)
+        with self.lock:
+            self.masks[key] = mask
+            while len(self.masks) > self.max_masks:
+                self.masks.popitem(last=False)
+        return mask
+
+    def get_mask(self, constraints):
+        '''
+        Get the mask of the rows satisfying every axis's constraints.
+        Inputs:
+            constraints: dict as returned by merge_constraints
+        Outputs:
+            A boolean numpy array, or None when no axis is constrained
+        '''
+        mask = None
+        for index, ranges in constraints.items():
+            axis_mask = self.get_axis_mask(int(index), ranges)
+            mask = axis_mask.copy() if mask is None else np.logical_and(mask, axis_mask, out=mask)
+        return mask
+
+
+_states = OrderedDict()
+_states_lock = threading.Lock()
+MAX_STATES = 16
+
+
+def get_brush_state(key, frame, dimensions):
+    '''
+    Get the shared brush state of a frame, creating it on first use.
+    Inputs:
+        key: the frame's cache key
+        frame: the data frame
+        dimensions: the columns of the chart's axes, in order
+    Outputs:
+        A BrushState
+    '''
+    with _states_lock:
+        state = _states.get(key)
+        if state is not None and state.length == len(frame):
+            _states.move_to_end(key)
+            return state
+    state = BrushState(frame, dimensions)
+    with _states_lock:
+        _states[key] = state
+        while len(_states) > MAX_STATES:
+            _states.popitem(last=False)
+    return state
@@ -6,6 +6,8 @@ import re
 #sample2 = [{'dimensions[2].constraintrange': [[[67574.85492934738, 69844.9430051734], [70633.16811502521, 72178.08933033475]]]}, [0]]
 # when you click off a range it outputs this:
 #sample3 = [{'dimensions[1].constraintrange': None}, [0]]
+CONSTRAINT_KEY = re.compile(r'dimensions\[([0-9]+)\]\.constraintrange')
+
 def parse_restyle(input):
     '''
     Parse the values from the restyle interactive attribute from the plotly
@@ -24,4 +26,35 @@ def parse_restyle(input):
         range_pair = [i[0][0], i[0][1]]
         range_pairs.append(range_pair)
     
-    return (int(index[0][0]), range_pairs[0])
\ No newline at end of file
+    return (int(index[0][0]), range_pairs[0])
+
+
+def parse_constraints(input):
+    '''
+    Parse every axis and every range from the restyle interactive attribute
+    from the plotly parallel coordinates chart
+    Inputs:
+        input:  Data from latest restyle event (restyleData) which occurs when
+            the user changes selections on the parallel coordinates chart.
+    Outputs:
+        A dict mapping the index (integer) of each data column whose
+        selection changed to a list of [min, max] ranges, or to None when
+        the selection on that axis was cleared.
+    '''
+    constraints = {}
+    if not input:
+        return constraints
+    for key, value in input[0].items():
+        match = CONSTRAINT_KEY.fullmatch(key)
+        if not match:
+            continue
+        # Restyle values are wrapped in a list with one entry per trace.
+        if isinstance(value, list) and len(value) == 1 and isinstance(value[0], list):
+            value = value[0]
+        if not value:
+            constraints[int(match.group(1))] = None
+        elif isinstance(value[0], list):
+            constraints[int(match.group(1))] = [[min(r), max(r)] for r in value]
+        else:
+            constraints[int(match.group(1))] = [[min(value), max(value)]]
+    return constraints
@@ -1,12 +1,12 @@
 # Run this app with `python app.py` and
 # visit http://127.0.0.1:8050/ in your web browser.
 
-from dash import Dash, html, dcc, Input, Output, callback
+from dash import Dash, html, dcc, Input, Output, State, callback, ctx
 import plotly.express as px
-import pandas as pd
 import json
-from helper import parse_restyle
+from helper import brushing
 from backend import datasets
+from utils import frame_cache, query_cache
 
 DV_NAME = 'aid_requested'
 START_YEAR = 2010
@@ -22,6 +22,8 @@ LABELS = {'black_afam':'Pcnt. Black' , 'foreign_born': 'Pcnt. Foreign Born',
     'aid_requested': 'Aid Amount', 'incident_type': 'Disaster Type',
     'population':'Population', 'state': 'State', 'county_fips':'County FIPS Code'}
 TEXAS_IDX = 43
+DEFAULT_YEARS = [2015, 2017]
+QUERY_TTL = 900
 
 with open('data/statestofips.json', 'r') as f:
   states_lookup = json.load(f)
@@ -50,7 +52,7 @@ layout = html.Div(children=[
     ),
     html.Br(),
     html.Label('Select Year Range'),
-    dcc.RangeSlider(START_YEAR, END_YEAR, 1, value=[2015, 2017], 
+    dcc.RangeSlider(START_YEAR, END_YEAR, 1, value=DEFAULT_YEARS, 
         id='year-slider',
         marks = years_dict
     ),
@@ -72,10 +74,90 @@ layout = html.Div(children=[
         html.Div(className='buffer')
     ]),
     dcc.Store(id='query-data'),
-    dcc.Store(id='intermediate-value')
+    dcc.Store(id='intermediate-value'),
+    dcc.Store(id='brush-state')
 ])
 
 
+def query_datasets(state_codes, years):
+    '''
+    Load joined FEMA and ACS data for the given states and years from the APIs.
+    Inputs:
+        state_codes: a list of state FIPS codes
+        years: the first and last year of the range
+    Outputs:
+        Joined data from FEMA and ACS data sources meeting the filter criteria
+    '''
+    # Selecting single year creates duplicate entries. Reduce to one entry.
+    if max(years) == min(years):
+        years = [max(years)]
+    return datasets.get_data(state_codes, years)
+
+
+queries = query_cache.QueryCache(query_datasets, ttl=QUERY_TTL)
+fallback = query_cache.FallbackData('data/harvey_test_data.csv')
+
+
+def warm_up():
+    '''
+    Query the default view (Texas, 2015-2017) in the background so the first
+    page load is served from the query cache.
+    '''
+    return queries.warm_up([([states_lookup[STATES[TEXAS_IDX]]], DEFAULT_YEARS)])
+
+
+def fetch_query(state_codes, years):
+    '''
+    Load joined FEMA and ACS data for the given states and years, memoized by
+    the query cache. If the API call fails, load data from static csv as
+    backup.
+    Inputs:
+        state_codes: a list of state FIPS codes
+        years: the first and last year of the range
+    Outputs:
+        Joined data from FEMA and ACS data sources meeting the filter criteria
+    '''
+    try:
+        return queries.get(state_codes, years)
+    except:
+        print('API CALL FAILED - LOADING STATIC BACKUP DATA')
+        return fallback.select(state_codes, years)
+
+
+def load_query_frame(query):
+    '''
+    Get the queried data from the server-side cache, querying again if it
+    has been evicted.
+    Inputs:
+        query: the query-data store, as returned by query_api
+    Outputs:
+        The queried data frame
+    '''
+    cache = frame_cache.get_cache()
+    query_df = cache.get(query['key'])
+    if query_df is None:
+        query_df = fetch_query(query['states'], query['years'])
+        cache.put(query['key'], query_df)
+    return query_df
+
+
+def load_filtered_frame(filtered):
+    '''
+    Get the data filtered by disaster type from the server-side cache.
+    Inputs:
+        filtered: the intermediate-value store, as returned by update_data
+    Outputs:
+        The filtered data frame
+    '''
+    cache = frame_cache.get_cache()
+    filtered_df = cache.get(filtered['key'])
+    if filtered_df is None:
+        load_query_frame(filtered['query'])
+        key = cache.derive(filtered['query']['key'], 'incident_type', filtered['disasters'])
+        filtered_df = cache.get(key)
+    return filtered_df
+
+
 @callback(
     Output('query-data', 'data'),
     Input('state-dd', 'value'),
@@ -85,32 +167,23 @@ def query_api(states, years):
     '''
     Load data from FEMA and ACS APIs into app using backend modules and user
     inputs for states and years. Data is used for all visuals on cross-section
-    view. If API call fails, load data from static csv as backup.
+    view. The data itself stays in the server-side frame cache.
     Inputs:
         states: a list of state names selected from the states dropdown in ui
         years: a list of years selected from the years slider in ui
     Outputs:
-        Joined data from FEMA and ACS data sources meeting input filter criteria,
-        converted to JSON for in-browser storage.
+        A small dict with the cache key of the queried data and the query
+        that produced it, for in-browser storage.
     '''
     if not isinstance(states, list):
         states = [states]
     if not isinstance(years, list):
         years = [years]
-    state_codes = [states_lookup[i] for i in states]
-    try:
-        # Selecting single year creates duplicate entries. Reduce to one entry.
-        if max(years) == min(years):
-            years = [max(years)]
-        query_df = datasets.get_data(state_codes, years)
-    except:
-        print('API CALL FAILED - LOADING STATIC BACKUP DATA')
-        df = pd.read_csv('data/harvey_test_data.csv')
-        query_df = df[df['state_fips'].isin(state_codes) & 
-            (df['year'] >= years[0]) &
-            (df['year'] <= years[1])]
-    
-    return query_df.to_json(date_format='iso', orient='split')
+    state_codes = sorted(states_lookup[i] for i in states)
+    years = [min(years), max(years)]
+    key = frame_cache.make_key('query', state_codes, years)
+    frame_cache.get_cache().put(key, fetch_query(state_codes, years))
+    return {'key': key, 'states': state_codes, 'years': years}
 
 
 @callback(
@@ -118,17 +191,18 @@ def query_api(states, years):
     Output('disaster-dd', 'value'),
     Input('query-data','data')
 )
-def get_disaster_options(query_df_json):
+def get_disaster_options(query):
     '''
     Get disaster options from queried data for dropdown.
     Inputs:
-        query_df_json: json file from browser memory, originally created by FEMA
+        query: the query-data store, holding the cache key of the data
+            originally created by FEMA
     
     Outputs:
         disaster_options: disaster types present in queried data, setting first
             result as default
     '''
-    query_df = pd.read_json(query_df_json, orient='split')
+    query_df = load_query_frame(query)
     disaster_options = [i for i in query_df.incident_type.unique()]
     disaster_options.sort()
     return disaster_options, disaster_options[0]
@@ -139,44 +213,40 @@ def get_disaster_options(query_df_json):
     Input('query-data','data'),
     Input('disaster-dd', 'value'),
 )
-def update_data(query_df_json, disasters):
+def update_data(query, disasters):
     '''
     Filter the data returned by API call further based on user inputs for
-    specific disaster types.
+    specific disaster types. The filtered view is only registered here and
+    computed from the cached query data when first read.
     Inputs:
-        query_df_json: json file from browser memory, originally created by FEMA
-            and ACS API call
+        query: the query-data store, holding the cache key of the data
+            originally created by FEMA and ACS API call
         disasters: a list of disaster types selected by user from ui dropdown
     
     Outputs:
-        filtered_df: a filtered version of the original API query, which feeds
-        into the parallel coordinates and scatter plot graphs, converted to
-            JSON for in-browser storage
+        A small dict with the cache key of the filtered view, which feeds
+        into the parallel coordinates and scatter plot graphs
     '''
-    query_df = pd.read_json(query_df_json, orient='split')
     if not isinstance(disasters, list):
         disasters = [disasters]
-
-    filtered_df = query_df[query_df['incident_type'].isin(disasters)].reset_index(drop=True)
-
-    return filtered_df.to_json(date_format='iso', orient='split')
+    key = frame_cache.get_cache().derive(query['key'], 'incident_type', disasters)
+    return {'key': key, 'query': query, 'disasters': disasters}
 
 
 @callback(
     Output('pc-fig', 'figure'),
     Input('intermediate-value', 'data')
 )
-def update_pc(filtered_df_json):
+def update_pc(filtered):
     '''
     Update the parallel coordinates chart with the intermediate data based on
     user selections for states, years, and disaster types.
     Inputs:
-        filtered_df_json: json file from browser memory, created by
-            update_pc_and_data callback
+        filtered: the intermediate-value store, created by update_data
     Outputs:
         pc_fig: a Dash parallel coorinates component
     '''
-    filtered_df = pd.read_json(filtered_df_json, orient='split')
+    filtered_df = load_filtered_frame(filtered)
     pc_fig = px.parallel_coordinates(filtered_df, color="aid_requested",
                               dimensions=IV_LIST, labels = LABELS)
 
@@ -184,39 +254,61 @@ def update_pc(filtered_df_json):
     return pc_fig
 
 @callback(
-    Output('scatter-fig', 'figure'),
+    Output('brush-state', 'data'),
     Input('pc-fig', 'restyleData'),
     Input('intermediate-value', 'data'),
-    Input('xaxis-dd', 'value')
+    State('brush-state', 'data')
 )
-def modify_scatter(restyleData, filtered_df_json, xaxis):
+def update_brush(restyleData, filtered, brush):
     '''
-    Modify the scatter plot based on user selections for x-axis variable and
-    filter data based on selected range in the parallel coordinates plot. 
+    Accumulate the ranges selected on every axis of the parallel coordinates
+    plot, since each restyle event only describes the latest change. The
+    ranges are cleared whenever the plot is redrawn with new data.
     Inputs:
         restyleData: range of user selection from interactive parallel
             coordinates plot
-        filtered_df_json: json file from browser memory, created by
-            update_pc_and_data callback
+        filtered: the intermediate-value store, created by update_data
+        brush: the brush-state store, as last returned by this function
+    Outputs:
+        A dict with the cache key of the data being brushed and the ranges
+        selected on each axis
+    '''
+    key = filtered['key'] if filtered else None
+    # update_pc redraws the plot without brushes whenever the data changes.
+    if ctx.triggered_id == 'intermediate-value':
+        return {'key': key, 'constraints': {}}
+    constraints = brush['constraints'] if brush and brush['key'] == key else {}
+    return {'key': key, 'constraints': brushing.merge_constraints(constraints, restyleData)}
+
+
+@callback(
+    Output('scatter-fig', 'figure'),
+    Input('brush-state', 'data'),
+    Input('intermediate-value', 'data'),
+    Input('xaxis-dd', 'value')
+)
+def modify_scatter(brush, filtered, xaxis):
+    '''
+    Modify the scatter plot based on user selections for x-axis variable and
+    filter data based on the ranges selected on every axis of the parallel
+    coordinates plot.
+    Inputs:
+        brush: the brush-state store, created by update_brush
+        filtered: the intermediate-value store, created by update_data
         xaxis: the variable selected by user from ui dropdown to display on
             scatterplot x-axis
     Outputs:
         scatter_fig: a Dash scatterplot component
     '''
-    filtered_df = pd.read_json(filtered_df_json, orient='split')
-    # Only handles dim_range of length one and doesn't support multiple axes
-    # or multiple selections along a single axis.
-    if restyleData and None not in restyleData[0].values():
-        dim_index, dim_range = parse_restyle.parse_restyle(restyleData)
-        col_index = IV_LIST[dim_index]
-
-        selected_points = filtered_df[(filtered_df[col_index]>=dim_range[0]) &
-            (filtered_df[col_index]<=dim_range[1])].index.values
-        filtered_df = filtered_df.iloc[selected_points]
+    filtered_df = load_filtered_frame(filtered)
+    # Ranges selected on data that has since been replaced no longer apply.
+    if brush and brush['key'] == filtered['key'] and brush['constraints']:
+        state = brushing.get_brush_state(filtered['key'], filtered_df, IV_LIST)
+        filtered_df = filtered_df[state.get_mask(brush['constraints'])]
 
     scatter_fig = px.scatter(filtered_df, x=xaxis, y="aid_requested",
         size="population", color="incident_type", hover_name='disaster_name',
         hover_data =['state', 'county_fips', 'aid_requested','population', xaxis],
         size_max=60, labels = LABELS)
 
-    return scatter_fig
\ No newline at end of file
+    return scatter_fig
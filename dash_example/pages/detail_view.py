@@ -4,45 +4,122 @@ Aditya Retnanto
 March 2022
 Module to display hurricane view with choropleth and regression info
 """
+import threading
 import pandas as pd
 import plotly.express as px
 from dash import html, dcc, Input, Output, callback, dash_table
-from utils import utils
+from utils import utils, regression_cache, geometry
 from models.hurricane_regs import DisasterRegs
 
-counties, winner, hurricane_path, hurricane_scope, hurricanes = utils.detail_view_init()
+DATA_FILES = ['data/geojson-counties-fips.json', 'data/county_president_winner.csv',
+  'data/hurricane_path.csv', 'data/hurricane_scope.json']
+MAP_ZOOM = 3
+REGRESSION_TYPES = ['Pooled', 'Fixed Effects']
+REGRESSION_TEXT = {
+  'Pooled': "In the table above \
+        we see the results to the Pooled Ordinary Least Squares (OLS) regression. \
+        This is the most simplistic, but potentially powerful regression model when looking at panel data. \
+        The p-value column can be interpreted as follows: if the p-value < 0.05, it is statistically significant at the 95% Confidence level. \
+        In layman’s terms, that variable is significant in determining\
+        the dollar value of FEMA aid requested by the county.",
+  'Fixed Effects': "In the table above we see the results to the Fixed Effect Panel regression, \
+        where the entity effect (panel variable) is set to the state. \
+        The main difference between a Fixed Effect (FE) model and Pooled OLS is that in FE the intercept of the regression \
+        is allowed to vary freely across groups, in this case, across states. \
+        We add this option to analyze whether different states display different characteristics in FEMA. \
+        The p-value column can be interpreted as follows: if the p-value < 0.05, it is statistically significant at the 95% Confidence level. \
+        In layman’s terms, that variable is significant in determining the dollar value of FEMA aid requested by the county."
+}
 
-layout = html.Div(children=[
-  html.P("Note, it might take some time to display data"),
-  html.Div(children=[
-        html.Label('Hurricane'),
-        dcc.Dropdown(hurricanes, hurricanes[0], multi = False, id='hurricane')
-    ]),
-  html.Div(children=[
-        html.Label('Regression Type'),
-        dcc.Dropdown(['Pooled', 'Fixed Effects'], 'Pooled', multi = False, id='regression_choice')
-    ]),
-  html.Br(),
-  html.Div([
-    dcc.Graph(id='hurricane_map', style={"display": "none"})
-  ]),
-  html.Br(),
-  html.P("Dependent variable in specified regression is dollar value requested from FEMA by county"),
-  html.Div([
-    dash_table.DataTable(
-      id='reg_table',
-      data=[]
-    )
-  ]),
-  html.Br(),
-  html.P(id = 'regression-text'),
-  html.Div([
-    dash_table.DataTable(
-      id='var_table',
-      data=[]
-    )
-  ])
-])
+def get_layout():
+    """
+    Builds the page layout, loading the hurricane list on first use.
+    """
+    _, _, _, hurricanes = utils.load_detail_data()
+    return html.Div(children=[
+      html.P("Note, it might take some time to display data the first time a hurricane is selected"),
+      html.Div(children=[
+            html.Label('Hurricane'),
+            dcc.Dropdown(hurricanes, hurricanes[0], multi = False, id='hurricane')
+        ]),
+      html.Div(children=[
+            html.Label('Regression Type'),
+            dcc.Dropdown(REGRESSION_TYPES, 'Pooled', multi = False, id='regression_choice')
+        ]),
+      html.Br(),
+      html.Div([
+        dcc.Graph(id='hurricane_map', style={"display": "none"})
+      ]),
+      html.Br(),
+      html.P("Dependent variable in specified regression is dollar value requested from FEMA by county"),
+      html.Div([
+        dash_table.DataTable(
+          id='reg_table',
+          data=[]
+        )
+      ]),
+      html.Br(),
+      html.P(id = 'regression-text'),
+      html.Div([
+        dash_table.DataTable(
+          id='var_table',
+          data=[]
+        )
+      ])
+    ])
+
+def get_regression(hurricane):
+    """
+    Creates the regression object for a hurricane's states and year.
+    :param hurricane: hurricane name
+    """
+    _, _, hurricane_scope, _ = utils.load_detail_data()
+    return DisasterRegs(hurricane_scope[hurricane]["states_fips"], hurricane_scope[hurricane]["year"])
+
+def pull_hurricane_data(hurricane):
+    """
+    Calls API on Hurricane info.
+    :param hurricane: hurricane name
+    """
+    return get_regression(hurricane).pull_data()
+
+def fit_hurricane(hurricane, regression_choice, api_data):
+    """
+    Runs regression and merges the election results of the hurricane's
+    states for the map.
+    :param hurricane: hurricane name
+    :param regression_choice: 'Pooled' or 'Fixed Effects'
+    :param api_data: data returned by pull_hurricane_data
+    """
+    winner, _, hurricane_scope, _ = utils.load_detail_data()
+    regression = get_regression(hurricane)
+    if regression_choice == 'Pooled':
+        reg_output,_,var_table = regression.pooled_ols(api_data)
+    else:
+        reg_output,_,var_table = regression.panel_ols(api_data)
+    year_occur = hurricane_scope[hurricane]["year"][0]
+    election = winner.loc[(winner['year'] == utils.get_election_year(year_occur)) &
+      winner['county_fips'].str.zfill(5).str[:2].isin(utils.get_state_fips(hurricane_scope, hurricane))]
+    merged_df= pd.merge(election, api_data, how="left", on = 'county_fips')
+    return {'reg_output': reg_output, 'var_table': var_table, 'merged_df': merged_df}
+
+results = regression_cache.RegressionCache(pull_hurricane_data, fit_hurricane,
+  DATA_FILES)
+
+def precompute():
+    """
+    Loads the county geometries and fits every regression for every
+    hurricane in hurricane_scope in the background, so the callback is
+    served from the cache.
+    """
+    def run():
+        _, _, hurricane_scope, _ = utils.load_detail_data()
+        results.precompute(list(hurricane_scope), REGRESSION_TYPES)
+        geometry.get_service().load()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
 
 @callback(
     Output("hurricane_map", 'figure'),
@@ -57,39 +134,24 @@ layout = html.Div(children=[
 )
 def display_hurricane(hurricane, regression_choice):
     """
-    Calls API on Hurricane info, runs regression and updates figures.
+    Gets the cached regression for a hurricane, running it on a cache miss,
+    and updates figures.
     :param hurricane: User selected hurricane
     :param regression_choice: User selected regression choice
     """
+    _, hurricane_path, hurricane_scope, _ = utils.load_detail_data()
     hurricane_df = hurricane_path.loc[(hurricane_path['NAME'] == hurricane)]
-    regression = DisasterRegs(hurricane_scope[hurricane]["states_fips"], hurricane_scope[hurricane]["year"])
-    api_data = regression.pull_data()
-    if regression_choice == 'Pooled':
-        reg_output,_,var_table = regression.pooled_ols(api_data)
-        text = "In the table above \
-        we see the results to the Pooled Ordinary Least Squares (OLS) regression. \
-        This is the most simplistic, but potentially powerful regression model when looking at panel data. \
-        The p-value column can be interpreted as follows: if the p-value < 0.05, it is statistically significant at the 95% Confidence level. \
-        In layman’s terms, that variable is significant in determining\
-        the dollar value of FEMA aid requested by the county."
-    else:
-        reg_output,_,var_table = regression.panel_ols(api_data)
-        text = "In the table above we see the results to the Fixed Effect Panel regression, \
-        where the entity effect (panel variable) is set to the state. \
-        The main difference between a Fixed Effect (FE) model and Pooled OLS is that in FE the intercept of the regression \
-        is allowed to vary freely across groups, in this case, across states. \
-        We add this option to analyze whether different states display different characteristics in FEMA. \
-        The p-value column can be interpreted as follows: if the p-value < 0.05, it is statistically significant at the 95% Confidence level. \
-        In layman’s terms, that variable is significant in determining the dollar value of FEMA aid requested by the county."
-    year_occur = hurricane_scope[hurricane]["year"][0]
-    election = winner.loc[winner['year'] == utils.get_election_year(year_occur)]
-    merged_df= pd.merge(election, api_data, how="left", on = 'county_fips')
-    fig = px.choropleth_mapbox(merged_df, geojson=counties,
+    result = results.get(hurricane, regression_choice)
+    counties = geometry.get_service().get_geojson(
+      utils.get_state_fips(hurricane_scope, hurricane), zoom=MAP_ZOOM)
+    reg_output, var_table = result['reg_output'], result['var_table']
+    text = REGRESSION_TEXT[regression_choice]
+    fig = px.choropleth_mapbox(result['merged_df'], geojson=counties,
       locations='county_fips',
       hover_name = 'county_name',
       color = 'party',
       mapbox_style="open-street-map",
-      zoom=3,
+      zoom=MAP_ZOOM,
       center = {"lat": 37.0902, "lon": -95.7129},
       color_discrete_sequence=px.colors.qualitative.Set1,
       opacity=0.3,
@@ -0,0 +1,139 @@
+"""
+Server-side cache of the data frames behind the cross-section view.
+
+Callbacks keep frames here and pass only small keys through dcc.Store,
+instead of serializing the whole dataset to JSON and back on every
+interaction. Frames live in a process-local LRU and, when a cache
+directory is configured, in Parquet files shared by every worker process.
+Filtered views are registered by key and only computed from their base
+frame the first time they are read.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+import pandas as pd
+
+MAX_VIEWS = 10000
+
+
+def make_key(*parts):
+    """
+    Builds a short cache key from JSON-serializable parts.
+    :param parts: values identifying the frame
+    """
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:20]
+
+
+class FrameCache:
+    """
+    LRU cache of data frames keyed by string, optionally backed by Parquet
+    files on disk.
+    """
+
+    def __init__(self, max_entries=32, cache_dir=None):
+        """
+        :param max_entries: most frames kept in memory
+        :param cache_dir: directory for Parquet copies of base frames, or
+            None to keep frames in memory only
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.frames = OrderedDict()
+        self.views = OrderedDict()
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get_path(self, key):
+        """
+        Returns the Parquet file of a frame.
+        :param key: the frame's key
+        """
+        return os.path.join(self.cache_dir, key + '.parquet')
+
+    def remember(self, key, frame):
+        """
+        Keeps a frame in memory, evicting the least recently used ones.
+        :param key: the frame's key
+        :param frame: the data frame
+        """
+        with self.lock:
+            self.frames[key] = frame
+            self.frames.move_to_end(key)
+            while len(self.frames) > self.max_entries:
+                self.frames.popitem(last=False)
+
+    def put(self, key, frame):
+        """
+        Stores a frame.
+        :param key: the frame's key, see make_key
+        :param frame: the data frame
+        """
+        with self.lock:
+            unchanged = self.frames.get(key) is frame
+        self.remember(key, frame)
+        if self.cache_dir and not unchanged:
+            tmp_path = os.path.join(self.cache_dir, '.{}.tmp'.format(uuid.uuid4().hex))
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.get_path(key))
+        return key
+
+    def derive(self, base_key, column, values):
+        """
+        Registers the rows of a cached frame whose column is in values,
+        without computing them yet.
+        :param base_key: key of the frame to filter
+        :param column: column to filter on
+        :param values: values to keep
+        """
+        values = sorted(values, key=str)
+        key = make_key('view', base_key, column, values)
+        with self.lock:
+            self.views[key] = (base_key, column, values)
+            self.views.move_to_end(key)
+            while len(self.views) > MAX_VIEWS:
+                self.views.popitem(last=False)
+        return key
+
+    def get(self, key):
+        """
+        Gets a frame from memory, from disk, or by filtering its base frame.
+        Returns None when the frame is no longer cached.
+        :param key: the frame's key
+        """
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+                return frame
+            view = self.views.get(key)
+        if view is not None:
+            base_key, column, values = view
+            base = self.get(base_key)
+            if base is None:
+                return None
+            frame = base[base[column].isin(values)].reset_index(drop=True)
+        elif self.cache_dir and os.path.exists(self.get_path(key)):
+            frame = pd.read_parquet(self.get_path(key))
+        else:
+            return None
+        self.remember(key, frame)
+        return frame
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    Returns the shared frame cache, backed by the directory in the
+    FRAME_CACHE_DIR environment variable when it is set.
+    """
+    global _cache
+    if _cache is None:
+        _cache = FrameCache(cache_dir=os.environ.get('FRAME_CACHE_DIR'))
+    return _cache
@@ -0,0 +1,364 @@
+"""
+County geometries for the choropleth maps.
+
+The county GeoJSON is read on first use, not at import. Coordinates are
+quantized to an integer grid, so borders shared by two counties have
+exactly the same vertices on both sides. Every ring is then cut into arcs
+at the vertices where the set of rings sharing it changes, TopoJSON-style,
+and each distinct arc is simplified once with Douglas-Peucker, so
+neighbouring counties keep a common border with no gaps or overlaps. Every
+tolerance is simplified from the source geometry.
+
+The results are kept in a compact form, int32 coordinates and flat offset
+arrays per feature, polygon and ring, and saved next to the source file as
+a .npz, so later starts skip parsing the GeoJSON. Figures only get the
+counties of the states they show, at the coarsest tolerance that still
+looks right at the map's zoom.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+TOLERANCES = (0.001, 0.005, 0.02)
+SCALE = 100000
+FORMAT_VERSION = 3
+
+
+def simplify_line(points, tolerance):
+    """
+    Simplifies a line with the Douglas-Peucker algorithm, keeping both
+    endpoints. Returns a boolean array marking the points kept.
+    :param points: (n, 2) array of coordinates
+    :param tolerance: largest distance a dropped point may be from the
+        simplified line
+    """
+    n = len(points)
+    if n <= 2:
+        return np.ones(n, dtype=bool)
+    points = np.asarray(points, dtype=float)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        segment = end - start
+        inner = points[first + 1:last] - start
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return keep
+
+
+def get_polygons(geometry):
+    """
+    Returns a geometry's polygons, each a list of rings.
+    :param geometry: a GeoJSON Polygon or MultiPolygon
+    """
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    return geometry['coordinates']
+
+
+def get_shapes(features):
+    """
+    Returns each feature's polygons as lists of open rings of quantized
+    coordinates, without the closing point.
+    :param features: GeoJSON features
+    """
+    shapes = []
+    for feature in features:
+        shape = []
+        for polygon in get_polygons(feature['geometry']):
+            rings = []
+            for ring in polygon:
+                ring = np.round(np.asarray(ring, dtype=float)[:, :2] * SCALE).astype(np.int64)
+                if len(ring) > 1 and (ring[0] == ring[-1]).all():
+                    ring = ring[:-1]
+                rings.append(ring)
+            shape.append(rings)
+        shapes.append(shape)
+    return shapes
+
+
+class Topology:
+    """
+    The rings of every feature, with each vertex identified across rings and
+    the vertices where rings should be cut into arcs.
+    """
+
+    def __init__(self, shapes):
+        """
+        :param shapes: features as returned by get_shapes
+        """
+        self.shapes = shapes
+        rings = [ring for shape in shapes for polygon in shape for ring in polygon]
+        lengths = np.array([len(ring) for ring in rings], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        points = np.concatenate(rings) if rings else np.zeros((0, 2), dtype=np.int64)
+        ring_ids = np.repeat(np.arange(len(rings)), lengths)
+        _, point_ids = np.unique(points, axis=0, return_inverse=True)
+        point_ids = point_ids.ravel()
+
+        # Which rings use each point: the sorted ring ids of every point,
+        # padded to a row each, so equal rows mean the same set of rings.
+        pairs = np.unique(point_ids * len(rings) + ring_ids)
+        pair_points, pair_rings = pairs // len(rings), pairs % len(rings)
+        size = point_ids.max() + 1 if len(point_ids) else 0
+        count = np.bincount(pair_points, minlength=size)
+        rank = np.arange(len(pairs)) - np.searchsorted(pair_points, pair_points)
+        ring_sets = np.full((size, count.max() if size else 0), -1, dtype=np.int64)
+        ring_sets[pair_points, rank] = pair_rings
+        _, set_ids = np.unique(ring_sets, axis=0, return_inverse=True)
+        signature = set_ids.ravel()[point_ids]
+
+        # Neighbours within each ring, wrapping around its start.
+        index = np.arange(len(points))
+        starts = np.repeat(offsets[:-1], lengths)
+        previous = starts + (index - starts - 1) % np.repeat(lengths, lengths)
+        following = starts + (index - starts + 1) % np.repeat(lengths, lengths)
+        breaks = (signature != signature[previous]) | (signature != signature[following])
+
+        self.point_ids = np.split(point_ids, offsets[1:-1])
+        self.breaks = np.split(breaks, offsets[1:-1])
+        self.shared = np.split(count[point_ids] > 1, offsets[1:-1])
+
+    def simplify(self, tolerance):
+        """
+        Simplifies every ring, simplifying each distinct arc once.
+        :param tolerance: simplification tolerance in degrees
+        """
+        tolerance = tolerance * SCALE
+        arcs = {}
+        simplified = []
+        i = 0
+        for shape in self.shapes:
+            polygons = []
+            for polygon in shape:
+                rings = []
+                for ring in polygon:
+                    rings.append(self.simplify_ring(ring, self.point_ids[i], self.breaks[i],
+                                                    self.shared[i], tolerance, arcs))
+                    i += 1
+                polygons.append(rings)
+            simplified.append(polygons)
+        return simplified
+
+    def simplify_ring(self, ring, point_ids, breaks, shared, tolerance, arcs):
+        """
+        Simplifies one ring arc by arc, returning it closed.
+        :param ring: open ring of quantized coordinates
+        :param point_ids: id of each vertex, shared across rings
+        :param breaks: true for the vertices where arcs start and end
+        :param shared: true for the vertices used by other rings
+        :param tolerance: simplification tolerance in quantized units
+        :param arcs: cache of simplified arcs, keyed by their point ids
+        """
+        n = len(ring)
+        if n < 3:
+            return np.concatenate([ring, ring[:1]])
+        cuts = np.flatnonzero(breaks)
+        if len(cuts) == 0:
+            if shared.any():
+                # A ring shared whole, like an enclave, starts from its
+                # smallest point so both rings cut it in the same place.
+                cuts = np.array([int(np.argmin(point_ids))])
+            else:
+                cuts = np.array([0])
+        keep = np.zeros(n, dtype=bool)
+        keep[cuts] = True
+        for k, first in enumerate(cuts):
+            last = cuts[(k + 1) % len(cuts)]
+            length = (last - first) % n or n
+            indices = (first + np.arange(length + 1)) % n
+            ids = point_ids[indices]
+            # Shared arcs are walked in opposite directions by their two
+            # rings; simplify them in one canonical direction.
+            reverse = (ids[0], ids[1]) > (ids[-1], ids[-2])
+            if reverse:
+                indices, ids = indices[::-1], ids[::-1]
+            key = ids.tobytes()
+            arc_keep = arcs.get(key)
+            if arc_keep is None:
+                arc_keep = simplify_line(ring[indices], tolerance)
+                arcs[key] = arc_keep
+            keep[indices[arc_keep]] = True
+        # Rings simplified away to less than a triangle are kept as they are.
+        if keep.sum() < 3:
+            keep[:] = True
+        ring = ring[keep]
+        return np.concatenate([ring, ring[:1]])
+
+
+def pack(shapes):
+    """
+    Packs features into flat arrays of quantized coordinates and offsets.
+    :param shapes: features as lists of polygons of closed quantized rings
+    """
+    coords, ring_offsets, polygon_offsets, feature_offsets = [], [0], [0], [0]
+    for shape in shapes:
+        for polygon in shape:
+            for ring in polygon:
+                coords.append(ring.astype(np.int32))
+                ring_offsets.append(ring_offsets[-1] + len(ring))
+            polygon_offsets.append(len(ring_offsets) - 1)
+        feature_offsets.append(len(polygon_offsets) - 1)
+    return {
+        'coords': np.concatenate(coords),
+        'ring_offsets': np.array(ring_offsets, dtype=np.int64),
+        'polygon_offsets': np.array(polygon_offsets, dtype=np.int64),
+        'feature_offsets': np.array(feature_offsets, dtype=np.int64),
+    }
+
+
+class GeometryService:
+    """
+    Lazily loaded, simplified county geometries, subset per figure.
+    """
+
+    def __init__(self, path, tolerances=TOLERANCES, max_entries=64):
+        """
+        :param path: county GeoJSON file, with 5-digit county FIPS ids
+        :param tolerances: simplification tolerances to precompute, in degrees
+        :param max_entries: most subsets kept in memory
+        """
+        self.path = path
+        self.tolerances = tuple(sorted(tolerances))
+        self.max_entries = max_entries
+        self.cache_path = path + '.geometry.npz'
+        self.ids = None
+        self.levels = None
+        self.subsets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads the packed geometries, from the .npz when it is newer than the
+        GeoJSON and by simplifying the GeoJSON otherwise.
+        """
+        with self.lock:
+            if self.levels is not None:
+                return
+            if (os.path.exists(self.cache_path) and
+                    os.path.getmtime(self.cache_path) >= os.path.getmtime(self.path)):
+                with np.load(self.cache_path) as arrays:
+                    if (int(arrays['format_version']) == FORMAT_VERSION and
+                            tuple(arrays['tolerances']) == self.tolerances):
+                        self.ids = arrays['ids']
+                        self.levels = {tolerance: {name: arrays['{}_{}'.format(name, i)]
+                                                   for name in ('coords', 'ring_offsets',
+                                                                'polygon_offsets', 'feature_offsets')}
+                                       for i, tolerance in enumerate(self.tolerances)}
+                        return
+            with open(self.path, 'r') as f:
+                features = json.load(f)['features']
+            self.ids = np.array([str(feature['id']) for feature in features])
+            topology = Topology(get_shapes(features))
+            self.levels = {tolerance: pack(topology.simplify(tolerance))
+                           for tolerance in self.tolerances}
+            self.save()
+
+    def save(self):
+        """
+        Writes the packed geometries next to the GeoJSON, if the directory
+        is writable.
+        """
+        arrays = {'format_version': FORMAT_VERSION, 'tolerances': np.array(self.tolerances),
+                  'ids': self.ids}
+        for i, tolerance in enumerate(self.tolerances):
+            for name, values in self.levels[tolerance].items():
+                arrays['{}_{}'.format(name, i)] = values
+        tmp_path = self.cache_path + '.tmp.npz'
+        try:
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as error:
+            print('COULD NOT SAVE GEOMETRY CACHE: {}'.format(error))
+
+    def get_tolerance(self, zoom):
+        """
+        Returns the coarsest tolerance that still looks right when the map
+        is zoomed in a few levels past its initial zoom.
+        :param zoom: the map's initial zoom
+        """
+        degrees_per_pixel = 360 / (256 * 2 ** (zoom + 3))
+        fitting = [t for t in self.tolerances if t <= degrees_per_pixel]
+        return fitting[-1] if fitting else self.tolerances[0]
+
+    def build(self, state_fips, tolerance):
+        """
+        Builds a GeoJSON FeatureCollection of the counties in some states.
+        :param state_fips: tuple of 2-digit state FIPS codes, or None for
+            every county
+        :param tolerance: one of the precomputed tolerances
+        """
+        level = self.levels[tolerance]
+        coords = level['coords'] / SCALE
+        ring_offsets, polygon_offsets = level['ring_offsets'], level['polygon_offsets']
+        feature_offsets = level['feature_offsets']
+        if state_fips is None:
+            selected = np.arange(len(self.ids))
+        else:
+            selected = np.flatnonzero(np.isin(np.char.zfill(self.ids, 5).astype('<U2'),
+                                              state_fips))
+        features = []
+        for i in selected:
+            polygons = []
+            for p in range(feature_offsets[i], feature_offsets[i + 1]):
+                polygons.append([coords[ring_offsets[r]:ring_offsets[r + 1]].tolist()
+                                 for r in range(polygon_offsets[p], polygon_offsets[p + 1])])
+            if len(polygons) == 1:
+                geometry = {'type': 'Polygon', 'coordinates': polygons[0]}
+            else:
+                geometry = {'type': 'MultiPolygon', 'coordinates': polygons}
+            features.append({'type': 'Feature', 'id': str(self.ids[i]), 'geometry': geometry})
+        return {'type': 'FeatureCollection', 'features': features}
+
+    def get_geojson(self, state_fips=None, zoom=3):
+        """
+        Returns the counties of some states, simplified for a zoom level.
+        :param state_fips: state FIPS codes, or None for every county
+        :param zoom: the map's initial zoom
+        """
+        self.load()
+        if state_fips is not None:
+            state_fips = tuple(sorted({str(code).zfill(2) for code in state_fips}))
+        key = (state_fips, self.get_tolerance(zoom))
+        with self.lock:
+            geojson = self.subsets.get(key)
+            if geojson is not None:
+                self.subsets.move_to_end(key)
+                return geojson
+        geojson = self.build(*key)
+        with self.lock:
+            self.subsets[key] = geojson
+            while len(self.subsets) > self.max_entries:
+                self.subsets.popitem(last=False)
+        return geojson
+
+
+_service = None
+
+
+def get_service(path='data/geojson-counties-fips.json'):
+    """
+    Returns the shared geometry service. Nothing is read until the first
+    geometries are requested.
+    :param path: county GeoJSON file
+    """
+    global _service
+    if _service is None:
+        _service = GeometryService(path)
+    return _service
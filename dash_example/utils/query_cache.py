@@ -0,0 +1,148 @@
+"""
+Memoized queries behind the cross-section view.
+
+Queries are keyed on their normalized (sorted state codes, year range), so
+the same selection made in a different order, or made again, is served
+from memory until its entry expires. The static fallback data is loaded
+once and indexed by state and year, so a fallback query is an index lookup
+instead of a scan of the whole file.
+"""
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+
+def normalize(state_codes, years):
+    """
+    Builds the cache key of a query.
+    :param state_codes: a state FIPS code or a list of them
+    :param years: a year or a list of years, of which the first and last
+        are used
+    """
+    if not isinstance(state_codes, (list, tuple)):
+        state_codes = [state_codes]
+    if not isinstance(years, (list, tuple)):
+        years = [years]
+    return tuple(sorted(set(state_codes))), (min(years), max(years))
+
+
+class QueryCache:
+    """
+    Memoizes a query function, expiring entries after a time to live and
+    evicting the least recently used ones beyond a size limit.
+    """
+
+    def __init__(self, fetch, ttl=900, max_entries=64):
+        """
+        :param fetch: function of (state_codes, years) returning a data frame
+        :param ttl: seconds an entry is served before it is queried again
+        :param max_entries: most queries kept in memory
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def lookup(self, key):
+        """
+        Returns an entry's frame if it has not expired, or None.
+        :param key: the query's key, see normalize
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, frame = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return frame
+
+    def get(self, state_codes, years):
+        """
+        Returns the data for a query, fetching it if it is not cached.
+        Concurrent requests for the same query fetch it once.
+        :param state_codes: a list of state FIPS codes
+        :param years: a list of years
+        """
+        key = normalize(state_codes, years)
+        frame = self.lookup(key)
+        if frame is not None:
+            return frame
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                frame = self.lookup(key)
+                if frame is None:
+                    frame = self.fetch(list(key[0]), list(key[1]))
+                    with self.lock:
+                        self.entries[key] = (time.monotonic() + self.ttl, frame)
+                        self.entries.move_to_end(key)
+                        while len(self.entries) > self.max_entries:
+                            self.entries.popitem(last=False)
+            finally:
+                with self.lock:
+                    if self.key_locks.get(key) is key_lock:
+                        del self.key_locks[key]
+        return frame
+
+    def warm_up(self, queries):
+        """
+        Fetches queries in a background thread so the first page load
+        finds them cached. Failed queries are skipped.
+        :param queries: a list of (state_codes, years) pairs
+        """
+        def run():
+            for state_codes, years in queries:
+                try:
+                    self.get(state_codes, years)
+                except Exception as error:
+                    print('WARM-UP QUERY FAILED: {} {} ({})'.format(state_codes, years, error))
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+class FallbackData:
+    """
+    Static backup data, loaded on first use and indexed by state and year.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: csv file with 'state_fips' and 'year' columns
+        """
+        self.path = path
+        self.frame = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Returns the indexed frame, reading the file the first time.
+        """
+        with self.lock:
+            if self.frame is None:
+                df = pd.read_csv(self.path)
+                self.frame = df.set_index(['state_fips', 'year'], drop=False).sort_index()
+            return self.frame
+
+    def select(self, state_codes, years):
+        """
+        Returns the rows for the given states within the year range.
+        :param state_codes: a list of state FIPS codes
+        :param years: a list of years, of which the first and last are used
+        """
+        df = self.load()
+        state_codes, (first, last) = normalize(state_codes, years)
+        present = df.index.levels[0]
+        state_codes = [code for code in state_codes if code in present]
+        if not state_codes:
+            return df.iloc[:0].reset_index(drop=True)
+        rows = df.loc[pd.IndexSlice[state_codes, first:last], :]
+        return rows.reset_index(drop=True)
@@ -0,0 +1,123 @@
+"""
+Cache of hurricane regression results for the detail view.
+
+Results are keyed by (hurricane, regression type, data version). The data
+version changes when one of the local data files is modified; entries of
+older versions are then dropped and, if a precompute job was started, it
+is run again so the new results are ready before they are requested. The
+data pulled for a hurricane is shared by both regression types, each fit
+getting its own copy.
+"""
+import os
+import threading
+
+
+def get_data_version(paths):
+    """
+    Returns a version identifying the current state of the upstream data.
+    :param paths: data files the results depend on
+    """
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                 for path in paths)
+
+
+class RegressionCache:
+    """
+    Memoizes regression results, computing each (hurricane, regression type)
+    once per data version.
+    """
+
+    def __init__(self, pull, fit, paths):
+        """
+        :param pull: function of a hurricane returning its API data
+        :param fit: function of (hurricane, regression type, API data)
+            returning the results to cache
+        :param paths: data files the results depend on
+        """
+        self.pull = pull
+        self.fit = fit
+        self.paths = paths
+        self.version = None
+        self.precomputed = None
+        self.data = {}
+        self.results = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def check_version(self):
+        """
+        Returns the current data version, dropping entries of older versions
+        and precomputing the new ones again.
+        """
+        version = get_data_version(self.paths)
+        changed = False
+        with self.lock:
+            if version != self.version:
+                changed = self.version is not None
+                self.version = version
+                self.data.clear()
+                self.results.clear()
+        if changed and self.precomputed is not None:
+            self.precompute(*self.precomputed)
+        return version
+
+    def compute_once(self, entries, key, compute):
+        """
+        Returns entries[key], computing it if it is missing. Concurrent
+        callers asking for the same key compute it once.
+        :param entries: dict of computed values
+        :param key: the entry's key
+        :param compute: function computing the value
+        """
+        with self.lock:
+            if key in entries:
+                return entries[key]
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self.lock:
+                if key in entries:
+                    return entries[key]
+            try:
+                value = compute()
+                with self.lock:
+                    if key[-1] == self.version:
+                        entries[key] = value
+            finally:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+        return value
+
+    def get(self, hurricane, regression_type):
+        """
+        Returns the results of a regression.
+        :param hurricane: the hurricane's name
+        :param regression_type: 'Pooled' or 'Fixed Effects'
+        """
+        version = self.check_version()
+        data = self.compute_once(self.data, (hurricane, version),
+                                 lambda: self.pull(hurricane))
+        return self.compute_once(self.results, (hurricane, regression_type, version),
+                                 lambda: self.fit(hurricane, regression_type, data.copy()))
+
+    def precompute(self, hurricanes, regression_types):
+        """
+        Fills the cache for every hurricane and regression type in a
+        background thread, and again whenever the data version changes.
+        Failed regressions are skipped and computed again when they are
+        requested.
+        :param hurricanes: hurricane names
+        :param regression_types: regression types
+        """
+        self.precomputed = (hurricanes, regression_types)
+        def run():
+            for hurricane in hurricanes:
+                for regression_type in regression_types:
+                    try:
+                        self.get(hurricane, regression_type)
+                    except Exception as error:
+                        print('PRECOMPUTE FAILED: {} {} ({})'.format(
+                            hurricane, regression_type, error))
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
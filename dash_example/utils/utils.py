@@ -2,23 +2,35 @@
 (la)Monty Python
 Aditya Retnanto
 March 2022
-Module to initialize mapbox set up
+Module to initialize mapbox set up lazily
 """
 import json
 import pandas as pd
 
-def detail_view_init():
+_detail_data = None
+
+def load_detail_data():
+    """
+    Opens set up files for the hurricane view on first use. County
+    geometries are loaded separately by utils.geometry.
+    """
+    global _detail_data
+    if _detail_data is None:
+        winner = pd.read_csv("data/county_president_winner.csv", dtype={"county_fips": str})
+        hurricane_path = pd.read_csv("data/hurricane_path.csv")
+        with open('data/hurricane_scope.json', 'r') as f:
+            hurricane_scope = json.load(f)
+        hurricanes = hurricane_path['NAME'].unique()
+        _detail_data = winner, hurricane_path, hurricane_scope, hurricanes
+    return _detail_data
+
+def get_state_fips(hurricane_scope, hurricane):
     """
-    Opens set up json files to initialize chloropleth map
+    Returns the 2-digit FIPS codes of the states a hurricane hit
+    :param hurricane_scope: dict loaded from hurricane_scope.json
+    :param hurricane: hurricane name
     """
-    with open('data/geojson-counties-fips.json', 'r') as f:
-        counties = json.load(f)
-    winner = pd.read_csv("data/county_president_winner.csv", dtype={"county_fips": str})
-    hurricane_path = pd.read_csv("data/hurricane_path.csv")
-    with open('data/hurricane_scope.json', 'r') as f:
-        hurricane_scope = json.load(f)
-    hurricanes = hurricane_path['NAME'].unique()
-    return counties, winner, hurricane_path, hurricane_scope, hurricanes
+    return [str(code).zfill(2) for code in hurricane_scope[hurricane]["states_fips"]]
 
 def get_election_year(year):
     """
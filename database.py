@@ -1,10 +1,324 @@
 """
-Creates database and makes API calls to Open States and ProPublica.
+Local SQLite store for Open States bills, their actions and votes.
+
+Bills are kept in one normalized table, keyed on the Open States id, with
+actions and votes in child tables and a bill_topics table linking bills to
+the keyword topics they were found under. Loads are batched through
+`executemany` in WAL mode, and the indexes on state, identifier and dates
+serve per-state and per-topic lookups without scanning the table.
 """
 
-import pandas as pd
 import sqlite3
+import pandas as pd
 import openstates_api
+import http_transport
+import abstract_cleaner
+import pipeline
+
+DEFAULT_PATH = 'bill_data.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bills (
+    id TEXT PRIMARY KEY,
+    identifier TEXT NOT NULL,
+    title TEXT NOT NULL,
+    state TEXT NOT NULL,
+    session TEXT,
+    from_org TEXT,
+    openstates_url TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    first_action_date TEXT,
+    latest_action_date TEXT,
+    latest_action_description TEXT,
+    abstract TEXT
+);
+CREATE TABLE IF NOT EXISTS bill_topics (
+    topic TEXT NOT NULL,
+    bill_id TEXT NOT NULL REFERENCES bills (id) ON DELETE CASCADE,
+    PRIMARY KEY (topic, bill_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS actions (
+    bill_id TEXT NOT NULL REFERENCES bills (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    date TEXT,
+    description TEXT,
+    organization TEXT,
+    classification TEXT,
+    PRIMARY KEY (bill_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS votes (
+    id TEXT PRIMARY KEY,
+    bill_id TEXT NOT NULL REFERENCES bills (id) ON DELETE CASCADE,
+    motion_text TEXT,
+    start_date TEXT,
+    result TEXT,
+    organization TEXT,
+    yes_count INTEGER,
+    no_count INTEGER,
+    other_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_bills_state_action ON bills (state, latest_action_date);
+CREATE INDEX IF NOT EXISTS idx_bills_identifier ON bills (identifier);
+CREATE INDEX IF NOT EXISTS idx_bills_created ON bills (created_at);
+CREATE INDEX IF NOT EXISTS idx_bills_updated ON bills (updated_at);
+CREATE INDEX IF NOT EXISTS idx_topics_bill ON bill_topics (bill_id);
+CREATE INDEX IF NOT EXISTS idx_actions_date ON actions (date);
+CREATE INDEX IF NOT EXISTS idx_votes_bill ON votes (bill_id);
+CREATE INDEX IF NOT EXISTS idx_votes_date ON votes (start_date);
+"""
+
+BILL_COLUMNS = ['id', 'identifier', 'title', 'state', 'session', 'from_org',
+                'openstates_url', 'created_at', 'updated_at', 'first_action_date',
+                'latest_action_date', 'latest_action_description', 'abstract']
+
+
+def get_name(entity):
+    """
+    Gets the name of a nested organization or jurisdiction.
+
+    Inputs:
+        - entity (dict or None): the nested object
+
+    Returns: (str or None) its name
+    """
+    return entity.get('name') if isinstance(entity, dict) else None
+
+
+def get_bill_row(bill, state):
+    """
+    Flattens a raw Open States bill into a row of the bills table.
+
+    Inputs:
+        - bill (dict): raw bill information
+        - state (str): state the bill was fetched for
+
+    Returns: (tuple) values in `BILL_COLUMNS` order
+    """
+    abstracts = bill.get('abstracts') or []
+    abstract = abstracts[0].get('abstract', '') if abstracts else ''
+    if abstract:
+        abstract = abstract_cleaner.clean_abstract(abstract, bill.get('title'))
+    return (bill['id'], bill.get('identifier'), bill.get('title'), state,
+            bill.get('session'), get_name(bill.get('from_organization')),
+            bill.get('openstates_url'), bill.get('created_at'),
+            bill.get('updated_at'), bill.get('first_action_date'),
+            bill.get('latest_action_date'), bill.get('latest_action_description'),
+            abstract)
+
+
+def get_action_rows(bill):
+    """
+    Flattens the actions of a raw bill into rows of the actions table.
+
+    Inputs:
+        - bill (dict): raw bill information
+
+    Returns: (list of tuples) one row per action
+    """
+    rows = []
+    for position, action in enumerate(bill.get('actions') or []):
+        rows.append((bill['id'], action.get('order', position), action.get('date'),
+                     action.get('description'), get_name(action.get('organization')),
+                     ','.join(action.get('classification') or [])))
+    return rows
+
+
+def get_vote_rows(bill):
+    """
+    Flattens the votes of a raw bill into rows of the votes table.
+
+    Inputs:
+        - bill (dict): raw bill information
+
+    Returns: (list of tuples) one row per vote
+    """
+    rows = []
+    for vote in bill.get('votes') or []:
+        counts = {c.get('option'): c.get('value') for c in vote.get('counts') or []}
+        other = sum(v or 0 for option, v in counts.items() if option not in ('yes', 'no'))
+        rows.append((vote['id'], bill['id'], vote.get('motion_text'),
+                     vote.get('start_date'), vote.get('result'),
+                     get_name(vote.get('organization')),
+                     counts.get('yes'), counts.get('no'), other))
+    return rows
+
+
+class BillStore:
+    """
+    SQLite store of bills with bulk loads and indexed lookups.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Initializes an instance of the `BillStore` class, creating the
+        schema if needed.
+
+        Inputs:
+            - path (str): SQLite database file
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.executescript(SCHEMA)
+
+    def load(self, bills, state, topic=None, batch_size=500):
+        """
+        Upserts bills with their actions and votes, one transaction per
+        batch. A reloaded bill's actions and votes replace the old ones,
+        and a bill repeated within a batch, as happens when paging by
+        update time moves it to a later page, is loaded from its last copy.
+
+        Inputs:
+            - bills (iterable of dicts): raw Open States bills
+            - state (str): state the bills were fetched for
+            - topic (str): topic to file the bills under, if any
+            - batch_size (int): bills written per transaction
+
+        Returns: (int) number of bills loaded, counting a bill repeated
+            within a batch once
+        """
+        updates = ', '.join('{0}=excluded.{0}'.format(c) for c in BILL_COLUMNS[1:])
+        bill_sql = 'INSERT INTO bills ({}) VALUES ({}) ON CONFLICT (id) DO UPDATE SET {}'.format(
+            ', '.join(BILL_COLUMNS), ', '.join('?' * len(BILL_COLUMNS)), updates)
+        loaded = 0
+        for batch in pipeline.batched(bills, batch_size):
+            batch = list({bill['id']: bill for bill in batch}.values())
+            ids = [(bill['id'],) for bill in batch]
+            with self.conn:
+                self.conn.executemany(bill_sql, [get_bill_row(b, state) for b in batch])
+                self.conn.executemany('DELETE FROM actions WHERE bill_id = ?', ids)
+                self.conn.executemany('DELETE FROM votes WHERE bill_id = ?', ids)
+                self.conn.executemany('INSERT INTO actions VALUES (?, ?, ?, ?, ?, ?)',
+                                      [row for b in batch for row in get_action_rows(b)])
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO votes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [row for b in batch for row in get_vote_rows(b)])
+                if topic is not None:
+                    self.conn.executemany(
+                        'INSERT OR IGNORE INTO bill_topics VALUES (?, ?)',
+                        [(topic, bill_id) for bill_id, in ids])
+            loaded += len(batch)
+        return loaded
+
+    def build_query(self, select, state=None, topic=None, updated_since=None):
+        """
+        Builds a query over the bills table with optional filters.
+
+        Inputs:
+            - select (str): the select list, like 'b.*'
+            - state (str): only bills of this state
+            - topic (str): only bills filed under this topic
+            - updated_since (str): only bills updated at or after this
+                ISO timestamp
+
+        Returns: (tuple) the SQL and its parameters
+        """
+        sql = 'SELECT {} FROM bills b'.format(select)
+        clauses = []
+        params = []
+        if topic is not None:
+            # CROSS JOIN makes SQLite start from the topic's bills, which are
+            # usually far fewer than the state's.
+            sql = 'SELECT {} FROM bill_topics t CROSS JOIN bills b ON t.bill_id = b.id'.format(
+                select)
+            clauses.append('t.topic = ?')
+            params.append(topic)
+        if state is not None:
+            clauses.append('b.state = ?')
+            params.append(state)
+        if updated_since is not None:
+            clauses.append('b.updated_at >= ?')
+            params.append(updated_since)
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return sql, params
+
+    def get_bills(self, state=None, topic=None, updated_since=None, limit=None):
+        """
+        Looks up bills, most recently acted on first.
+
+        Inputs:
+            - state (str): only bills of this state
+            - topic (str): only bills filed under this topic
+            - updated_since (str): only bills updated at or after this
+                ISO timestamp
+            - limit (int): most bills returned
+
+        Returns: (list of dicts) the bills
+        """
+        sql, params = self.build_query('b.*', state, topic, updated_since)
+        sql += ' ORDER BY b.latest_action_date DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def get_bill(self, identifier, state):
+        """
+        Looks up a bill by its identifier, like 'HB 1234'.
+
+        Inputs:
+            - identifier (str): the bill identifier
+            - state (str): the bill's state
+
+        Returns: (dict or None) the bill
+        """
+        row = self.conn.execute('SELECT * FROM bills WHERE identifier = ? AND state = ?',
+                                (identifier, state)).fetchone()
+        return dict(row) if row else None
+
+    def get_actions(self, bill_id):
+        """
+        Looks up the actions on a bill, in order.
+
+        Inputs:
+            - bill_id (str): Open States bill id
+
+        Returns: (list of dicts) the actions
+        """
+        rows = self.conn.execute('SELECT * FROM actions WHERE bill_id = ? ORDER BY position',
+                                 (bill_id,))
+        return [dict(row) for row in rows]
+
+    def get_votes(self, bill_id):
+        """
+        Looks up the votes on a bill, oldest first.
+
+        Inputs:
+            - bill_id (str): Open States bill id
+
+        Returns: (list of dicts) the votes
+        """
+        rows = self.conn.execute('SELECT * FROM votes WHERE bill_id = ? ORDER BY start_date',
+                                 (bill_id,))
+        return [dict(row) for row in rows]
+
+    def count_bills(self, state=None, topic=None):
+        """
+        Counts bills by state and topic.
+
+        Inputs:
+            - state (str): only bills of this state
+            - topic (str): only bills filed under this topic
+
+        Returns: (int) the number of bills
+        """
+        sql, params = self.build_query('COUNT(*)', state, topic)
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database connection.
+
+        Inputs: None
+
+        Returns: Nothing
+        """
+        self.conn.close()
 
 
 def get_state_data(state, keywords):
@@ -12,36 +326,34 @@ def get_state_data(state, keywords):
     Connects to the Open States API to get data on state bills.
 
     Inputs:
-        - state_names: list of states
-    
-    Returns: (Pandas dataframe) bill data for all input states
-    """
-    state_bills = openstates_api.gget_data_for_state_and_topic(state, keywords)
-    state_bills_df = pd.DataFrame(state_bills)
+        - state (str): state to search
+        - keywords (list of str): keywords to search for
 
-    return state_bills_df
+    Returns: (Pandas dataframe) bill data for the state
+    """
+    state_bills = openstates_api.get_data_for_state_and_topic(state, keywords)
+    return pd.DataFrame(state_bills)
 
 
 def create_sql_tables(state_names, keywords, topic):
     """
-    Creates an SQL table from the state and national dataframes.
-    
+    Fetches bills for each state and loads them into the topic's database.
+
     Inputs:
-        - state_names: list of states
-        - api_key: (str) API key to connect to ProPublica
-    
-    Returns: Nothing
-    """
-    database_name = topic + 'bill_data.db'
-    conn = sqlite3.connect(database_name)
-    c = conn.cursor()
+        - state_names (list of str): states to search
+        - keywords (list of str): keywords to search for
+        - topic (str): topic name, used for the database file and to
+            file the bills under
 
+    Returns: (BillStore) the loaded store
+    """
+    store = BillStore(topic + '_' + DEFAULT_PATH)
     for state in state_names:
-        state_bills_df = get_state_data(state_names, keywords)
-        data_name = state + "_" + topic + "_bills"
-        state_bills_df.to_sql(data_name, conn)
-    
-    c.close()
+        api_call = openstates_api.OpenStatesAPI(state, keywords)
+        loaded = pipeline.run_pipeline(api_call.iter_bills(), lambda bills: bills,
+                                       lambda bills: store.load(bills, state, topic))
+        print("Loaded {} {} bills for {}.".format(loaded, topic, state))
+    return store
 
 
 def run():
@@ -57,7 +369,9 @@ def run():
     keywords = ["climate", "environment", "energy"]
     topic = "climate_change"
 
-    create_sql_tables(states, keywords, topic)
+    store = create_sql_tables(states, keywords, topic)
+    store.close()
+    http_transport.get_transport().print_stats()
 
 
 if __name__ == '__main__':
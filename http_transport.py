@@ -0,0 +1,297 @@
+'''
+Shared HTTP transport for the API clients and scrapers.
+
+Keeps one pooled, keep-alive `requests.Session` per host so repeated calls
+to the same site reuse their TCP/TLS connections, and records per-host
+connection reuse and latency so the savings can be checked after an ingest.
+An optional on-disk `ResponseCache` can sit in front of the network.
+'''
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import response_cache
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class HostStats:
+    '''
+    Request counts and latency for a single host.
+    '''
+
+    def __init__(self):
+        '''
+        Initializes an instance of the `HostStats` class.
+
+        Inputs: None
+        '''
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency):
+        '''
+        Records a completed request.
+
+        Inputs:
+            - latency (float): seconds taken by the request
+
+        Returns: Nothing
+        '''
+        self.requests += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+
+class HTTPTransport:
+    '''
+    Pooled HTTP client with per-host sessions, timeouts and retries.
+    '''
+
+    def __init__(self, timeout=(5, 30), max_retries=3, backoff_factor=0.5,
+                 pool_size=10, cache=None):
+        '''
+        Initializes an instance of the `HTTPTransport` class.
+
+        Inputs:
+            - timeout (float or tuple): connect and read timeout in seconds
+            - max_retries (int): retries on connection errors and 5xx responses
+            - backoff_factor (float): base delay for exponential backoff
+            - pool_size (int): maximum open connections kept per host
+            - cache (ResponseCache): on-disk response cache, None to always
+                use the network
+        '''
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.cache = cache
+        self.sessions = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get_session(self, host):
+        '''
+        Returns the session for a host, creating it on first use.
+
+        Inputs:
+            - host (str): scheme and host, e.g. 'https://v3.openstates.org'
+
+        Returns: (requests.Session) the pooled session
+        '''
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=self.pool_size)
+                session.mount(host, adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                                        'Connection': 'keep-alive'})
+                self.sessions[host] = session
+                self.stats[host] = HostStats()
+            return session
+
+    def get_backoff(self, attempt):
+        '''
+        Computes the delay before a retry, using exponential backoff with
+        full jitter.
+
+        Inputs:
+            - attempt (int): zero-based retry number
+
+        Returns: (float) seconds to wait
+        '''
+        return random.uniform(0, self.backoff_factor * 2 ** attempt)
+
+    def get(self, url, **kwargs):
+        '''
+        Makes a GET request, answering from the response cache when it
+        holds a fresh copy and revalidating stale copies with a
+        conditional request. Raises `CacheMiss` for unrecorded URLs when the
+        cache is offline.
+
+        Inputs:
+            - url (str): the url to request
+            - kwargs: passed through to `requests.Session.get`
+
+        Returns: (requests.Response) the response
+        '''
+        parts = urlsplit(url)
+        host = parts.scheme + '://' + parts.netloc
+        if self.cache is None:
+            return self.fetch(url, host, **kwargs)
+
+        cached = self.cache.lookup(url)
+        if cached and (cached['fresh'] or self.cache.offline):
+            self.get_session(host)
+            with self.lock:
+                self.stats[host].cache_hits += 1
+            return cached['response']
+        if self.cache.offline:
+            raise response_cache.CacheMiss(url)
+
+        if cached:
+            headers = dict(kwargs.pop('headers', None) or {})
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+            kwargs['headers'] = headers
+        r = self.fetch(url, host, **kwargs)
+        if r.status_code == 304 and cached:
+            self.cache.refresh(url)
+            with self.lock:
+                self.stats[host].revalidated += 1
+            # The cached copy carries no rate limit headers; report the
+            # live ones from the revalidation request instead.
+            response = cached['response']
+            response.headers.update({key: value for key, value in r.headers.items()
+                                     if response_cache.is_rate_limit_header(key)})
+            return response
+        if r.status_code == 200:
+            self.cache.store(url, parts.netloc, r)
+        return r
+
+    def fetch(self, url, host, **kwargs):
+        '''
+        Makes a GET request through the host's pooled session. Connection
+        errors, timeouts and 5xx responses are retried; any other response
+        is returned to the caller as-is.
+
+        Inputs:
+            - url (str): the url to request
+            - host (str): scheme and host of the url
+            - kwargs: passed through to `requests.Session.get`
+
+        Returns: (requests.Response) the response
+        '''
+        session = self.get_session(host)
+        stats = self.stats[host]
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                r = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                with self.lock:
+                    stats.errors += 1
+                if attempt == self.max_retries:
+                    raise
+            else:
+                with self.lock:
+                    stats.record(time.perf_counter() - start)
+                if r.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return r
+            with self.lock:
+                stats.retries += 1
+            time.sleep(self.get_backoff(attempt))
+
+    def get_stats(self):
+        '''
+        Summarizes connection reuse and latency for every host contacted.
+
+        Inputs: None
+
+        Returns: (dict) host to a dict of statistics
+        '''
+        summary = {}
+        with self.lock:
+            for host, session in self.sessions.items():
+                stats = self.stats[host]
+                pools = session.get_adapter(host).poolmanager.pools
+                connections = sum(pools[key].num_connections
+                                  for key in pools.keys())
+                summary[host] = {
+                    'requests': stats.requests,
+                    'new_connections': connections,
+                    'reused_connections': max(stats.requests - connections, 0),
+                    'retries': stats.retries,
+                    'errors': stats.errors,
+                    'cache_hits': stats.cache_hits,
+                    'revalidated': stats.revalidated,
+                    'mean_latency_ms': (1000 * stats.total_latency / stats.requests
+                                        if stats.requests else 0.0),
+                    'max_latency_ms': 1000 * stats.max_latency,
+                }
+        return summary
+
+    def print_stats(self):
+        '''
+        Prints the per-host statistics.
+
+        Inputs: None
+
+        Returns: Nothing, but prints one line per host
+        '''
+        for host, stats in self.get_stats().items():
+            print("{}: {} requests, {} new connections, {} reused, "
+                  "{} cache hits, {} revalidated, mean latency {:.1f} ms".format(
+                      host, stats['requests'], stats['new_connections'],
+                      stats['reused_connections'], stats['cache_hits'],
+                      stats['revalidated'], stats['mean_latency_ms']))
+
+    def close(self):
+        '''
+        Closes every pooled session.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+            self.stats = {}
+
+
+_transport = HTTPTransport()
+
+
+def enable_cache(cache_dir='.http_cache', offline=False, **kwargs):
+    '''
+    Puts an on-disk response cache in front of the shared transport.
+
+    Inputs:
+        - cache_dir (str): directory holding the cache
+        - offline (bool): true to serve only recorded responses
+        - kwargs: passed through to `ResponseCache`
+
+    Returns: (ResponseCache) the cache
+    '''
+    _transport.cache = response_cache.ResponseCache(cache_dir, offline=offline,
+                                                    **kwargs)
+    return _transport.cache
+
+
+def get_transport():
+    '''
+    Returns the transport shared by every API client in this package.
+
+    Inputs: None
+
+    Returns: (HTTPTransport) the shared transport
+    '''
+    return _transport
+
+
+def get(url, **kwargs):
+    '''
+    Makes a GET request through the shared transport.
+
+    Inputs:
+        - url (str): the url to request
+        - kwargs: passed through to `HTTPTransport.get`
+
+    Returns: (requests.Response) the response
+    '''
+    return _transport.get(url, **kwargs)
@@ -2,9 +2,33 @@
 API to scrape the League of Conservation Voters' website to
 retrieve environment scores for each legislator.
 '''
-import requests
+import re
+from html.parser import HTMLParser
+import http_transport
 from bs4 import BeautifulSoup
 
+LCV_URL_BASE = 'https://scorecard.lcv.org'
+PARTY_STATE = re.compile(r'\(\s*[A-Z]+\s*-\s*([A-Z]{2})\s*\)')
+STATE_CODES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR',
+    'california': 'CA', 'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE',
+    'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID',
+    'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS',
+    'kentucky': 'KY', 'louisiana': 'LA', 'maine': 'ME', 'maryland': 'MD',
+    'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE',
+    'nevada': 'NV', 'new hampshire': 'NH', 'new jersey': 'NJ',
+    'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC',
+    'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR',
+    'pennsylvania': 'PA', 'rhode island': 'RI', 'south carolina': 'SC',
+    'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT',
+    'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA',
+    'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+    'american samoa': 'AS', 'district of columbia': 'DC', 'guam': 'GU',
+    'northern mariana islands': 'MP', 'puerto rico': 'PR',
+    'virgin islands': 'VI',
+}
+
 
 def get_lcv_data():
     '''
@@ -15,77 +39,310 @@ def get_lcv_data():
 
     Returns: (list of dicts) list of congress member information
     '''
+    return list(iter_lcv_data())
+
+
+def iter_lcv_data(parser=None):
+    '''
+    Lazily yields the environment score of each member of the U.S.
+    Congress from the LCV website, skipping duplicate rows.
+
+    Inputs:
+        - parser (str): 'stream', 'lxml' or 'html.parser'; see
+            `parse_lcv_page`
+
+    Returns: (generator of dicts) congress member information
+    '''
     url = "https://scorecard.lcv.org/members-of-congress"
-    r = requests.get(url)
-    soup = BeautifulSoup(r.content)
-    
-    congress = []
-    url_base = 'https://scorecard.lcv.org'
-    for div in soup.find_all('div', class_="tableRow"):
+    r = http_transport.get(url)
+    yield from parse_lcv_page(r.text, parser)
+
+
+def parse_lcv_page(html, parser=None):
+    '''
+    Parses the LCV members page in a single pass. Each span is classified
+    once by its class attribute, and members are deduplicated with a dict
+    keyed on (name, congress, state, district).
+
+    Inputs:
+        - html (str): the page source
+        - parser (str): 'stream' for the tree-free tokenizer (the default),
+            or a BeautifulSoup parser name such as 'lxml' or 'html.parser'
+
+    Returns: (generator of dicts) congress member information
+    '''
+    if parser is None or parser == 'stream':
+        rows = iter_rows_streaming(html)
+    else:
+        rows = iter_rows_soup(html, parser)
+
+    members = {}
+    for spans in rows:
         member = {}
+        for span_class, text, href in spans:
+            SPAN_HANDLERS[span_class](member, text, href)
+        if not member:
+            continue
+        key = (member.get('name'), member.get('congress'),
+               member.get('state'), member.get('district'))
+        if key not in members:
+            members[key] = member
+            yield member
+
+
+def set_name(member, text, href):
+    '''
+    Fills in a member's name and scorecard link from a `mocName` span.
+    '''
+    member['name'] = text
+    if href is not None:
+        member['lcv_link'] = LCV_URL_BASE + href
+
+
+def set_party(member, text, href):
+    '''
+    Fills in a member's party from a `mocParty` span.
+    '''
+    member["party"] = text
+
+
+def set_state(member, text, href):
+    '''
+    Fills in a member's chamber, state and district from a `mocState`
+    span, which holds 'IL' for senators and 'IL-07' for representatives.
+    '''
+    if len(text) == 2:
+        member["congress"] = "Senate"
+        member["district"] = None
+    else:
+        member["congress"] = "House"
+        member["district"] = text[-2:]
+    member["state"] = text[:2]
+
+
+def set_rating(member, text, href):
+    '''
+    Fills in a member's lifetime score from a `mocRating` span.
+    '''
+    member["lcv_rating"] = text
+
+
+# Span class to the function filling in its member fields. Each is called
+# as handler(member, text, href) with the member dict being built, the
+# span's text and the last link in the span, or None, and sets fields on
+# the member in place.
+SPAN_HANDLERS = {
+    'mocName': set_name,
+    'mocParty': set_party,
+    'mocState': set_state,
+    'mocRating': set_rating,
+}
+
+
+def classify_span(classes):
+    '''
+    Finds which member field a span holds from its classes.
+
+    Inputs:
+        - classes (list of str): the span's class attribute, split
+
+    Returns: (str or None) the key of `SPAN_HANDLERS`, or None for header
+        and unrelated spans
+    '''
+    if 'tableHeader' in classes:
+        return None
+    for span_class in classes:
+        if span_class in SPAN_HANDLERS:
+            return span_class
+    return None
+
+
+def iter_rows_soup(html, parser):
+    '''
+    Extracts member rows with BeautifulSoup.
+
+    Inputs:
+        - html (str): the page source
+        - parser (str): BeautifulSoup parser name
+
+    Returns: (generator of lists) (span class, text, link) tuples per row
+    '''
+    soup = BeautifulSoup(html, parser)
+    for div in soup.find_all('div', class_="tableRow"):
+        spans = []
         for span in div.find_all('span'):
-            if "tableHeader" in str(span):
+            span_class = classify_span(span.get('class') or [])
+            if span_class is None:
                 continue
-            if "mocName" in str(span):
-                member['name'] = span.text
-                for a in span.find_all('a'):
-                    member['lcv_link'] = url_base + a['href']
-            elif "mocParty" in str(span):
-                member["party"] = span.text
-            elif "mocState" in str(span):
-                if len(span.text) == 2:
-                    member["congress"] = "Senate"
-                    member["district"] = None
-                else:
-                    member["congress"] = "House"
-                    member["district"] = span.text[-2:]
-                member["state"] = span.text[:2]
-            elif "mocRating" in str(span):
-                member["lcv_rating"] = span.text
-            if member and member not in congress:
-                congress.append(member)
-
-    return congress
-
-
-def get_current_senators():
+            links = span.find_all('a', href=True)
+            href = links[-1]['href'] if links else None
+            spans.append((span_class, span.text, href))
+        yield spans
+
+
+class LCVRowParser(HTMLParser):
+    '''
+    Streaming tokenizer that collects member spans from `tableRow` divs
+    without building a document tree.
+    '''
+
+    def __init__(self):
+        '''
+        Initializes an instance of the `LCVRowParser` class.
+
+        Inputs: None
+        '''
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.div_depth = 0
+        self.row_depth = None
+        self.spans = None
+        self.span_depth = 0
+        self.span_class = None
+        self.text = []
+        self.href = None
+
+    def handle_starttag(self, tag, attrs):
+        '''
+        Tracks div nesting to find `tableRow` divs, and starts collecting a
+        member span, or its link, inside one.
+
+        Inputs:
+            - tag (str): the tag name, lowercased
+            - attrs (list of tuples): the tag's (name, value) attributes
+
+        Returns: Nothing
+        '''
+        if tag == 'div':
+            self.div_depth += 1
+            if self.row_depth is None:
+                classes = (dict(attrs).get('class') or '').split()
+                if 'tableRow' in classes:
+                    self.row_depth = self.div_depth
+                    self.spans = []
+        elif self.row_depth is None:
+            return
+        elif tag == 'span':
+            if self.span_depth:
+                self.span_depth += 1
+                return
+            self.span_class = classify_span((dict(attrs).get('class') or '').split())
+            if self.span_class is not None:
+                self.span_depth = 1
+                self.text = []
+                self.href = None
+        elif tag == 'a' and self.span_depth:
+            href = dict(attrs).get('href')
+            if href is not None:
+                self.href = href
+
+    def handle_endtag(self, tag):
+        '''
+        Finishes the current member span or `tableRow` div, adding it to
+        its row or to `rows`.
+
+        Inputs:
+            - tag (str): the tag name, lowercased
+
+        Returns: Nothing
+        '''
+        if tag == 'div':
+            if self.row_depth == self.div_depth:
+                self.rows.append(self.spans)
+                self.row_depth = None
+                self.spans = None
+            self.div_depth = max(self.div_depth - 1, 0)
+        elif tag == 'span' and self.span_depth:
+            self.span_depth -= 1
+            if not self.span_depth:
+                self.spans.append((self.span_class, ''.join(self.text), self.href))
+
+    def handle_data(self, data):
+        '''
+        Collects text inside a member span.
+
+        Inputs:
+            - data (str): text between tags
+
+        Returns: Nothing
+        '''
+        if self.span_depth:
+            self.text.append(data)
+
+
+def iter_rows_streaming(html, chunk_size=65536):
+    '''
+    Extracts member rows with the streaming tokenizer, feeding the page in
+    chunks and yielding rows as soon as they are complete.
+
+    Inputs:
+        - html (str): the page source
+        - chunk_size (int): characters fed to the tokenizer at a time
+
+    Returns: (generator of lists) (span class, text, link) tuples per row
+    '''
+    parser = LCVRowParser()
+    for i in range(0, len(html), chunk_size):
+        parser.feed(html[i:i + chunk_size])
+        yield from parser.rows
+        parser.rows = []
+    parser.close()
+    yield from parser.rows
+
+
+def get_current_senators(with_states=False):
     '''
     Scrapes the U.S. Senate website to determine the current senators.
 
-    Inputs: None
+    Inputs:
+        - with_states (bool): true to pair each name with its state
 
-    Returns: (list of str) the names of all current senators
+    Returns: (list of str) the names of all current senators, or, with
+        `with_states`, (name, two-letter state code) tuples; the state is
+        None when the page does not show it
     '''
     senate_url = "https://www.senate.gov/senators/"
-    r = requests.get(senate_url)
+    r = http_transport.get(senate_url)
     soup = BeautifulSoup(r.content)
 
     current_sens = []
     for a in soup.find_all('a'):
         if "senate.gov" in str(a) and " " in str(a.text):
-            current_sens.append(a.text)
+            # Each name is followed by its party and state, as '(D-IL)'.
+            match = PARTY_STATE.search(a.parent.get_text()) if a.parent else None
+            state = match.group(1) if match else None
+            current_sens.append((a.text, state) if with_states else a.text)
 
     return current_sens
 
 
-def get_current_representatives():
+def get_current_representatives(with_states=False):
     '''
     Scrapes the U.S. House of Representatives website 
     to determine the current representatives.
 
-    Inputs: None
+    Inputs:
+        - with_states (bool): true to pair each name with its state
 
-    Returns: (list of str) the names of all current representatives
+    Returns: (list of str) the names of all current representatives, or,
+        with `with_states`, (name, two-letter state code) tuples; the state
+        is None when the page does not show it
     '''
     house_url = "https://www.house.gov/representatives"
-    r = requests.get(house_url)
+    r = http_transport.get(house_url)
     soup = BeautifulSoup(r.content)
 
     current_reps = []
+    seen = set()
     for a in soup.find_all('a'):
         if ("house.gov" in str(a) 
             and "house.gov" not in str(a.text) 
-            and a.text not in current_reps):
-            current_reps.append(a.text)
+            and a.text not in seen):
+            seen.add(a.text)
+            # Representatives are listed in one table per state.
+            table = a.find_parent('table')
+            caption = table.caption if table else None
+            state = STATE_CODES.get(caption.get_text().strip().lower()) if caption else None
+            current_reps.append((a.text, state) if with_states else a.text)
     
     return current_reps
@@ -1,14 +1,122 @@
 """
 API to connect to OpenStates.
 
-Running into issue with call limits on the API (lines 84-85) and may need to 
-    rethink how we store the data and make the API calls.
+Pages are fetched through a bounded worker pool and a token-bucket rate
+    limiter that follows the API's rate-limit headers, so large pulls no
+    longer need a fixed sleep between calls.
 """
 
 import json
 import math
+import random
+import threading
 import time
-import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import http_transport
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    The bucket refills at `rate` tokens per second up to `capacity`. The
+    refill rate is adjusted from the API's rate-limit headers and the bucket
+    is paused entirely after a 429 response.
+    """
+
+    def __init__(self, rate=1.0, capacity=1):
+        """
+        Initializes an instance of the `TokenBucket` class.
+
+        Inputs:
+            - rate: (float) tokens added per second
+            - capacity: (int) maximum number of tokens held at once
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        """
+        Adds the tokens accrued since the last refill.
+
+        Inputs:
+            - now: (float) current monotonic time
+
+        Returns: Nothing
+        """
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then consumes it.
+
+        Inputs: None
+
+        Returns: Nothing
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now,
+                           (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """
+        Adjusts the refill rate from `X-RateLimit-*` response headers.
+
+        Inputs:
+            - headers: (dict) response headers
+
+        Returns: Nothing
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining = float(remaining)
+            reset = float(reset)
+        except ValueError:
+            return
+        # Reset may be sent either as seconds-until-reset or as an epoch time.
+        if reset > time.time():
+            reset -= time.time()
+        with self.lock:
+            if remaining <= 0:
+                self.paused_until = time.monotonic() + max(reset, 1.0)
+            elif reset > 0:
+                self.rate = max(remaining / reset, 0.1)
+
+    def backoff(self, seconds):
+        """
+        Pauses the bucket after the API reports too many requests.
+
+        Inputs:
+            - seconds: (float) how long to wait before the next call
+
+        Returns: Nothing
+        """
+        with self.lock:
+            self.tokens = 0
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + seconds)
+
+
+# Rate limits apply per API key, so every client shares one bucket.
+_rate_limiter = TokenBucket(rate=1.0, capacity=4)
 
 
 class OpenStatesAPI:
@@ -19,19 +127,32 @@ class OpenStatesAPI:
     query_path = "&sort=updated_desc&include=abstracts&include=actions&include=votes"
     page_path = "&page="
     end_path = "&per_page=20&apikey=4a087065-961f-4547-b32e-f29ebf328083"
+    max_retries = 5
 
-    def __init__(self, state, keywords):
+    def __init__(self, state, keywords, max_workers=4, rate_limiter=None,
+                 transport=None, updated_since=None):
         """
         Initializes an instance of the `OpenStatesAPI` class.
 
         Inputs:
             - state: (str) name of state
             - keywords: list of keywords to filter by
-            - loop_num: (int) number of loops to retrieve all bills
+            - max_workers: (int) number of pages to fetch at once
+            - rate_limiter: (TokenBucket) limiter to use, the one shared by
+                every client of this API key by default
+            - transport: (HTTPTransport) pooled HTTP transport, the shared
+                one by default
+            - updated_since: (str) only retrieve bills updated after this
+                ISO timestamp
         """
         self.state = state.replace(" ", "%20")
         self.keywords = keywords
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or _rate_limiter
+        self.transport = transport or http_transport.get_transport()
+        self.updated_since = updated_since
         self.loop_num = 0
+        self.first_page = None
         self.build_keyword_path()
 
     def build_keyword_path(self):
@@ -44,6 +165,48 @@ class OpenStatesAPI:
         """
         for keyword in self.keywords:
             self.query_path += "&q=" + keyword.replace(" ", "%20")
+        if self.updated_since:
+            self.query_path += "&updated_since=" + quote(self.updated_since)
+
+    def get_page_url(self, page):
+        """
+        Builds the URL for a single page of results.
+
+        Inputs:
+            - page: (int) page number
+
+        Returns: (str) the url
+        """
+        return self.base_path + self.state + self.query_path + self.page_path + str(page) + self.end_path
+
+    def fetch_page(self, page):
+        """
+        Retrieves a single page as JSON, backing off and retrying when the
+        API responds with 429. Raises an error on any other failure.
+
+        Inputs:
+            - page: (int) page number
+
+        Returns: (dict) the decoded JSON response
+        """
+        url = self.get_page_url(page)
+        for attempt in range(self.max_retries):
+            self.rate_limiter.acquire()
+            r = self.transport.get(url)
+            self.rate_limiter.update_from_headers(r.headers)
+            if r.status_code == 200:
+                return json.loads(r.text)
+            if r.status_code != 429:
+                break
+            retry_after = r.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                wait = float(retry_after)
+            else:
+                wait = 2 ** attempt + random.random()
+            self.rate_limiter.backoff(wait)
+
+        raise ValueError("API call failed on page " + str(page) +
+                         " with status " + str(r.status_code))
 
     def get_loop_num(self):
         """
@@ -54,13 +217,8 @@ class OpenStatesAPI:
 
         Returns: (int) number of loops
         """
-        url = self.base_path + self.state + self.query_path + self.page_path + '1' + self.end_path
-        r = requests.get(url)
-        if r.status_code != 200:
-            raise ValueError("API call failed")
-
-        result = r.text.encode()
-        json_data = json.loads(result.decode())
+        json_data = self.fetch_page(1)
+        self.first_page = json_data
         count = json_data['pagination']['total_items']
         loop_num = math.ceil(count / 20)
         self.loop_num = loop_num
@@ -69,46 +227,118 @@ class OpenStatesAPI:
 
     def get_data(self):
         """
-        Makes the API call and retrieves the data as JSON.
+        Makes the API calls and retrieves the data as JSON. Raises an error
+        if any page cannot be retrieved rather than returning a partial
+        result.
 
         Inputs: None
 
-        Returns: (list of dicts) list of bill information
+        Returns: (list of lists of dicts) bill information, one list per page
         """
-        bills_list = []
+        return list(self.iter_pages())
+
+    def iter_pages(self):
+        """
+        Lazily yields pages of bills in page order. Pages after the first
+        are fetched concurrently, but at most `2 * max_workers` are held in
+        memory ahead of the consumer.
+
+        Inputs: None
+
+        Returns: (generator of lists of dicts) bill information by page
+        """
+        if self.updated_since:
+            yield from self.iter_updated_pages()
+            return
+
         loop_num = self.get_loop_num()
+        if loop_num == 0:
+            return
+        print("1 of " + str(self.loop_num) + " calls complete.")
+        yield self.first_page['results']
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            next_page = 2
+            try:
+                while pending or next_page <= loop_num:
+                    while next_page <= loop_num and len(pending) < 2 * self.max_workers:
+                        pending.append((next_page, executor.submit(self.fetch_page, next_page)))
+                        next_page += 1
+                    page, future = pending.popleft()
+                    json_data = future.result()
+                    print(str(page) + " of " + str(self.loop_num) + " calls complete.")
+                    yield json_data['results']
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def iter_updated_pages(self):
+        """
+        Yields only the bills updated after `updated_since`. Results are
+        sorted newest first, so pages are fetched in order and paging stops
+        at the first bill that is already known.
 
-        for page in range(1, loop_num + 1):
-            url = self.base_path + self.state + self.query_path + self.page_path + str(page) + self.end_path
-            r = requests.get(url)
-            if r.status_code != 200:
-                return bills_list
+        Inputs: None
 
-            result = r.text.encode()
-            json_data = json.loads(result.decode())
-            bills_list.append(json_data['results'])
+        Returns: (generator of lists of dicts) bill information by page
+        """
+        page = 1
+        while True:
+            json_data = self.fetch_page(page)
+            if page == 1:
+                self.first_page = json_data
+                self.loop_num = math.ceil(json_data['pagination']['total_items'] / 20)
+            results = json_data['results']
+            new_bills = [bill for bill in results
+                         if bill['updated_at'] > self.updated_since]
+            print(str(page) + " of at most " + str(self.loop_num) + " calls complete.")
+            if new_bills:
+                yield new_bills
+            if len(new_bills) < len(results) or page >= self.loop_num:
+                return
+            page += 1
 
-            print(str(page) + " of " + str(self.loop_num) + " calls complete.")
-            # added in to try to get around API call limits
-            time.sleep(1)
+    def iter_bills(self):
+        """
+        Lazily yields individual bills across all pages.
 
-        return bills_list
+        Inputs: None
 
+        Returns: (generator of dicts) bill information
+        """
+        for page in self.iter_pages():
+            yield from page
 
-def get_data_for_state_and_topic(state, keywords):
+
+def get_latest_update(bills):
+    """
+    Finds the most recent `updated_at` timestamp in a set of bills.
+
+    Inputs:
+        - bills: (list of dicts) bill information
+
+    Returns: (str or None) the latest timestamp, None if there are no bills
+    """
+    timestamps = [bill['updated_at'] for bill in bills]
+    return max(timestamps) if timestamps else None
+
+
+def get_data_for_state_and_topic(state, keywords, max_workers=4,
+                                 updated_since=None):
     """
     Makes an API call to Open States based on the state and keywords given.
 
     Inputs:
         - state: (str) state
         - keywords: list of keywords
+        - max_workers: (int) number of pages to fetch at once
+        - updated_since: (str) only retrieve bills updated after this
+            ISO timestamp
     
-    Returns: (list of dicts) list of bill information
+    Returns: (list of lists of dicts) bill information, one list per page
     """
-    all_bills = []
-
-    api_call = OpenStatesAPI(state, keywords)
-    bills = api_call.get_data()
-    all_bills += bills
+    api_call = OpenStatesAPI(state, keywords, max_workers,
+                             updated_since=updated_since)
 
-    return all_bills
+    return api_call.get_data()
@@ -0,0 +1,315 @@
+'''
+Parallel ingest orchestrator for state and local legislation.
+
+Expands a matrix of states, Councilmatic locations and keyword sets into
+one job per (source, scope, keyword set), runs the jobs on a worker pool
+with a concurrency cap per API, records each job's status in a JSON file
+so an interrupted run can resume, and reports throughput per source.
+'''
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import http_transport
+import openstates_api
+import councilmatic_api
+
+DEFAULT_STATUS_PATH = 'ingest_status.json'
+DEFAULT_CONCURRENCY = {'openstates': 2, 'councilmatic': 2}
+SOURCE_HOSTS = {
+    'openstates': urlsplit(openstates_api.OpenStatesAPI.base_path).netloc,
+    'councilmatic': urlsplit(councilmatic_api.CouncilmaticAPI.base_url).netloc,
+}
+
+
+class Job:
+    '''
+    A single ingest of one source, scope and keyword set.
+    '''
+
+    def __init__(self, source, scope, keywords):
+        '''
+        Initializes an instance of the `Job` class.
+
+        Inputs:
+            - source (str): 'openstates' or 'councilmatic'
+            - scope (str): state or location
+            - keywords (list of str): keywords to search for
+        '''
+        self.source = source
+        self.scope = scope
+        self.keywords = keywords
+        self.job_id = '{}:{}:{}'.format(source, scope, ','.join(keywords))
+
+
+def build_jobs(states, locations, keyword_sets):
+    '''
+    Expands the ingest matrix into individual jobs.
+
+    Inputs:
+        - states (list of str): states to pull from Open States
+        - locations (list of str): locations to pull from Councilmatic
+        - keyword_sets (list of lists of str): keyword sets to search for
+
+    Returns: (list of Jobs) one job per source, scope and keyword set
+    '''
+    jobs = []
+    for keywords in keyword_sets:
+        for state in states:
+            jobs.append(Job('openstates', state, keywords))
+        for location in locations:
+            jobs.append(Job('councilmatic', location, keywords))
+    return jobs
+
+
+def get_default_runners(backend=None, search=None):
+    '''
+    Builds the functions that run a job for each source, pushing the
+    results to a storage backend.
+
+    Inputs:
+        - backend: storage backend to write to, BigQuery by default
+        - search (SearchIndex): full-text index to update, if any
+
+    Returns: (dict) source to a function of (scope, keywords) that returns
+        the number of records ingested
+    '''
+    import big_query_api
+
+    return {
+        'openstates': lambda scope, keywords: big_query_api.import_legislation(
+            scope, keywords, False, incremental=True, backend=backend, search=search),
+        'councilmatic': lambda scope, keywords: big_query_api.get_local_data(
+            scope, keywords, False, backend=backend, search=search),
+    }
+
+
+class Orchestrator:
+    '''
+    Runs ingest jobs in parallel with per-source concurrency caps and
+    resumable per-job status.
+    '''
+
+    def __init__(self, runners=None, concurrency=None,
+                 status_path=DEFAULT_STATUS_PATH, transport=None):
+        '''
+        Initializes an instance of the `Orchestrator` class.
+
+        Inputs:
+            - runners (dict): source to a function of (scope, keywords)
+                returning the number of records ingested; pushes to
+                BigQuery by default
+            - concurrency (dict): source to the most jobs run at once
+            - status_path (str): JSON file holding per-job status
+            - transport (HTTPTransport): transport whose call counts are
+                reported, the shared one by default
+        '''
+        self.runners = runners or get_default_runners()
+        self.concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        self.status_path = status_path
+        self.transport = transport or http_transport.get_transport()
+        self.lock = threading.Lock()
+        self.status = self.load_status()
+
+    def load_status(self):
+        '''
+        Reads the status of previous runs.
+
+        Inputs: None
+
+        Returns: (dict) job id to status dict
+        '''
+        if self.status_path and os.path.exists(self.status_path):
+            with open(self.status_path) as f:
+                return json.load(f)
+        return {}
+
+    def set_status(self, job, **fields):
+        '''
+        Updates a job's status and saves it.
+
+        Inputs:
+            - job (Job): the job
+            - fields: status fields to set
+
+        Returns: Nothing
+        '''
+        with self.lock:
+            entry = self.status.setdefault(job.job_id, {
+                'source': job.source, 'scope': job.scope,
+                'keywords': job.keywords})
+            entry.update(fields)
+            self.save_status()
+
+    def save_status(self):
+        '''
+        Writes the status file. The file is replaced atomically so a crash
+        never leaves it half-written. Callers hold the lock.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        if self.status_path:
+            tmp_path = self.status_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.status, f, indent=2)
+            os.replace(tmp_path, self.status_path)
+
+    def reset_status(self, jobs):
+        '''
+        Forgets the status of jobs, so the next run starts them afresh.
+
+        Inputs:
+            - jobs (list of Jobs): the jobs to forget
+
+        Returns: Nothing
+        '''
+        with self.lock:
+            for job in jobs:
+                self.status.pop(job.job_id, None)
+            self.save_status()
+
+    def run_job(self, job):
+        '''
+        Runs a single job, recording its outcome.
+
+        Inputs:
+            - job (Job): the job to run
+
+        Returns: Nothing
+        '''
+        self.set_status(job, status='running', error=None)
+        start = time.perf_counter()
+        try:
+            records = self.runners[job.source](job.scope, job.keywords)
+        except Exception as e:
+            self.set_status(job, status='failed', error=repr(e), records=0,
+                            seconds=time.perf_counter() - start)
+            print("Job {} failed: {!r}".format(job.job_id, e))
+            return
+        self.set_status(job, status='done', records=records or 0,
+                        seconds=time.perf_counter() - start)
+        print("Job {} done: {} records.".format(job.job_id, records))
+
+    def get_call_counts(self):
+        '''
+        Reads the number of requests made to each source's host so far.
+
+        Inputs: None
+
+        Returns: (dict) source to request count
+        '''
+        hosts = {}
+        for host, stats in self.transport.get_stats().items():
+            hosts[urlsplit(host).netloc] = stats['requests']
+        return {source: hosts.get(host, 0)
+                for source, host in SOURCE_HOSTS.items()}
+
+    def run(self, jobs, resume=True):
+        '''
+        Runs every job, skipping those already completed when resuming.
+        Each source gets its own worker pool sized to its concurrency cap,
+        so a backlog for one API never blocks jobs for another. Once every
+        job has succeeded the statuses are cleared, so only an interrupted
+        or partly failed run is resumed.
+
+        Inputs:
+            - jobs (list of Jobs): the jobs to run
+            - resume (bool): true to skip jobs marked done by a previous run
+
+        Returns: (dict) the throughput summary from `get_summary`
+        '''
+        if resume:
+            todo = [job for job in jobs
+                    if self.status.get(job.job_id, {}).get('status') != 'done']
+            print("Skipping {} completed jobs.".format(len(jobs) - len(todo)))
+        else:
+            todo = jobs
+
+        calls_before = self.get_call_counts()
+        start = time.perf_counter()
+        executors = {source: ThreadPoolExecutor(max_workers=limit)
+                     for source, limit in self.concurrency.items()}
+        try:
+            futures = [executors[job.source].submit(self.run_job, job)
+                       for job in todo]
+            for future in futures:
+                future.result()
+        finally:
+            for executor in executors.values():
+                executor.shutdown()
+        elapsed = time.perf_counter() - start
+        calls_after = self.get_call_counts()
+
+        calls = {source: calls_after[source] - calls_before[source]
+                 for source in calls_after}
+        summary = self.get_summary(todo, calls, elapsed)
+        if all(self.status.get(job.job_id, {}).get('status') == 'done' for job in jobs):
+            self.reset_status(jobs)
+        return summary
+
+    def get_summary(self, jobs, calls, elapsed):
+        '''
+        Summarizes throughput per source for a run.
+
+        Inputs:
+            - jobs (list of Jobs): the jobs that ran
+            - calls (dict): source to number of API calls made
+            - elapsed (float): wall-clock seconds for the run
+
+        Returns: (dict) source to a dict of job counts, records, calls,
+            records/sec and calls/sec
+        '''
+        summary = {}
+        for job in jobs:
+            entry = self.status.get(job.job_id, {})
+            source = summary.setdefault(job.source, {
+                'jobs': 0, 'failed': 0, 'records': 0, 'calls': 0})
+            source['jobs'] += 1
+            if entry.get('status') == 'failed':
+                source['failed'] += 1
+            source['records'] += entry.get('records', 0)
+        for name, source in summary.items():
+            source['calls'] = calls.get(name, 0)
+            source['records_per_sec'] = source['records'] / elapsed if elapsed else 0.0
+            source['calls_per_sec'] = source['calls'] / elapsed if elapsed else 0.0
+        return summary
+
+
+def print_summary(summary):
+    '''
+    Prints a throughput report.
+
+    Inputs:
+        - summary (dict): output of `Orchestrator.run`
+
+    Returns: Nothing, but prints one line per source
+    '''
+    for source, stats in summary.items():
+        print("{}: {} jobs ({} failed), {} records, {} calls, "
+              "{:.1f} records/sec, {:.2f} calls/sec".format(
+                  source, stats['jobs'], stats['failed'], stats['records'],
+                  stats['calls'], stats['records_per_sec'], stats['calls_per_sec']))
+
+
+def run(states, locations, keyword_sets, resume=False, backend=None, search=None):
+    '''
+    Runs a full ingest of the given matrix and prints the report.
+
+    Inputs:
+        - states (list of str): states to pull from Open States
+        - locations (list of str): locations to pull from Councilmatic
+        - keyword_sets (list of lists of str): keyword sets to search for
+        - resume (bool): true to skip jobs completed by an interrupted run
+        - backend: storage backend to write to, BigQuery by default
+        - search (SearchIndex): full-text index to update, if any
+
+    Returns: (dict) the throughput summary
+    '''
+    orchestrator = Orchestrator(get_default_runners(backend, search))
+    summary = orchestrator.run(build_jobs(states, locations, keyword_sets), resume)
+    print_summary(summary)
+    return summary
@@ -0,0 +1,238 @@
+'''
+Lazy ingest pipeline from API pages to sinks.
+
+Each ingest is a chain of generators: a source that yields records as
+pages arrive, a transformer that reformats one record at a time, and a
+sink that writes in bounded batches. The source runs in its own thread
+behind a bounded queue, so fetching overlaps with writing, a slow sink
+holds back the fetcher instead of letting records pile up, and a failure
+or cancellation in any stage stops the others.
+'''
+import queue
+import threading
+
+_DONE = object()
+
+
+class Cancelled(Exception):
+    '''
+    Raised in a pipeline stage when the pipeline has been cancelled.
+    '''
+
+
+def prefetch(iterable, queue_size=8, cancel=None):
+    '''
+    Runs an iterable in a background thread and yields its items through
+    a bounded queue. The producer blocks while the queue is full and stops
+    as soon as `cancel` is set or the consumer closes the generator.
+    Errors raised by the producer are re-raised in the consumer.
+
+    Inputs:
+        - iterable (iterable): source of items
+        - queue_size (int): most items buffered between the stages
+        - cancel (threading.Event): set to stop both stages
+
+    Returns: (generator) the items of `iterable`, in order
+    '''
+    cancel = cancel or threading.Event()
+    stopped = threading.Event()
+    buffer = queue.Queue(maxsize=queue_size)
+
+    def put(item):
+        while not (cancel.is_set() or stopped.is_set()):
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    break
+        except BaseException as e:
+            put((_DONE, e))
+            return
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        put((_DONE, None))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item, error = buffer.get(timeout=0.1)
+            except queue.Empty:
+                if cancel.is_set():
+                    raise Cancelled()
+                continue
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            if cancel.is_set():
+                raise Cancelled()
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def merge(iterables, max_workers=4, queue_size=8, cancel=None):
+    '''
+    Runs several iterables concurrently and yields their items as they
+    arrive, with the same backpressure and cancellation as `prefetch`.
+    Items from one iterable keep their relative order.
+
+    Inputs:
+        - iterables (list of iterables): sources of items
+        - max_workers (int): most iterables consumed at once
+        - queue_size (int): most items buffered between the stages
+        - cancel (threading.Event): set to stop every stage
+
+    Returns: (generator) the items of all iterables
+    '''
+    cancel = cancel or threading.Event()
+    stopped = threading.Event()
+    buffer = queue.Queue(maxsize=queue_size)
+    sources = queue.Queue()
+    for iterable in iterables:
+        sources.put(iterable)
+
+    def put(item):
+        while not (cancel.is_set() or stopped.is_set()):
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        while not (cancel.is_set() or stopped.is_set()):
+            try:
+                iterator = iter(sources.get_nowait())
+            except queue.Empty:
+                break
+            try:
+                for item in iterator:
+                    if not put((item, None)):
+                        break
+            except BaseException as e:
+                put((_DONE, e))
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()
+        put((_DONE, None))
+
+    workers = max(1, min(max_workers, sources.qsize()))
+    threads = [threading.Thread(target=produce, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        finished = 0
+        while finished < workers:
+            try:
+                item, error = buffer.get(timeout=0.1)
+            except queue.Empty:
+                if cancel.is_set():
+                    raise Cancelled()
+                continue
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                finished += 1
+                continue
+            if cancel.is_set():
+                raise Cancelled()
+            yield item
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+
+
+def batched(iterable, size):
+    '''
+    Groups items into lists of at most `size` items.
+
+    Inputs:
+        - iterable (iterable): items to group
+        - size (int): largest batch
+
+    Returns: (generator of lists) the batches
+    '''
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class HighWaterMark:
+    '''
+    Tracks the largest value of a field in records streaming past, so a
+    checkpoint can be recorded once the stream has been fully written.
+    '''
+
+    def __init__(self, field):
+        '''
+        Initializes an instance of the `HighWaterMark` class.
+
+        Inputs:
+            - field (str): the record field to track
+        '''
+        self.field = field
+        self.value = None
+        self.count = 0
+
+    def track(self, records):
+        '''
+        Passes records through unchanged while tracking the field.
+
+        Inputs:
+            - records (iterable of dicts): records to pass through
+
+        Returns: (generator of dicts) the same records
+        '''
+        for record in records:
+            value = record.get(self.field)
+            if value is not None and (self.value is None or value > self.value):
+                self.value = value
+            self.count += 1
+            yield record
+
+
+def run_pipeline(source, transform, sink, queue_size=8, cancel=None):
+    '''
+    Streams records from a source through a transformer into a sink.
+
+    Inputs:
+        - source (iterable): raw records, usually an API generator
+        - transform (function): maps an iterable of raw records to an
+            iterable of output rows
+        - sink (function): consumes an iterable of output rows
+        - queue_size (int): most raw records buffered ahead of the sink
+        - cancel (threading.Event): set from any thread to stop the run
+
+    Returns: whatever the sink returns
+    '''
+    cancel = cancel or threading.Event()
+    records = prefetch(source, queue_size, cancel)
+    try:
+        return sink(transform(records))
+    except BaseException:
+        cancel.set()
+        raise
+    finally:
+        records.close()
@@ -0,0 +1,12 @@
+'''
+Content-based recommendations of civic engagement opportunities.
+
+Opportunities are vectorized once with TF-IDF into a sparse matrix that is
+saved to disk with its vocabulary, and users are scored against it one
+sparse product at a time, so no opportunity-by-opportunity similarity
+matrix is ever built.
+'''
+from recommender.data import load_opportunities, load_preferences
+from recommender.model import IdfRefresher, RecommenderModel, fit_model, load_model, top_k
+from recommender.text import TextCleaner, clean_text, clean_series, clean_strings
+from recommender.scoring import iter_top_k, score_users
@@ -0,0 +1,37 @@
+'''
+Loads the opportunity and user preference spreadsheets.
+'''
+import pandas as pd
+
+OPPORTUNITIES_PATH = 'Civic Engagement Opportunities - Pandas DF.csv'
+PREFERENCES_PATH = 'Civic Engagement Opportunities - user_pref df.csv'
+
+
+def load_opportunities(path=OPPORTUNITIES_PATH):
+    '''
+    Loads civic engagement opportunities, adding the text used to match
+    them to users.
+
+    Inputs:
+        - path (str): CSV export of the opportunities sheet
+
+    Returns: (DataFrame) opportunities with 'Dislike' and 'combined_text'
+    '''
+    opps = pd.read_csv(path)
+    opps = opps.rename(columns={"Don't Like": "Dislike"})
+    opps['combined_text'] = opps['Details'].fillna('') + opps['Like'].fillna('')
+    return opps
+
+
+def load_preferences(path=PREFERENCES_PATH):
+    '''
+    Loads user preferences.
+
+    Inputs:
+        - path (str): CSV export of the user preferences sheet
+
+    Returns: (DataFrame) one row per user with 'username', 'Like' and
+        'Dislike'
+    '''
+    prefs = pd.read_csv(path)
+    return prefs.rename(columns={"Don't Like": "Dislike", "Unnamed: 0": "username"})
@@ -0,0 +1,418 @@
+'''
+TF-IDF recommendation model over civic engagement opportunities.
+
+The fitted model is the vocabulary, the raw term counts of the
+opportunities (from which document frequencies follow), the IDF weights in
+use, and the L2-normalized sparse TF-IDF matrix built from them. Cosine
+similarity to a user is then one sparse matrix-vector product, and the
+best k opportunities are picked with `argpartition` instead of a full sort.
+
+The model is updated in place. Users are projected onto the vocabulary in
+time proportional to their own text. New opportunities extend the
+vocabulary and document frequencies and are weighted with the current
+IDF. `rebuild` reweights every row with fresh IDF, either on demand or
+periodically from an `IdfRefresher` thread.
+'''
+import json
+import os
+import threading
+from collections import Counter
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+from recommender import text
+
+DEFAULT_MODEL_DIR = 'recommender_model'
+ITEM_COLUMNS = ['Event Name', 'Details', 'Like']
+DISLIKE_WEIGHT = 0.5
+
+
+def get_idf(document_frequencies, n_documents):
+    '''
+    Computes smoothed inverse document frequencies, as scikit-learn's
+    `TfidfVectorizer` does by default.
+
+    Inputs:
+        - document_frequencies (array): documents containing each term
+        - n_documents (int): documents in the corpus
+
+    Returns: (array) the IDF weight of each term
+    '''
+    return np.log((1 + n_documents) / (1 + document_frequencies)) + 1
+
+
+def top_k(scores, k, exclude=None):
+    '''
+    Finds the indices of the k highest scores, best first, without sorting
+    every score.
+
+    Inputs:
+        - scores (array): one score per item
+        - k (int): number of items to return
+        - exclude (int or list of ints): indices never returned
+
+    Returns: (array of ints) the indices
+    '''
+    scores = np.asarray(scores, dtype=float)
+    if exclude is not None:
+        scores = scores.copy()
+        scores[exclude] = -np.inf
+        k = min(k, len(scores) - np.size(exclude))
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=int)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class RecommenderModel:
+    '''
+    Fitted TF-IDF model of the opportunities.
+    '''
+
+    def __init__(self, vocabulary, counts, items, idf=None):
+        '''
+        Initializes an instance of the `RecommenderModel` class.
+
+        Inputs:
+            - vocabulary (dict): term to column index
+            - counts (csr_matrix): raw term counts, one row per opportunity
+            - items (DataFrame): opportunity details, in row order
+            - idf (array): IDF weights in use, computed from the counts if
+                not given
+        '''
+        self.vocabulary = dict(vocabulary)
+        self.counts = sparse.csr_matrix(counts, dtype=np.int64)
+        self.document_frequencies = np.bincount(self.counts.indices,
+                                                minlength=len(self.vocabulary))
+        self.idf = np.asarray(idf if idf is not None else get_idf(
+            self.document_frequencies, self.counts.shape[0]), dtype=float)
+        self.items = items.reset_index(drop=True)
+        self.matrix = self.weigh(self.counts)
+        self.analyze = CountVectorizer().build_analyzer()
+        self.lock = threading.Lock()
+        self.added_since_rebuild = 0
+
+    @property
+    def n_documents(self):
+        '''
+        Number of opportunities in the model.
+        '''
+        return self.counts.shape[0]
+
+    def count_terms(self, documents, grow=False):
+        '''
+        Counts the vocabulary terms in cleaned documents.
+
+        Inputs:
+            - documents (iterable of str): cleaned documents
+            - grow (bool): true to add unseen terms to the vocabulary,
+                false to drop them
+
+        Returns: (csr_matrix) one row of counts per document
+        '''
+        indptr = [0]
+        indices = []
+        values = []
+        for document in documents:
+            counts = Counter()
+            for term in self.analyze(document):
+                column = self.vocabulary.get(term)
+                if column is None:
+                    if not grow:
+                        continue
+                    column = self.vocabulary[term] = len(self.vocabulary)
+                counts[column] += 1
+            indices.extend(counts.keys())
+            values.extend(counts.values())
+            indptr.append(len(indices))
+        counts = sparse.csr_matrix((values, indices, indptr), dtype=np.int64,
+                                   shape=(len(indptr) - 1, len(self.vocabulary)))
+        counts.sort_indices()
+        return counts
+
+    def weigh(self, counts):
+        '''
+        Turns term counts into L2-normalized TF-IDF rows.
+
+        Inputs:
+            - counts (csr_matrix): term counts
+
+        Returns: (csr_matrix) the weighted rows
+        '''
+        return normalize(sparse.csr_matrix(counts.multiply(self.idf), dtype=float))
+
+    def transform(self, documents):
+        '''
+        Projects cleaned documents onto the vocabulary, weighted with the
+        current IDF. Terms outside the vocabulary are ignored.
+
+        Inputs:
+            - documents (iterable of str): cleaned documents
+
+        Returns: (csr_matrix) one L2-normalized row per document
+        '''
+        documents = list(documents)
+        with self.lock:
+            return self.weigh(self.count_terms(documents))
+
+    def add_items(self, opportunities):
+        '''
+        Adds opportunities without refitting. Their new terms extend the
+        vocabulary, and their rows are weighted with the current IDF;
+        existing rows keep their weights until `rebuild`.
+
+        Inputs:
+            - opportunities (DataFrame): opportunities with
+                'combined_text', as returned by `load_opportunities`
+
+        Returns: Nothing
+        '''
+        documents = text.clean_strings(opportunities['combined_text']).tolist()
+        with self.lock:
+            n_terms = len(self.vocabulary)
+            counts = self.count_terms(documents, grow=True)
+            n_new_terms = len(self.vocabulary) - n_terms
+            n_documents = self.n_documents + counts.shape[0]
+
+            self.document_frequencies = np.concatenate([
+                self.document_frequencies, np.zeros(n_new_terms, dtype=np.int64)])
+            self.document_frequencies += np.bincount(counts.indices,
+                                                     minlength=len(self.vocabulary))
+            # Only terms nobody has weighted yet get an IDF now.
+            self.idf = np.concatenate([self.idf, get_idf(
+                self.document_frequencies[n_terms:], n_documents)])
+
+            old_counts = self.counts.copy()
+            old_counts.resize((old_counts.shape[0], len(self.vocabulary)))
+            old_matrix = self.matrix.copy()
+            old_matrix.resize((old_matrix.shape[0], len(self.vocabulary)))
+            self.counts = sparse.vstack([old_counts, counts], format='csr')
+            self.matrix = sparse.vstack([old_matrix, self.weigh(counts)], format='csr')
+            self.items = pd.concat([self.items, opportunities.reindex(columns=ITEM_COLUMNS)],
+                                   ignore_index=True)
+            self.added_since_rebuild += counts.shape[0]
+
+    def rebuild(self):
+        '''
+        Recomputes IDF from the current document frequencies and reweights
+        every opportunity.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        with self.lock:
+            counts = self.counts
+            idf = get_idf(self.document_frequencies, counts.shape[0])
+            matrix = normalize(sparse.csr_matrix(counts.multiply(idf), dtype=float))
+            self.idf = idf
+            self.matrix = matrix
+            self.added_since_rebuild = 0
+
+    def get_user_text(self, user_prefs, field='Like'):
+        '''
+        Gets one field of a user's preferences, cleaned.
+
+        Inputs:
+            - user_prefs (str or dict-like): liked text, or a preferences
+                row with 'Like' and optionally 'Dislike' fields
+            - field (str): 'Like' or 'Dislike'
+
+        Returns: (str) the cleaned text, '' if missing
+        '''
+        if isinstance(user_prefs, str):
+            user_prefs = {'Like': user_prefs}
+        value = user_prefs.get(field)
+        return text.clean_text(value if isinstance(value, str) else '')
+
+    def get_query_matrix(self, likes, dislikes=None, dislike_weight=DISLIKE_WEIGHT):
+        '''
+        Vectorizes users so that one product with the opportunity matrix
+        gives like-similarity minus weighted dislike-similarity.
+
+        Inputs:
+            - likes (list of str): cleaned liked text per user
+            - dislikes (list of str): cleaned disliked text per user
+            - dislike_weight (float): weight of the dislike similarity
+
+        Returns: (csr_matrix) one row per user
+        '''
+        query = self.transform(likes)
+        if dislikes is not None and dislike_weight:
+            query = query - dislike_weight * self.transform(dislikes)
+        return sparse.csr_matrix(query)
+
+    def to_frame(self, indices, scores):
+        '''
+        Builds the recommendation table for the chosen opportunities.
+
+        Inputs:
+            - indices (array of ints): opportunity rows, best first
+            - scores (array): score of every opportunity
+
+        Returns: (DataFrame) the recommendations
+        '''
+        chosen = self.items.iloc[indices]
+        return pd.DataFrame({
+            'index': indices,
+            'recommendation': chosen['Event Name'].to_numpy(),
+            'details': chosen['Details'].to_numpy(),
+            'reviews': chosen['Like'].to_numpy(),
+            'score': scores[indices],
+        })
+
+    def recommend(self, user_prefs, k=10, dislike_weight=DISLIKE_WEIGHT):
+        '''
+        Recommends the opportunities closest to a user's preferences.
+
+        Inputs:
+            - user_prefs (str or dict-like): liked text, or a preferences
+                row with 'Like' and optionally 'Dislike' fields
+            - k (int): number of recommendations
+            - dislike_weight (float): weight of the similarity to the
+                user's dislikes, subtracted from the score
+
+        Returns: (DataFrame) the recommendations, best first
+        '''
+        query = self.get_query_matrix([self.get_user_text(user_prefs, 'Like')],
+                                      [self.get_user_text(user_prefs, 'Dislike')],
+                                      dislike_weight)
+        matrix = self.matrix
+        query.resize((1, matrix.shape[1]))
+        scores = (matrix @ query.T).toarray().ravel()
+        return self.to_frame(top_k(scores, k), scores)
+
+    def similar_items(self, event_name, k=10):
+        '''
+        Finds the opportunities most similar to a given one.
+
+        Inputs:
+            - event_name (str): the opportunity's 'Event Name'
+            - k (int): number of recommendations
+
+        Returns: (DataFrame) the recommendations, best first
+        '''
+        matches = np.flatnonzero(self.items['Event Name'].to_numpy() == event_name)
+        if len(matches) == 0:
+            raise KeyError(event_name)
+        target = matches[0]
+        scores = (self.matrix @ self.matrix[target].T).toarray().ravel()
+        return self.to_frame(top_k(scores, k, exclude=target), scores)
+
+    def save(self, path=DEFAULT_MODEL_DIR):
+        '''
+        Saves the model to a directory.
+
+        Inputs:
+            - path (str): the directory, created if needed
+
+        Returns: Nothing
+        '''
+        os.makedirs(path, exist_ok=True)
+        with self.lock:
+            with open(os.path.join(path, 'model.json'), 'w') as f:
+                json.dump({'vocabulary': self.vocabulary}, f)
+            np.save(os.path.join(path, 'idf.npy'), self.idf)
+            sparse.save_npz(os.path.join(path, 'counts.npz'), self.counts)
+            self.items.to_json(os.path.join(path, 'items.json'), orient='records')
+
+
+class IdfRefresher:
+    '''
+    Rebuilds a model's IDF weights in a background thread, periodically
+    and only once enough opportunities have been added.
+    '''
+
+    def __init__(self, model, interval=3600, min_added=1):
+        '''
+        Initializes an instance of the `IdfRefresher` class.
+
+        Inputs:
+            - model (RecommenderModel): the model to refresh
+            - interval (float): seconds between checks
+            - min_added (int): opportunities added since the last rebuild
+                that trigger a new one
+        '''
+        self.model = model
+        self.interval = interval
+        self.min_added = min_added
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.rebuilds = 0
+
+    def run(self):
+        '''
+        Checks the model every interval until stopped, rebuilding it when
+        enough opportunities have been added. Runs in the background thread.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        while not self.stopped.wait(self.interval):
+            if self.model.added_since_rebuild >= self.min_added:
+                self.model.rebuild()
+                self.rebuilds += 1
+
+    def start(self):
+        '''
+        Starts refreshing.
+
+        Inputs: None
+
+        Returns: (IdfRefresher) itself
+        '''
+        self.thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stops refreshing and waits for the thread to finish.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        self.stopped.set()
+        self.thread.join()
+
+
+def fit_model(opportunities):
+    '''
+    Fits the model on the opportunities.
+
+    Inputs:
+        - opportunities (DataFrame): opportunities with 'combined_text', as
+            returned by `load_opportunities`
+
+    Returns: (RecommenderModel) the fitted model
+    '''
+    documents = text.clean_strings(opportunities['combined_text'])
+    counter = CountVectorizer()
+    counts = counter.fit_transform(documents)
+    vocabulary = {term: int(i) for term, i in counter.vocabulary_.items()}
+    return RecommenderModel(vocabulary, counts, opportunities.reindex(columns=ITEM_COLUMNS))
+
+
+def load_model(path=DEFAULT_MODEL_DIR):
+    '''
+    Loads a model saved with `RecommenderModel.save`.
+
+    Inputs:
+        - path (str): the model directory
+
+    Returns: (RecommenderModel) the model
+    '''
+    with open(os.path.join(path, 'model.json')) as f:
+        meta = json.load(f)
+    counts = sparse.load_npz(os.path.join(path, 'counts.npz'))
+    idf = np.load(os.path.join(path, 'idf.npy'))
+    items = pd.read_json(os.path.join(path, 'items.json'), orient='records', dtype=False)
+    items = items.reindex(columns=ITEM_COLUMNS)
+    return RecommenderModel(meta['vocabulary'], counts, items, idf)
@@ -0,0 +1,95 @@
+'''
+Batch scoring of every user against every opportunity.
+
+Users are vectorized once, with their dislikes folded into the same row
+(like vector minus weighted dislike vector), and scored a block of users
+at a time with one sparse product against the opportunity matrix. Only the
+top k of each user's block of scores is kept, so memory is bounded by
+the block size times the number of opportunities.
+'''
+import numpy as np
+import pandas as pd
+from recommender import text
+from recommender.model import DISLIKE_WEIGHT
+
+
+def top_k_rows(scores, k):
+    '''
+    Finds the k highest scores in each row, best first.
+
+    Inputs:
+        - scores (2D array): one row of scores per user
+        - k (int): number of items per row
+
+    Returns: (tuple of 2D arrays) the item indices and their scores
+    '''
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return (np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_scores, order, axis=1))
+
+
+def iter_top_k(model, likes, dislikes=None, k=10, dislike_weight=DISLIKE_WEIGHT,
+               block_size=1024):
+    '''
+    Lazily scores users in blocks, keeping each user's top k.
+
+    Inputs:
+        - model (RecommenderModel): the fitted model
+        - likes (Series): liked text per user
+        - dislikes (Series): disliked text per user, if any
+        - k (int): recommendations per user
+        - dislike_weight (float): weight of the similarity to dislikes
+        - block_size (int): users scored per product
+
+    Returns: (generator of tuples) position of the block's first user,
+        and the block's item indices and scores from `top_k_rows`
+    '''
+    likes = text.clean_strings(likes).tolist()
+    dislikes = text.clean_strings(dislikes).tolist() if dislikes is not None else None
+    query = model.get_query_matrix(likes, dislikes, dislike_weight)
+    items = model.matrix.T.tocsc()
+    for start in range(0, query.shape[0], block_size):
+        scores = (query[start:start + block_size] @ items).toarray()
+        indices, top_scores = top_k_rows(scores, k)
+        yield start, indices, top_scores
+
+
+def score_users(model, preferences, k=10, dislike_weight=DISLIKE_WEIGHT,
+                block_size=1024):
+    '''
+    Recommends opportunities to every user.
+
+    Inputs:
+        - model (RecommenderModel): the fitted model
+        - preferences (DataFrame): one row per user with 'username', 'Like'
+            and optionally 'Dislike', as returned by `load_preferences`
+        - k (int): recommendations per user
+        - dislike_weight (float): weight of the similarity to dislikes
+        - block_size (int): users scored per product
+
+    Returns: (DataFrame) one row per recommendation with 'username',
+        'rank', 'index', 'recommendation' and 'score'
+    '''
+    dislikes = preferences['Dislike'] if 'Dislike' in preferences else None
+    names = model.items['Event Name'].to_numpy()
+    usernames = preferences['username'].to_numpy()
+    frames = []
+    for start, indices, scores in iter_top_k(model, preferences['Like'], dislikes, k,
+                                             dislike_weight, block_size):
+        rows, width = indices.shape
+        frames.append(pd.DataFrame({
+            'username': np.repeat(usernames[start:start + rows], width),
+            'rank': np.tile(np.arange(1, width + 1), rows),
+            'index': indices.ravel(),
+            'recommendation': names[indices.ravel()],
+            'score': scores.ravel(),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['username', 'rank', 'index', 'recommendation', 'score'])
+    return pd.concat(frames, ignore_index=True)
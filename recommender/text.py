@@ -0,0 +1,192 @@
+'''
+Text normalization for opportunity descriptions and user preferences.
+
+Documents are cleaned in one pass: HTML tags are stripped first, before
+punctuation handling can break them apart, then non-ASCII characters are
+dropped, the text is lowercased and split into words, and NLTK's English
+stopwords, the list the notebook used, are removed. Whole Series are
+cleaned with vectorized `str` operations, and cleaned text is cached by a
+hash of its content, so refitting on a mostly unchanged sheet only cleans
+the new or edited rows.
+'''
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+HTML_TAG = re.compile(r'(?s)<.*?>')
+NON_ASCII = re.compile(r'[^\x00-\x7f]+')
+WORD = re.compile(r'\w+')
+
+_stopwords = None
+_stopword_pattern = None
+
+
+def get_stopwords():
+    '''
+    Loads NLTK's English stopword list once. There is no fallback list, so
+    the cleaned text, and so the fitted vocabulary, never depends on what
+    happens to be installed; raises an error if NLTK or its stopwords
+    corpus is missing.
+
+    Inputs: None
+
+    Returns: (frozenset of str) the stopwords
+    '''
+    global _stopwords
+    if _stopwords is None:
+        try:
+            from nltk.corpus import stopwords
+            _stopwords = frozenset(stopwords.words('english'))
+        except ImportError:
+            raise ImportError("The recommender needs NLTK's stopwords: "
+                              "pip install nltk && python -m nltk.downloader stopwords")
+        except LookupError:
+            raise LookupError("NLTK's stopwords corpus is missing: "
+                              "python -m nltk.downloader stopwords")
+    return _stopwords
+
+
+def clean_text(text):
+    '''
+    Normalizes one document: strips HTML tags, drops non-ASCII
+    characters, lowercases, and keeps the words that are not stopwords.
+
+    Inputs:
+        - text (str): the document
+
+    Returns: (str) the cleaned document
+    '''
+    stops = get_stopwords()
+    text = NON_ASCII.sub('', HTML_TAG.sub(' ', text)).lower()
+    return ' '.join(w for w in WORD.findall(text) if w not in stops)
+
+
+def get_stopword_pattern():
+    '''
+    Builds one regex matching any stopword as a whole word.
+
+    Inputs: None
+
+    Returns: (str) the pattern
+    '''
+    global _stopword_pattern
+    if _stopword_pattern is None:
+        words = sorted(get_stopwords(), key=len, reverse=True)
+        _stopword_pattern = r'\b(?:' + '|'.join(re.escape(w) for w in words) + r')\b'
+    return _stopword_pattern
+
+
+def clean_series(series):
+    '''
+    Normalizes every document in a Series with vectorized string
+    operations, giving the same result as `clean_text`.
+
+    Inputs:
+        - series (Series of str): documents
+
+    Returns: (Series) the cleaned documents
+    '''
+    cleaned = (series.astype('string')
+                     .str.replace(HTML_TAG.pattern, ' ', regex=True)
+                     .str.replace(NON_ASCII.pattern, '', regex=True)
+                     .str.lower()
+                     .str.replace(r'\W+', ' ', regex=True)
+                     .str.replace(get_stopword_pattern(), ' ', regex=True)
+                     .str.replace(r'\s+', ' ', regex=True)
+                     .str.strip())
+    return cleaned.astype(object)
+
+
+class TextCleaner:
+    '''
+    Cleans documents with a bounded LRU cache keyed on a hash of each
+    document's content.
+    '''
+
+    def __init__(self, max_entries=100000):
+        '''
+        Initializes an instance of the `TextCleaner` class.
+
+        Inputs:
+            - max_entries (int): most distinct documents kept in the cache
+        '''
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, text):
+        '''
+        Hashes a document for the cache.
+
+        Inputs:
+            - text (str): the document
+
+        Returns: (bytes) the key
+        '''
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def clean(self, text):
+        '''
+        Cleans one document.
+
+        Inputs:
+            - text (str): the document
+
+        Returns: (str) the cleaned document
+        '''
+        return self.clean_many([text])[0]
+
+    def clean_many(self, texts):
+        '''
+        Cleans documents, cleaning each distinct uncached document once.
+
+        Inputs:
+            - texts (list of str): the documents
+
+        Returns: (list of str) the cleaned documents
+        '''
+        keys = [self.get_key(t) for t in texts]
+        cleaned = {}
+        missing = {}
+        with self.lock:
+            for key, text in zip(keys, texts):
+                if key in cleaned or key in missing:
+                    continue
+                value = self.cache.get(key)
+                if value is None:
+                    missing[key] = text
+                else:
+                    self.cache.move_to_end(key)
+                    cleaned[key] = value
+            self.hits += len(cleaned)
+            self.misses += len(missing)
+
+        if missing:
+            values = clean_series(pd.Series(list(missing.values()), dtype=object))
+            with self.lock:
+                for key, value in zip(missing, values):
+                    cleaned[key] = value
+                    self.cache[key] = value
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
+        return [cleaned[key] for key in keys]
+
+
+_cleaner = TextCleaner()
+
+
+def clean_strings(input_series):
+    '''
+    Normalizes every document in a Series with the shared, cached cleaner.
+
+    Inputs:
+        - input_series (Series): documents; missing values become ''
+
+    Returns: (Series) the cleaned documents
+    '''
+    texts = input_series.fillna('').astype(str).tolist()
+    return pd.Series(_cleaner.clean_many(texts), index=input_series.index, dtype=object)
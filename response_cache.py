@@ -0,0 +1,315 @@
+'''
+On-disk HTTP response cache for the shared transport.
+
+Response bodies are stored once per SHA-256 of their content, and an
+SQLite index maps each URL to its body, headers and validators. Entries
+are fresh for a per-host TTL, then revalidated with a conditional GET
+(ETag / Last-Modified). The cache is kept under a size limit by evicting
+the least recently used entries. In offline mode every request is served
+from the cache, so a recorded cache directory doubles as a test fixture.
+'''
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_TTL = 60 * 60
+DEFAULT_HOST_TTLS = {
+    'v3.openstates.org': 60 * 60,
+    'ocd.datamade.us': 60 * 60,
+    'scorecard.lcv.org': 24 * 60 * 60,
+    'www.senate.gov': 24 * 60 * 60,
+    'www.house.gov': 24 * 60 * 60,
+}
+# Stored bodies are already decoded, so these no longer describe them.
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding',
+                   'connection'}
+# Rate limit headers describe the request that was made, not the resource,
+# so replaying them from the cache would throttle or release live limiters.
+RATE_LIMIT_HEADERS = ('x-ratelimit-', 'retry-after')
+
+
+def is_rate_limit_header(key):
+    '''
+    Checks whether a header reports the API's rate limit.
+
+    Inputs:
+        - key (str): header name
+
+    Returns: (bool) true for rate limit headers
+    '''
+    return key.lower().startswith(RATE_LIMIT_HEADERS)
+
+
+class CacheMiss(Exception):
+    '''
+    Raised in offline mode when a URL has not been recorded.
+    '''
+
+
+class ResponseCache:
+    '''
+    Content-addressed, size-bounded cache of HTTP responses.
+    '''
+
+    def __init__(self, cache_dir='.http_cache', host_ttls=None,
+                 default_ttl=DEFAULT_TTL, max_bytes=500_000_000, offline=False):
+        '''
+        Initializes an instance of the `ResponseCache` class.
+
+        Inputs:
+            - cache_dir (str): directory holding the index and bodies
+            - host_ttls (dict): host to seconds an entry stays fresh
+            - default_ttl (int): seconds for hosts not in `host_ttls`
+            - max_bytes (int): total body size kept before evicting
+            - offline (bool): true to never touch the network
+        '''
+        self.cache_dir = cache_dir
+        self.body_dir = os.path.join(cache_dir, 'bodies')
+        os.makedirs(self.body_dir, exist_ok=True)
+        self.host_ttls = dict(DEFAULT_HOST_TTLS, **(host_ttls or {}))
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'),
+                                    check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                host TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                          'ON responses (accessed_at)')
+        self.conn.commit()
+
+    @staticmethod
+    def get_url_key(url):
+        '''
+        Hashes a URL into its index key.
+
+        Inputs:
+            - url (str): the url
+
+        Returns: (str) hex digest
+        '''
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get_body_path(self, body_hash):
+        '''
+        Finds where a body is stored, fanned out over subdirectories.
+
+        Inputs:
+            - body_hash (str): SHA-256 of the body
+
+        Returns: (str) the file path
+        '''
+        return os.path.join(self.body_dir, body_hash[:2], body_hash)
+
+    def get_ttl(self, host):
+        '''
+        Looks up how long entries for a host stay fresh.
+
+        Inputs:
+            - host (str): host name
+
+        Returns: (int) seconds
+        '''
+        return self.host_ttls.get(host, self.default_ttl)
+
+    def lookup(self, url):
+        '''
+        Finds the cached entry for a URL.
+
+        Inputs:
+            - url (str): the url
+
+        Returns: (dict or None) the entry with keys 'response', 'fresh',
+            'etag' and 'last_modified', or None on a miss
+        '''
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT host, status, headers, body_hash, stored_at '
+                'FROM responses WHERE url_key = ?',
+                (self.get_url_key(url),)).fetchone()
+        if row is None:
+            return None
+        host, status, headers, body_hash, stored_at = row
+        try:
+            with open(self.get_body_path(body_hash), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            self.conn.execute('UPDATE responses SET accessed_at = ? WHERE url_key = ?',
+                              (time.time(), self.get_url_key(url)))
+            self.conn.commit()
+
+        # Entries stored before rate limit headers were dropped may hold them.
+        headers = CaseInsensitiveDict({key: value for key, value in json.loads(headers).items()
+                                       if not is_rate_limit_header(key)})
+        return {
+            'response': build_response(url, status, headers, body),
+            'fresh': time.time() - stored_at < self.get_ttl(host),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+        }
+
+    def store(self, url, host, response):
+        '''
+        Saves a successful response, then evicts old entries if the cache
+        has grown past its size limit.
+
+        Inputs:
+            - url (str): the requested url
+            - host (str): host name
+            - response (requests.Response): the response
+
+        Returns: Nothing
+        '''
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self.get_body_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.' + str(threading.get_ident())
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        headers = {key: value for key, value in response.headers.items()
+                   if key.lower() not in DROPPED_HEADERS and not is_rate_limit_header(key)}
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute('SELECT body_hash FROM responses WHERE url_key = ?',
+                                    (self.get_url_key(url),)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.get_url_key(url), url, host, response.status_code,
+                 json.dumps(headers), body_hash, len(body), now, now))
+            self.conn.commit()
+            if old and old[0] != body_hash:
+                self.remove_unreferenced_body(old[0])
+            self.evict()
+
+    def refresh(self, url):
+        '''
+        Marks an entry fresh again after the server answered 304.
+
+        Inputs:
+            - url (str): the url
+
+        Returns: Nothing
+        '''
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url_key = ?',
+                (now, now, self.get_url_key(url)))
+            self.conn.commit()
+
+    def remove_unreferenced_body(self, body_hash):
+        '''
+        Deletes a body file once no entry points to it. Callers must hold
+        the lock.
+
+        Inputs:
+            - body_hash (str): SHA-256 of the body
+
+        Returns: Nothing
+        '''
+        in_use = self.conn.execute('SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1',
+                                   (body_hash,)).fetchone()
+        if not in_use:
+            try:
+                os.remove(self.get_body_path(body_hash))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        '''
+        Removes least recently used entries until the distinct bodies fit
+        within `max_bytes`. Callers must hold the lock.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        total = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM '
+            '(SELECT MAX(size) AS size FROM responses GROUP BY body_hash)').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute(
+            'SELECT url_key, body_hash, size FROM responses ORDER BY accessed_at').fetchall()
+        for url_key, body_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute('DELETE FROM responses WHERE url_key = ?', (url_key,))
+            in_use = self.conn.execute('SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1',
+                                       (body_hash,)).fetchone()
+            if not in_use:
+                total -= size
+                try:
+                    os.remove(self.get_body_path(body_hash))
+                except FileNotFoundError:
+                    pass
+        self.conn.commit()
+
+    def get_size(self):
+        '''
+        Reports the number of entries and bytes stored.
+
+        Inputs: None
+
+        Returns: (tuple) entry count and total body bytes
+        '''
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            total = self.conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM '
+                '(SELECT MAX(size) AS size FROM responses GROUP BY body_hash)').fetchone()[0]
+        return entries, total
+
+    def close(self):
+        '''
+        Closes the index.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        with self.lock:
+            self.conn.close()
+
+
+def build_response(url, status, headers, body):
+    '''
+    Rebuilds a `requests.Response` from cached parts.
+
+    Inputs:
+        - url (str): the url
+        - status (int): HTTP status code
+        - headers (CaseInsensitiveDict): response headers
+        - body (bytes): decoded response body
+
+    Returns: (requests.Response) the response
+    '''
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.headers = headers
+    response._content = body
+    response.encoding = requests.utils.get_encoding_from_headers(headers)
+    return response
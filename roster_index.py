@@ -0,0 +1,220 @@
+'''
+Index of the current Senate and House rosters for joining to LCV records.
+
+Names from senate.gov, house.gov and the LCV scorecard are written in
+different forms ('Last, First', 'First M. Last Jr.', nicknames), so each
+name is normalized into hashable keys at several levels of precision and
+looked up in dicts, making the join linear in the number of members.
+The loose keys (first initial, surname alone) also include the member's
+state, so a former member is never matched to a sitting member of another
+state who happens to share the surname.
+'''
+import re
+import unicodedata
+
+SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'v', 'md', 'phd', 'esq'}
+NICKNAMES = {
+    'abe': 'abraham', 'al': 'albert', 'andy': 'andrew', 'ben': 'benjamin',
+    'bernie': 'bernard', 'bill': 'william', 'billy': 'william',
+    'bob': 'robert', 'bobby': 'robert', 'chuck': 'charles',
+    'chris': 'christopher', 'dan': 'daniel', 'danny': 'daniel',
+    'dave': 'david', 'dick': 'richard', 'don': 'donald', 'ed': 'edward',
+    'jim': 'james', 'jimmy': 'james', 'joe': 'joseph', 'jack': 'john',
+    'jon': 'jonathan', 'ken': 'kenneth', 'kathy': 'katherine',
+    'kate': 'katherine', 'liz': 'elizabeth', 'beth': 'elizabeth',
+    'matt': 'matthew', 'mike': 'michael',
+    'nick': 'nicholas', 'pat': 'patrick', 'pete': 'peter', 'rick': 'richard',
+    'rich': 'richard', 'rob': 'robert', 'ron': 'ronald', 'sam': 'samuel',
+    'steve': 'steven', 'stephen': 'steven', 'ted': 'edward', 'tom': 'thomas',
+    'tim': 'timothy', 'tony': 'anthony', 'val': 'valerie', 'vicky': 'victoria',
+    'will': 'william', 'zach': 'zachary',
+}
+MATCH_LEVELS = ['exact', 'nickname', 'initial', 'last_name']
+
+PARENTHETICAL = re.compile(r'\([^)]*\)')
+NON_LETTERS = re.compile(r"[^a-z\s,'-]")
+
+
+def split_name(name):
+    '''
+    Normalizes a name into lowercase first and last name parts, dropping
+    accents, titles in parentheses, suffixes and middle initials.
+
+    Inputs:
+        - name (str): a name as 'First M. Last Jr.' or 'Last, First M.'
+
+    Returns: (tuple) first name and last name, either may be ''
+    '''
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = PARENTHETICAL.sub(' ', name.lower())
+    name = NON_LETTERS.sub(' ', name.replace('.', ' '))
+
+    if ',' in name:
+        last, _, rest = name.partition(',')
+        last_words = [w for w in last.split() if w not in SUFFIXES]
+        rest_words = [w for w in rest.replace(',', ' ').split() if w not in SUFFIXES]
+        first = rest_words[0] if rest_words else ''
+        return first, ' '.join(last_words)
+
+    words = [w for w in name.replace(',', ' ').split() if w not in SUFFIXES]
+    if not words:
+        return '', ''
+    if len(words) == 1:
+        return '', words[0]
+    first, rest = words[0], words[1:]
+    # Drop middle initials but keep multi-word surnames like 'van hollen'.
+    while len(rest) > 1 and len(rest[0]) == 1:
+        rest = rest[1:]
+    return first, ' '.join(rest)
+
+
+def get_name_keys(name, state=None):
+    '''
+    Builds the lookup keys for a name, most precise first. The 'initial'
+    and 'last_name' keys include the state and are None without one.
+
+    Inputs:
+        - name (str): a name
+        - state (str): two-letter state code, if known
+
+    Returns: (dict) match level to key
+    '''
+    first, last = split_name(name)
+    last = last.replace("'", '').replace('-', ' ').split()[-1] if last else ''
+    first = first.replace("'", '').replace('-', '')
+    state = state.upper() if state else None
+    return {
+        'exact': last + '|' + first,
+        'nickname': last + '|' + NICKNAMES.get(first, first),
+        'initial': state + '|' + last + '|' + first[:1] if state else None,
+        'last_name': state + '|' + last if state else None,
+    }
+
+
+def get_name_and_state(entry):
+    '''
+    Splits a roster entry into its name and state.
+
+    Inputs:
+        - entry (str or tuple): a name, or a (name, state) pair
+
+    Returns: (tuple) the name and the state, or None if unknown
+    '''
+    if isinstance(entry, tuple):
+        return entry
+    return entry, None
+
+
+class RosterIndex:
+    '''
+    Hashed lookups from normalized name keys to roster names.
+    '''
+
+    def __init__(self, names):
+        '''
+        Initializes an instance of the `RosterIndex` class.
+
+        Inputs:
+            - names (iterable of str or tuples): the roster, as names or
+                (name, state) pairs; names without a state are only
+                matched on their full first and last name
+        '''
+        self.names = []
+        self.index = {level: {} for level in MATCH_LEVELS}
+        seen = set()
+        for entry in names:
+            name, state = get_name_and_state(entry)
+            if name in seen:
+                continue
+            seen.add(name)
+            self.names.append(name)
+            for level, key in get_name_keys(name, state).items():
+                if key is None:
+                    continue
+                # Keys shared by several members are ambiguous; None marks them.
+                entries = self.index[level]
+                entries[key] = None if key in entries else name
+
+    def match(self, name, state=None):
+        '''
+        Finds the roster name for a name, trying precise keys first.
+
+        Inputs:
+            - name (str): the name to look up
+            - state (str): two-letter state code, needed for the loose
+                'initial' and 'last_name' levels
+
+        Returns: (tuple) the roster name and match level, or (None, None)
+        '''
+        for level, key in get_name_keys(name, state).items():
+            if key is None:
+                continue
+            roster_name = self.index[level].get(key)
+            if roster_name is not None:
+                return roster_name, level
+        return None, None
+
+
+def build_indexes(senators, representatives):
+    '''
+    Builds a roster index per chamber.
+
+    Inputs:
+        - senators (list of str or tuples): current senators, as names or
+            (name, state) pairs
+        - representatives (list of str or tuples): current representatives,
+            as names or (name, state) pairs
+
+    Returns: (dict) chamber ('Senate' or 'House') to `RosterIndex`
+    '''
+    return {'Senate': RosterIndex(senators), 'House': RosterIndex(representatives)}
+
+
+def iter_current_members(members, indexes, stats=None):
+    '''
+    Lazily keeps only the LCV records of sitting members, adding the
+    matching roster name to each.
+
+    Inputs:
+        - members (iterable of dicts): LCV congress member records
+        - indexes (dict): chamber to `RosterIndex`, from `build_indexes`
+        - stats (dict): if given, updated with counts per match level and
+            of 'unmatched' records
+
+    Returns: (generator of dicts) records of current members
+    '''
+    if stats is not None:
+        for level in MATCH_LEVELS + ['unmatched']:
+            stats.setdefault(level, 0)
+    for member in members:
+        index = indexes.get(member.get('congress'))
+        roster_name, level = (index.match(member['name'], member.get('state'))
+                              if index else (None, None))
+        if stats is not None:
+            stats[level or 'unmatched'] += 1
+        if roster_name is None:
+            continue
+        current = dict(member)
+        current['roster_name'] = roster_name
+        yield current
+
+
+def join_current_members(members, senators, representatives):
+    '''
+    Joins LCV records to the current rosters.
+
+    Inputs:
+        - members (iterable of dicts): LCV congress member records
+        - senators (list of str or tuples): current senators, as names or
+            (name, state) pairs
+        - representatives (list of str or tuples): current representatives,
+            as names or (name, state) pairs
+
+    Returns: (tuple) list of current member records with scores, and a
+        dict of match-quality counts
+    '''
+    stats = {}
+    indexes = build_indexes(senators, representatives)
+    current = list(iter_current_members(members, indexes, stats))
+    return current, stats
@@ -0,0 +1,287 @@
+'''
+Local full-text index over ingested bill titles and abstracts.
+
+Rows produced for the bills and local_bills tables are kept in an SQLite
+table mirrored into an FTS5 index by triggers, so re-indexing a bill just
+upserts its row. The index points at the table's integer primary key,
+which, unlike an implicit rowid, VACUUM never renumbers. Rows are indexed
+only once the ingest sink has written them. Searches are BM25-ranked, with titles weighted above
+abstracts, and new topics can be answered from data already ingested
+instead of a fresh crawl.
+'''
+import sqlite3
+import threading
+import pipeline
+
+DEFAULT_PATH = 'search_index.db'
+TITLE_WEIGHT = 2.0
+ABSTRACT_WEIGHT = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    identifier TEXT,
+    title TEXT,
+    abstract TEXT,
+    scope TEXT,
+    date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_scope ON documents (kind, scope);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    title, abstract, content='documents', content_rowid='id',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, title, abstract)
+    VALUES (new.id, new.title, new.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, abstract)
+    VALUES ('delete', old.id, old.title, old.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, abstract)
+    VALUES ('delete', old.id, old.title, old.abstract);
+    INSERT INTO documents_fts (rowid, title, abstract)
+    VALUES (new.id, new.title, new.abstract);
+END;
+"""
+DOCUMENT_COLUMNS = ['doc_key', 'kind', 'source_id', 'identifier', 'title',
+                    'abstract', 'scope', 'date']
+
+# How each table's rows map onto indexed documents.
+TABLE_FIELDS = {
+    'bills': {'kind': 'state', 'id': 'openstates_id', 'scope': 'state',
+              'date': 'create_date', 'abstract': 'abstract'},
+    'local_bills': {'kind': 'local', 'id': 'councilmatic_id', 'scope': 'jurisdiction',
+                    'date': 'updated_date', 'abstract': None},
+}
+
+
+def build_match_query(keywords):
+    '''
+    Builds an FTS5 query matching any of the keywords. Each keyword is
+    quoted, so multi-word keywords match as phrases and FTS5 operators in
+    user input are taken literally.
+
+    Inputs:
+        - keywords (str or list of str): keywords or phrases
+
+    Returns: (str) the FTS5 match expression
+    '''
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    terms = ['"{}"'.format(k.replace('"', '""')) for k in keywords if k.strip()]
+    if not terms:
+        raise ValueError("No keywords to search for")
+    return ' OR '.join(terms)
+
+
+class SearchIndex:
+    '''
+    BM25-ranked full-text search over bill titles and abstracts.
+    '''
+
+    def __init__(self, path=DEFAULT_PATH, batch_size=500):
+        '''
+        Initializes an instance of the `SearchIndex` class, creating the
+        index if needed.
+
+        Inputs:
+            - path (str): SQLite database file
+            - batch_size (int): rows indexed per transaction
+        '''
+        self.path = path
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.upgrade_schema()
+        self.conn.executescript(SCHEMA)
+        with self.conn:
+            self.conn.execute("INSERT INTO documents_fts (documents_fts, rank) VALUES ('rank', ?)",
+                              ('bm25({}, {})'.format(TITLE_WEIGHT, ABSTRACT_WEIGHT),))
+
+    def upgrade_schema(self):
+        '''
+        Moves an index built before documents had an integer key onto the
+        current schema, keeping its documents.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(documents)')]
+        if not columns or 'id' in columns:
+            return
+        self.conn.executescript('''
+            BEGIN;
+            DROP TRIGGER IF EXISTS documents_ai;
+            DROP TRIGGER IF EXISTS documents_ad;
+            DROP TRIGGER IF EXISTS documents_au;
+            DROP TABLE IF EXISTS documents_fts;
+            DROP INDEX IF EXISTS idx_documents_scope;
+            ALTER TABLE documents RENAME TO documents_old;
+            {schema}
+            INSERT INTO documents ({columns}) SELECT {columns} FROM documents_old;
+            DROP TABLE documents_old;
+            COMMIT;
+        '''.format(schema=SCHEMA, columns=', '.join(DOCUMENT_COLUMNS)))
+
+    def add_rows(self, table, rows):
+        '''
+        Indexes rows of the bills or local_bills table, replacing earlier
+        versions of the same bills.
+
+        Inputs:
+            - table (str): 'bills' or 'local_bills'
+            - rows (iterable of dicts): rows as built by `get_bill_data` or
+                `get_local_bill_data`
+
+        Returns: (int) number of rows indexed
+        '''
+        fields = TABLE_FIELDS[table]
+        sql = ('INSERT INTO documents ({}) VALUES ({}) '
+               'ON CONFLICT (doc_key) DO UPDATE SET identifier=excluded.identifier, '
+               'title=excluded.title, abstract=excluded.abstract, '
+               'scope=excluded.scope, date=excluded.date').format(
+                   ', '.join(DOCUMENT_COLUMNS), ', '.join('?' * len(DOCUMENT_COLUMNS)))
+        indexed = 0
+        for batch in pipeline.batched(rows, self.batch_size):
+            values = [(fields['kind'] + ':' + row[fields['id']], fields['kind'],
+                       row[fields['id']], row.get('identifier'), row.get('title'),
+                       row.get(fields['abstract']) if fields['abstract'] else None,
+                       row.get(fields['scope']), row.get(fields['date']))
+                      for row in batch]
+            with self.lock, self.conn:
+                self.conn.executemany(sql, values)
+            indexed += len(batch)
+        return indexed
+
+    def wrap_sink(self, table, sink):
+        '''
+        Wraps an ingest sink so the rows it writes are indexed once it has
+        returned, and not at all if it fails, so the index never lists
+        bills the table does not hold.
+
+        Inputs:
+            - table (str): 'bills' or 'local_bills'
+            - sink (function): consumes an iterable of rows
+
+        Returns: (function) a sink that writes, then indexes, the rows
+        '''
+        def write_and_index(rows):
+            written = []
+
+            def collect():
+                for row in rows:
+                    written.append(row)
+                    yield row
+
+            result = sink(collect())
+            self.add_rows(table, written)
+            return result
+
+        return write_and_index
+
+    def remove(self, table, source_id):
+        '''
+        Drops a bill from the index.
+
+        Inputs:
+            - table (str): 'bills' or 'local_bills'
+            - source_id (str): the bill's Open States or Councilmatic id
+
+        Returns: Nothing
+        '''
+        doc_key = TABLE_FIELDS[table]['kind'] + ':' + source_id
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM documents WHERE doc_key = ?', (doc_key,))
+
+    def search(self, keywords, table=None, scope=None, limit=20):
+        '''
+        Finds bills matching any of the keywords, best matches first.
+
+        Inputs:
+            - keywords (str or list of str): keywords or phrases
+            - table (str): only 'bills' or only 'local_bills', both by default
+            - scope (str): only bills of this state or jurisdiction
+            - limit (int): most results returned
+
+        Returns: (list of dicts) matching documents with their `score`,
+            lower is better as in SQLite's bm25()
+        '''
+        return self.match(build_match_query(keywords), table, scope, limit)
+
+    def match(self, expression, table=None, scope=None, limit=20):
+        '''
+        Runs a raw FTS5 query, for boolean, NEAR or column filters.
+
+        Inputs:
+            - expression (str): FTS5 match expression
+            - table (str): only 'bills' or only 'local_bills', both by default
+            - scope (str): only bills of this state or jurisdiction
+            - limit (int): most results returned
+
+        Returns: (list of dicts) matching documents with their `score`
+        '''
+        columns = 'd.kind, d.source_id, d.identifier, d.title, d.abstract, d.scope, d.date'
+        if table is None and scope is None:
+            # Ranks inside FTS5 first and only looks up the top rows.
+            sql = ('SELECT {}, m.rank AS score FROM (SELECT rowid, rank FROM documents_fts '
+                   'WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?) m '
+                   'JOIN documents d ON d.id = m.rowid ORDER BY m.rank').format(columns)
+            params = [expression, limit]
+        else:
+            sql = ('SELECT {}, documents_fts.rank AS score FROM documents_fts '
+                   'JOIN documents d ON d.id = documents_fts.rowid '
+                   'WHERE documents_fts MATCH ?').format(columns)
+            params = [expression]
+            if table is not None:
+                sql += ' AND d.kind = ?'
+                params.append(TABLE_FIELDS[table]['kind'])
+            if scope is not None:
+                sql += ' AND d.scope = ?'
+                params.append(scope)
+            sql += ' ORDER BY documents_fts.rank LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def optimize(self):
+        '''
+        Merges the index's segments, which speeds up queries after many
+        incremental updates.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+    def count(self):
+        '''
+        Counts indexed documents.
+
+        Inputs: None
+
+        Returns: (int) number of documents
+        '''
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def close(self):
+        '''
+        Closes the database connection.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        self.conn.close()
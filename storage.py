@@ -0,0 +1,426 @@
+'''
+Pluggable storage backends for the bills, local_bills and congress_members
+tables.
+
+`BigQueryBackend` writes to the warehouse as before. `ParquetBackend`
+keeps the same tables on local disk as Hive-partitioned Parquet, by state
+or jurisdiction and, for bills, the year they were created, so analytics
+and the dashboard can run offline; reads prune partitions and push filters
+down to the Parquet row groups.
+'''
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import quote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pipeline
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from google.cloud import bigquery
+    import bigquery_upsert
+    import bigquery_writer
+except ImportError:
+    bigquery = bigquery_upsert = bigquery_writer = None
+
+# Rewritten by every write to a table, so readers in other processes or
+# backend instances know to rediscover its partitions.
+VERSION_FILE = '.version'
+
+TABLES = {
+    'bills': {
+        'fields': ['openstates_id', 'identifier', 'title', 'openstates_link',
+                   'state', 'create_date', 'latest_action_date',
+                   'latest_action_description', 'abstract'],
+        'keys': ['openstates_id'],
+        'partition': 'state',
+        'date_field': 'create_date',
+    },
+    'local_bills': {
+        'fields': ['councilmatic_id', 'identifier', 'title', 'jurisdiction',
+                   'updated_date', 'from_org'],
+        'keys': ['councilmatic_id'],
+        'partition': 'jurisdiction',
+        # No year partition: updated_date changes when a bill is updated,
+        # which would leave its old row behind in another directory.
+        'date_field': None,
+    },
+    'congress_members': {
+        'fields': ['name', 'congress', 'party', 'state', 'district',
+                   'lcv_rating', 'lcv_link'],
+        'keys': ['name', 'congress'],
+        'partition': 'state',
+        'date_field': None,
+    },
+}
+
+
+def get_year(date):
+    '''
+    Extracts the year from either an ISO date ('2022-10-05...') or a
+    formatted date ('October 05, 2022').
+
+    Inputs:
+        - date (str): the date
+
+    Returns: (int or None) the year
+    '''
+    if not isinstance(date, str):
+        return None
+    if date[:4].isdigit():
+        return int(date[:4])
+    if date[-4:].isdigit():
+        return int(date[-4:])
+    return None
+
+
+class BigQueryBackend:
+    '''
+    Stores tables in BigQuery through keyed upserts.
+    '''
+
+    def __init__(self, client=None):
+        '''
+        Initializes an instance of the `BigQueryBackend` class.
+
+        Inputs:
+            - client (bigquery.Client): client to use, the shared one by default
+        '''
+        if bigquery is None:
+            raise ImportError("google-cloud-bigquery is required for the BigQuery backend")
+        self.client = client
+
+    def write(self, table, rows, replace=False):
+        '''
+        Upserts rows into a table.
+
+        Inputs:
+            - table (str): 'bills', 'local_bills' or 'congress_members'
+            - rows (iterable of dicts): rows keyed by field
+            - replace (bool): true to also delete, in the same MERGE, the
+                rows whose key is not in rows
+
+        Returns: (int) number of rows affected
+        '''
+        spec = TABLES[table]
+        return bigquery_upsert.upsert_rows(spec['fields'], rows, table,
+                                           spec['keys'], self.client,
+                                           delete_missing=replace)
+
+    def read(self, table, filters=None, columns=None):
+        '''
+        Reads rows from a table with a parameterized query.
+
+        Inputs:
+            - table (str): 'bills', 'local_bills' or 'congress_members'
+            - filters (dict): column to a value or list of values
+            - columns (list of str): columns to return, all by default
+
+        Returns: (DataFrame) the matching rows
+        '''
+        client = self.client or bigquery_writer.get_client()
+        columns = columns or TABLES[table]['fields']
+        sql = 'SELECT {} FROM {}'.format(
+            ', '.join(bigquery_upsert.quote_column(c) for c in columns),
+            bigquery_upsert.quote_table(bigquery_writer.DATASET_ID + '.' + table))
+        clauses = []
+        params = []
+        for i, (column, value) in enumerate(sorted((filters or {}).items())):
+            name = 'p' + str(i)
+            if isinstance(value, (list, tuple, set)):
+                values = list(value)
+                clauses.append('{} IN UNNEST(@{})'.format(
+                    bigquery_upsert.quote_column(column), name))
+                params.append(bigquery.ArrayQueryParameter(
+                    name, bigquery_upsert.get_parameter_type(values[0] if values else ''),
+                    values))
+            else:
+                clauses.append('{} = @{}'.format(bigquery_upsert.quote_column(column), name))
+                params.append(bigquery.ScalarQueryParameter(
+                    name, bigquery_upsert.get_parameter_type(value), value))
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        job_config = bigquery.QueryJobConfig(query_parameters=params)
+        return client.query(sql, job_config=job_config).to_dataframe()
+
+
+class ParquetBackend:
+    '''
+    Stores tables as Hive-partitioned Parquet files on local disk, laid out
+    as <root>/<table>/<partition>=<value>/year=<year>/part-0.parquet.
+    Writes are idempotent upserts on each table's key columns; files whose
+    names start with '_' or '.' are pending writes and are never read.
+    '''
+
+    def __init__(self, root='local_store', batch_size=100000):
+        '''
+        Initializes an instance of the `ParquetBackend` class.
+
+        Inputs:
+            - root (str): directory holding the tables
+            - batch_size (int): rows buffered per write to disk
+        '''
+        self.root = root
+        self.batch_size = batch_size
+        self.datasets = {}
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def get_partition_dir(self, table, partition_value, year):
+        '''
+        Builds the directory for one partition.
+
+        Inputs:
+            - table (str): the table
+            - partition_value (str): state or jurisdiction
+            - year (int or None): year of the row's date
+
+        Returns: (str) the directory path
+        '''
+        spec = TABLES[table]
+        path = os.path.join(self.root, table, '{}={}'.format(
+            spec['partition'], quote(str(partition_value), safe='')))
+        if spec['date_field']:
+            path = os.path.join(path, 'year={}'.format(
+                year if year is not None else '__HIVE_DEFAULT_PARTITION__'))
+        return path
+
+    def write(self, table, rows, replace=False):
+        '''
+        Upserts rows into a table. Each batch is appended to its partitions
+        as hidden delta files, then every touched partition is compacted
+        once, merging by key with the newest rows winning.
+
+        Inputs:
+            - table (str): 'bills', 'local_bills' or 'congress_members'
+            - rows (iterable of dicts): rows keyed by field
+            - replace (bool): true to replace the table's contents with
+                rows; nothing is replaced when rows is empty
+
+        Returns: (int) number of rows written
+        '''
+        if replace:
+            return self.replace(table, rows)
+
+        spec = TABLES[table]
+        written = 0
+        touched = set()
+        for batch in pipeline.batched(rows, self.batch_size):
+            frame = pd.DataFrame.from_records(batch, columns=spec['fields'])
+            if spec['date_field']:
+                years = frame[spec['date_field']].map(get_year)
+            else:
+                years = pd.Series([None] * len(frame), index=frame.index)
+            groups = frame.groupby([frame[spec['partition']].fillna(''), years],
+                                   dropna=False, sort=False)
+            for (partition_value, year), group in groups:
+                year = None if pd.isna(year) else int(year)
+                directory = self.get_partition_dir(table, partition_value, year)
+                self.write_file(table, directory, group, '_delta-{:020d}-{}.parquet'.format(
+                    time.time_ns(), uuid.uuid4().hex[:8]))
+                touched.add(directory)
+            written += len(frame)
+        for directory in touched:
+            self.compact(table, directory)
+        if written:
+            self.set_version(table)
+        return written
+
+    def replace(self, table, rows):
+        '''
+        Replaces a table's contents. The rows are written to a hidden copy
+        of the table, which is then swapped in.
+
+        Inputs:
+            - table (str): the table
+            - rows (iterable of dicts): rows keyed by field
+
+        Returns: (int) number of rows written
+        '''
+        staging_root = os.path.join(self.root, '.{}-{}'.format(table, uuid.uuid4().hex))
+        try:
+            written = ParquetBackend(staging_root, self.batch_size).write(table, rows)
+            if written:
+                path = os.path.join(self.root, table)
+                old_path = os.path.join(self.root, '.{}-old-{}'.format(table, uuid.uuid4().hex))
+                if os.path.isdir(path):
+                    os.rename(path, old_path)
+                os.rename(os.path.join(staging_root, table), path)
+                shutil.rmtree(old_path, ignore_errors=True)
+        finally:
+            shutil.rmtree(staging_root, ignore_errors=True)
+        return written
+
+    def get_version(self, table):
+        '''
+        Reads the version a table was last written at.
+
+        Inputs:
+            - table (str): the table
+
+        Returns: (str or None) the version, None if never written
+        '''
+        try:
+            with open(os.path.join(self.root, table, VERSION_FILE)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set_version(self, table):
+        '''
+        Gives a table a new version, atomically.
+
+        Inputs:
+            - table (str): the table
+
+        Returns: Nothing
+        '''
+        path = os.path.join(self.root, table)
+        tmp_path = os.path.join(path, '.{}.tmp'.format(uuid.uuid4().hex))
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, os.path.join(path, VERSION_FILE))
+
+    def write_file(self, table, directory, frame, name):
+        '''
+        Writes rows to one Parquet file in a partition, atomically.
+
+        Inputs:
+            - table (str): the table
+            - directory (str): the partition directory
+            - frame (DataFrame): rows for this partition
+            - name (str): file name
+
+        Returns: Nothing
+        '''
+        spec = TABLES[table]
+        os.makedirs(directory, exist_ok=True)
+        columns = [c for c in spec['fields'] if c != spec['partition']]
+        schema = pa.schema([(c, pa.string()) for c in columns])
+        arrow_table = pa.Table.from_pandas(frame[columns].astype(object),
+                                           schema=schema, preserve_index=False)
+        tmp_path = os.path.join(directory, '.{}.tmp'.format(uuid.uuid4().hex))
+        pq.write_table(arrow_table, tmp_path, row_group_size=50000)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    def lock_partition(self, directory):
+        '''
+        Locks a partition against other writers, in this process and, where
+        file locks are available, in other processes.
+
+        Inputs:
+            - directory (str): the partition directory
+
+        Returns: (contextmanager) holds the lock while open
+        '''
+        with self.locks_lock:
+            thread_lock = self.locks.setdefault(directory, threading.Lock())
+
+        @contextmanager
+        def locked():
+            with thread_lock:
+                if fcntl is None:
+                    yield
+                    return
+                with open(os.path.join(directory, '.lock'), 'a') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+        return locked()
+
+    def compact(self, table, directory):
+        '''
+        Merges a partition's delta files into its single data file. The
+        partition is locked while it is merged, so concurrent writers never
+        drop each other's deltas.
+
+        Inputs:
+            - table (str): the table
+            - directory (str): the partition directory
+
+        Returns: Nothing
+        '''
+        spec = TABLES[table]
+        path = os.path.join(directory, 'part-0.parquet')
+        with self.lock_partition(directory):
+            deltas = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                            if name.startswith('_delta-'))
+            if not deltas:
+                return
+            paths = ([path] if os.path.exists(path) else []) + deltas
+            frame = pd.concat([pq.read_table(p).to_pandas() for p in paths],
+                              ignore_index=True)
+            keys = [k for k in spec['keys'] if k != spec['partition']]
+            frame = frame.drop_duplicates(keys, keep='last')
+            self.write_file(table, directory, frame, 'part-0.parquet')
+            for delta in deltas:
+                os.remove(delta)
+
+    def read(self, table, filters=None, columns=None):
+        '''
+        Reads rows from a table. Filters on the partition column or 'year'
+        skip whole directories; other filters are pushed down to the
+        Parquet reader.
+
+        Inputs:
+            - table (str): 'bills', 'local_bills' or 'congress_members'
+            - filters (dict): column to a value or list of values
+            - columns (list of str): columns to return, all by default
+
+        Returns: (DataFrame) the matching rows
+        '''
+        spec = TABLES[table]
+        columns = columns or spec['fields']
+        path = os.path.join(self.root, table)
+        if not os.path.isdir(path):
+            return pd.DataFrame(columns=columns)
+
+        version = self.get_version(table)
+        version_read, dataset = self.datasets.get(table, (None, None))
+        if dataset is None or version is None or version != version_read:
+            # Discovery lists every partition, so it is done once per write,
+            # by this or any other writer.
+            partition_fields = [pa.field(spec['partition'], pa.string())]
+            if spec['date_field']:
+                partition_fields.append(pa.field('year', pa.int32()))
+            partitioning = ds.partitioning(pa.schema(partition_fields), flavor='hive')
+            dataset = ds.dataset(path, format='parquet', partitioning=partitioning,
+                                 exclude_invalid_files=True)
+            self.datasets[table] = (version, dataset)
+
+        expression = None
+        for column, value in (filters or {}).items():
+            if isinstance(value, (list, tuple, set)):
+                condition = ds.field(column).isin(list(value))
+            else:
+                condition = ds.field(column) == value
+            expression = condition if expression is None else expression & condition
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def get_backend(name='bigquery', **kwargs):
+    '''
+    Creates a storage backend by name.
+
+    Inputs:
+        - name (str): 'bigquery' or 'parquet'
+        - kwargs: passed through to the backend
+
+    Returns: the backend
+    '''
+    backends = {'bigquery': BigQueryBackend, 'parquet': ParquetBackend}
+    if name not in backends:
+        raise ValueError("Unknown storage backend: " + repr(name))
+    return backends[name](**kwargs)
@@ -0,0 +1,115 @@
+'''
+Local checkpoint store for incremental syncs.
+
+Keeps a high-water mark (the latest `updated_at` seen) for each source,
+scope and keyword set in a small SQLite table, so nightly refreshes only
+fetch data that changed since the previous run.
+'''
+import sqlite3
+from datetime import datetime, timezone
+
+DEFAULT_PATH = 'sync_checkpoints.db'
+
+
+def get_keyword_key(keywords):
+    '''
+    Normalizes a keyword list so the same set in any order or case maps to
+    the same checkpoint.
+
+    Inputs:
+        - keywords (list of str): keywords
+
+    Returns: (str) the normalized key
+    '''
+    return ','.join(sorted({keyword.strip().lower() for keyword in keywords}))
+
+
+class CheckpointStore:
+    '''
+    SQLite-backed store of per-(source, scope, keyword set) high-water marks.
+    '''
+
+    def __init__(self, path=DEFAULT_PATH):
+        '''
+        Initializes an instance of the `CheckpointStore` class, creating the
+        checkpoint table if needed.
+
+        Inputs:
+            - path (str): SQLite database file, or ':memory:' for tests
+        '''
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                source TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                keywords TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                synced_at TEXT NOT NULL,
+                PRIMARY KEY (source, scope, keywords)
+            )''')
+        self.conn.commit()
+
+    def get(self, source, scope, keywords):
+        '''
+        Looks up the high-water mark for a sync.
+
+        Inputs:
+            - source (str): data source, e.g. 'openstates'
+            - scope (str): state or location
+            - keywords (list of str): keywords used to filter
+
+        Returns: (str or None) latest `updated_at` seen, None if never synced
+        '''
+        row = self.conn.execute(
+            'SELECT updated_at FROM checkpoints '
+            'WHERE source = ? AND scope = ? AND keywords = ?',
+            (source, scope.lower(), get_keyword_key(keywords))).fetchone()
+        return row[0] if row else None
+
+    def set(self, source, scope, keywords, updated_at):
+        '''
+        Records a new high-water mark. Marks never move backwards.
+
+        Inputs:
+            - source (str): data source, e.g. 'openstates'
+            - scope (str): state or location
+            - keywords (list of str): keywords used to filter
+            - updated_at (str): latest `updated_at` seen
+
+        Returns: Nothing
+        '''
+        current = self.get(source, scope, keywords)
+        if current is not None and current >= updated_at:
+            return
+        self.conn.execute(
+            'INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)',
+            (source, scope.lower(), get_keyword_key(keywords), updated_at,
+             datetime.now(timezone.utc).isoformat()))
+        self.conn.commit()
+
+    def clear(self, source, scope, keywords):
+        '''
+        Removes a high-water mark so the next sync is a full one.
+
+        Inputs:
+            - source (str): data source, e.g. 'openstates'
+            - scope (str): state or location
+            - keywords (list of str): keywords used to filter
+
+        Returns: Nothing
+        '''
+        self.conn.execute(
+            'DELETE FROM checkpoints '
+            'WHERE source = ? AND scope = ? AND keywords = ?',
+            (source, scope.lower(), get_keyword_key(keywords)))
+        self.conn.commit()
+
+    def close(self):
+        '''
+        Closes the underlying database connection.
+
+        Inputs: None
+
+        Returns: Nothing
+        '''
+        self.conn.close()